@@ -2,8 +2,13 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Reuse one lazily created MongoDB client across warm invocations
+os.environ.setdefault("SERVERLESS", "true")
+
 from mangum import Mangum
 from app.main import app
 
-# Simple handler for Vercel Serverless Functions
-handler = Mangum(app)
\ No newline at end of file
+# Simple handler for Vercel Serverless Functions.
+# Lifespan is off so cold starts don't ping MongoDB or create indexes;
+# the database client is created on the first request and then reused.
+handler = Mangum(app, lifespan="off")
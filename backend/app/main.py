@@ -1,29 +1,66 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Header, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Union
 from datetime import datetime, timedelta
 import uvicorn
 import asyncio
+import logging
 
 import json
-from app.utils.helpers import serialize_for_json
+from app.utils.responses import MongoJSONResponse
+from app.utils.middleware import DatabaseConnectionMiddleware, MetricsMiddleware, RequestIdMiddleware
+from app.utils.metrics import METRICS_ENABLED, registry
+from app.utils.logging_config import setup_logging
 
 from app.services.order_parser import parse_order
-from app.services.db import setup_database, save_order, get_orders, get_menu_items
-from app.routers import inventory
+from app.services.db import (
+    SERVERLESS,
+    connect_database,
+    save_order,
+    get_orders,
+    get_menu_items,
+    get_database_health,
+)
+from app.services.migrations import check_schema_version
+from app.services.models.yolo_model import model_registry
+from app.routers import admin, inventory
 from app.services.inventory_calculator import (
     calculate_today_ingredients,
     get_ingredient_inventory,
     update_ingredient_inventory,
     update_ingredients_from_today_orders,
 )
+from app.services.db import get_inventory_movements, MOVEMENT_SOURCES
+from app.services.inventory_forecast import (
+    FORECAST_METHODS,
+    FORECAST_WINDOW_DAYS,
+    FORECAST_HORIZON_DAYS,
+    FORECAST_LOW_STOCK_DAYS,
+    forecast_engine,
+)
+from app.services.response_cache import cached_response, response_cache
+from app.services.events import EVENT_TOPICS, broker, start_change_streams
+from app.utils.responses import dumps
+from app.services.purchase_orders import PURCHASE_SAFETY_DAYS, suggest_purchase_order
+from app.services.inventory_ledger import (
+    LEDGER_COMPACTION_INTERVAL,
+    compact_inventory_ledger,
+    get_stock_at,
+    run_periodic_compaction,
+)
+
+# Log through the background queue before anything else logs
+setup_logging()
+logger = logging.getLogger(__name__)
 
 # Create FastAPI app
 app = FastAPI(
     title="Warung Bang Jul Automation API",
     description="API for automating order processing, inventory management, and analytics",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=MongoJSONResponse
 )
 
 # Configure CORS
@@ -35,8 +72,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Make sure the database client exists even when no startup event ran
+# (e.g. serverless handlers with lifespan disabled)
+app.add_middleware(DatabaseConnectionMiddleware)
+
+# Request latency histograms; left out entirely when metrics are disabled
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Added last so it is outermost and every log line of a request carries its ID
+app.add_middleware(RequestIdMiddleware)
+
 # Include routers
 app.include_router(inventory.cv_router)
+app.include_router(admin.admin_router)
 
 # Models
 class OrderText(BaseModel):
@@ -56,16 +105,103 @@ class IngredientUpdates(BaseModel):
         description="Dictionary of ingredients to update in format {ingredient_name: {amount: value, unit: unit}}"
     )
 
+# Background tasks (ledger compaction, change streams), started outside serverless mode
+background_tasks = []
+
+# Seconds between SSE keep-alive comments
+EVENT_HEARTBEAT_SECONDS = 15
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    success = await setup_database()
-    if success:
-        print("Database setup complete.")
+    # Indexes and seed data are created once by initialize_db.py
+    connect_database()
+    if SERVERLESS:
+        logger.info("Database client ready (serverless mode).")
+        return
+
+    # Load and warm up the detector before the first upload instead of during it
+    model_registry.ensure_loading()
+
+    # A single read of the schema version doubles as the connectivity check
+    try:
+        schema = await check_schema_version()
+    except Exception as e:
+        logger.error("Database setup failed! %s", e)
+        return
+
+    if schema["up_to_date"]:
+        logger.info("Database ready (schema version %s).", schema["current_version"])
     else:
-        print("Database setup failed!")
+        logger.warning(
+            "Database schema is at version %s, latest is %s. Run initialize_db.py to migrate.",
+            schema["current_version"], schema["latest_version"]
+        )
+
+    if LEDGER_COMPACTION_INTERVAL > 0:
+        background_tasks.append(asyncio.create_task(run_periodic_compaction()))
+    background_tasks.extend(start_change_streams())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in background_tasks:
+        task.cancel()
     
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/db")
+async def database_health():
+    """Report database reachability and connection pool statistics"""
+    health = await get_database_health()
+    status_code = 200 if health["status"] == "ok" else 503
+    return MongoJSONResponse(health, status_code=status_code)
+
+@app.get("/api/events")
+async def stream_events(
+    request: Request,
+    topics: str = Query(",".join(EVENT_TOPICS), description="Comma-separated topics: orders, inventory, detections"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """Stream order, inventory and detection changes as Server-Sent Events"""
+    selected = [topic.strip() for topic in topics.split(",") if topic.strip()]
+    unknown = [topic for topic in selected if topic not in EVENT_TOPICS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"topics must be from {', '.join(EVENT_TOPICS)}")
+
+    subscription = broker.subscribe(selected, last_event_id)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield (
+                    f"id: {event['id']}\nevent: {event['topic']}\n".encode()
+                    + b"data: " + dumps(event["data"]) + b"\n\n"
+                )
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Report response cache hit/miss counters"""
+    return MongoJSONResponse(response_cache.stats())
+
 @app.post("/api/orders", status_code=201)
 async def create_order(order_input: OrderText):
     """Process a new text order"""
@@ -76,20 +212,22 @@ async def create_order(order_input: OrderText):
         # Save to database
         order_id = await save_order(order_data)
         
-        # Serialize the response for JSON
-        serializable_order = serialize_for_json(order_data)
-        
-        return {
-            "success": True,
-            "order_id": order_id,
-            "order": serializable_order
-        }
+        # Encode the response (including ObjectId and datetime) in one pass
+        return MongoJSONResponse(
+            {
+                "success": True,
+                "order_id": order_id,
+                "order": order_data
+            },
+            status_code=201
+        )
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.get("/api/orders")
+@cached_response("/api/orders", tags=("orders",))
 async def list_orders(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
@@ -105,49 +243,40 @@ async def list_orders(
             
         orders = await get_orders(start_date, end_date, status)
 
-        # Serialize orders for JSON response
-        serialized_orders = serialize_for_json(orders)
-
-        return {"orders": serialized_orders}
+        return MongoJSONResponse({"orders": orders})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.get("/api/menu")
+@cached_response("/api/menu", tags=("menu",))
 async def get_menu():
     """Get all menu items with their recipes"""
     try:
         menu = await get_menu_items()
         
-        # Serialize menu for JSON response
-        serialized_menu = serialize_for_json(menu)
-        
-        return {"menu": serialized_menu}
+        return MongoJSONResponse({"menu": menu})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.get("/api/inventory/today")
+@cached_response("/api/inventory/today", tags=("orders", "menu"))
 async def get_today_inventory_needs():
     """Calculate ingredients needed for today's orders"""
     try:
         today_needs = await calculate_today_ingredients()
         
-        # Serialize todays_needs for JSON response
-        serialized_today_needs = serialize_for_json(today_needs)
-
-        return serialized_today_needs
+        return MongoJSONResponse(today_needs)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @app.get("/api/inventory")
+@cached_response("/api/inventory", tags=("inventory",))
 async def get_inventory():
     """Get current inventory of all ingredients"""
     try:
         inventory = await get_ingredient_inventory()
         
-        # Serialize inventory for JSON response
-        serialized_inventory = serialize_for_json(inventory)
-        
-        return {"inventory": serialized_inventory}
+        return MongoJSONResponse({"inventory": inventory})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
@@ -157,7 +286,7 @@ async def update_inventory(updates: IngredientUpdates):
     try:
         result = await update_ingredient_inventory(updates.ingredients)
         if result["status"] == "success":
-            return serialize_for_json(result)
+            return MongoJSONResponse(result)
         else:
             raise HTTPException(status_code=400, detail=result["message"])
     except Exception as e:
@@ -170,11 +299,84 @@ async def process_today_orders():
         result = await update_ingredients_from_today_orders()
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
-        return serialize_for_json(result)
+        return MongoJSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
+@app.get("/api/inventory/forecast")
+async def get_inventory_forecast(
+    method: str = Query("weekday", description="moving_average or weekday"),
+    window: int = Query(FORECAST_WINDOW_DAYS, ge=1, le=90),
+    horizon: int = Query(FORECAST_HORIZON_DAYS, ge=1, le=90),
+    low_stock_days: float = Query(FORECAST_LOW_STOCK_DAYS, ge=0)
+):
+    """Forecast days until stockout for every ingredient from order history"""
+    if method not in FORECAST_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(FORECAST_METHODS)}")
+    try:
+        forecast = await forecast_engine.forecast(method, window, horizon, low_stock_days)
+        return MongoJSONResponse(forecast)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@app.get("/api/inventory/purchase-order")
+async def get_purchase_order(
+    horizon: int = Query(7, ge=1, le=90, description="Days the purchase should last"),
+    safety_days: float = Query(PURCHASE_SAFETY_DAYS, ge=0),
+    method: str = Query("weekday", description="moving_average or weekday")
+):
+    """Suggest a shopping list rounded up to whole packages"""
+    if method not in FORECAST_METHODS:
+        raise HTTPException(status_code=400, detail=f"method must be one of {', '.join(FORECAST_METHODS)}")
+    try:
+        return MongoJSONResponse(await suggest_purchase_order(horizon, safety_days, method))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@app.get("/api/inventory/movements")
+async def list_inventory_movements(
+    ingredient_name: Optional[str] = None,
+    source: Optional[str] = None,
+    reference_id: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Get the inventory movement ledger, newest first"""
+    if source and source not in MOVEMENT_SOURCES:
+        raise HTTPException(status_code=400, detail=f"source must be one of {', '.join(MOVEMENT_SOURCES)}")
+    try:
+        movements = await get_inventory_movements(
+            ingredient_name, source, reference_id, start_date, end_date, limit
+        )
+        return MongoJSONResponse({"movements": movements})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@app.get("/api/inventory/history")
+async def get_inventory_history(at: datetime):
+    """Reconstruct the inventory at a past point in time"""
+    try:
+        return MongoJSONResponse(await get_stock_at(at))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@app.post("/api/inventory/snapshots")
+async def create_inventory_snapshot():
+    """Fold pending inventory movements into a new snapshot"""
+    try:
+        snapshot = await compact_inventory_ledger()
+        if snapshot is None:
+            return MongoJSONResponse({"success": True, "message": "No movements to compact"})
+        return MongoJSONResponse({
+            "success": True,
+            "message": f"Compacted {snapshot['movement_count']} movements",
+            "taken_at": snapshot["taken_at"]
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
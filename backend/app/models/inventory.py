@@ -22,6 +22,7 @@ class IngredientDefaultQuantity(BaseModel):
     default_quantity: float = Field(..., description="Default quantity to add when detected")
     unit: str = Field(..., description="Unit of measurement")
     packaging_description: Optional[str] = Field(None, description="Description of the packaging (e.g., 'carton', 'pack')")
+    aliases: Optional[List[str]] = Field(None, description="Model class names that also map to this ingredient")
 
 
 class InventoryItemUpdate(BaseModel):
@@ -45,9 +46,26 @@ class DetectedIngredient(BaseModel):
     unit: str = Field(..., description="Unit of measurement")
 
 
+class DetectionBox(BaseModel):
+    """Model for a single detected object, for drawing overlays"""
+    class_id: int = Field(..., description="Model class ID")
+    class_name: str = Field(..., description="Model class name")
+    confidence: float = Field(..., description="Detection confidence score")
+    box: List[float] = Field(..., description="Corners [x1, y1, x2, y2] in original image pixels")
+
+
+class ImageSize(BaseModel):
+    """Model for the pixel size of the original image"""
+    width: int = Field(..., description="Image width in pixels")
+    height: int = Field(..., description="Image height in pixels")
+
+
 class DetectionResult(BaseModel):
     """Model for the result of an image detection"""
     detection_id: str = Field(..., description="Unique ID for this detection")
     ingredients: List[DetectedIngredient] = Field(..., description="List of detected ingredients")
+    boxes: List[DetectionBox] = Field(default_factory=list, description="Every detected object with its box")
+    image_size: Optional[ImageSize] = Field(None, description="Size of the image the boxes refer to")
+    conf: Optional[float] = Field(None, description="Confidence threshold the ingredients and boxes were filtered with")
     image_url: str = Field(..., description="URL to the annotated image")
     timestamp: datetime = Field(default_factory=datetime.now, description="Detection timestamp") 
\ No newline at end of file
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class RecipeIngredient(BaseModel):
+    """Ingredient used by a menu item, per portion"""
+    name: str = Field(..., description="Name of the ingredient")
+    quantity: float = Field(..., description="Quantity used per portion")
+    unit: str = Field(..., description="Unit of measurement (e.g., 'grams', 'pieces')")
+
+
+class MenuItem(BaseModel):
+    """Model for a menu item with its recipe"""
+    code: str = Field(..., description="Short code used in text orders (e.g., 'SE')")
+    name: str = Field(..., description="Name of the dish")
+    price: float = Field(..., description="Price per portion")
+    ingredients: List[RecipeIngredient] = Field(default_factory=list, description="Recipe ingredients")
@@ -0,0 +1,88 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
+from typing import Optional
+import os
+import hmac
+import logging
+
+from app.utils.responses import MongoJSONResponse
+from app.services.models.yolo_model import model_registry
+
+logger = logging.getLogger(__name__)
+
+# Admin requests must send this in the X-Admin-Token header; without it the admin API is off
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Local development only: accept admin requests without a token when none is configured
+ADMIN_ALLOW_UNAUTHENTICATED = os.getenv("ADMIN_ALLOW_UNAUTHENTICATED", "false").lower() in ("1", "true", "yes")
+
+if not ADMIN_TOKEN and ADMIN_ALLOW_UNAUTHENTICATED:
+    logger.warning("Admin API is open without a token (ADMIN_ALLOW_UNAUTHENTICATED); do not use in production")
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN:
+        if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+    elif not ADMIN_ALLOW_UNAUTHENTICATED:
+        raise HTTPException(status_code=503, detail="Admin API is disabled; set ADMIN_TOKEN to enable it")
+
+
+# Detection model management
+admin_router = APIRouter(
+    prefix="/api/admin/models",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+    responses={404: {"description": "Not found"}},
+)
+
+
+def _start_load(version: str, role: str, shadow_rate: Optional[float] = None):
+    try:
+        model_registry.start_load(version, role, shadow_rate)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Model version {version} not found")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except RuntimeError as re:
+        raise HTTPException(status_code=409, detail=str(re))
+
+
+@admin_router.get("")
+async def list_model_versions():
+    """List the registered model versions and which ones are loaded"""
+    try:
+        return MongoJSONResponse({"versions": model_registry.versions(), **model_registry.status()})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+@admin_router.post("/{version}/activate", status_code=202)
+async def activate_model_version(version: str):
+    """
+    Load and warm up a version in the background, then swap it in
+
+    Requests already running finish on the previous model. Poll
+    GET /api/admin/models for the outcome.
+    """
+    _start_load(version, "active")
+    logger.info("Activating model version %s", version)
+    return MongoJSONResponse({"success": True, "message": f"Loading model version {version}"}, status_code=202)
+
+
+@admin_router.post("/{version}/shadow", status_code=202)
+async def shadow_model_version(
+    version: str,
+    rate: float = Query(model_registry.shadow_rate, ge=0, le=1, description="Fraction of requests to shadow")
+):
+    """Load a version in the background and run it on a sample of requests for comparison"""
+    _start_load(version, "shadow", rate)
+    logger.info("Shadowing model version %s on %s of requests", version, rate)
+    return MongoJSONResponse({"success": True, "message": f"Loading model version {version} as shadow"},
+                             status_code=202)
+
+
+@admin_router.delete("/shadow")
+async def stop_shadow():
+    """Stop shadow inference and report the final comparison"""
+    status = model_registry.status()["shadow"]
+    model_registry.stop_shadow()
+    return MongoJSONResponse({"success": True, "shadow": status})
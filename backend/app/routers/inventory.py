@@ -1,13 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Body, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Body, Form, Query, Header
+from fastapi.responses import Response, StreamingResponse
 from typing import Dict, List, Optional, Union, Any
 from pydantic import BaseModel
 import os
 from datetime import datetime
+import hashlib
 import shutil
 import time
+import logging
 
-from app.services.models.yolo_model import TEMP_DIR, delete_all_temp_images
+from app.utils.responses import MongoJSONResponse
 
 
 from app.models.inventory import (
@@ -19,19 +21,34 @@ from app.models.inventory import (
     DetectionResult
 )
 
-from app.services.db import (
-    update_multiple_inventory_items,
-    get_ingredient_default_quantities
-)
+from app.services.db import update_multiple_inventory_items
 
+from app.services.detection_cache import fingerprint_stored_image
+from app.services.image_variants import IMAGE_CACHE_MAX_AGE, IMAGE_FORMATS, IMAGE_SIZES
+from app.services.storage import IMAGE_STORAGE_CHUNK_SIZE, parse_byte_range, storage
+from app.services.video_pipeline import VIDEO_MAX_FRAMES
 from app.services.image_service import (
-    save_uploaded_image,
+    save_uploaded_stream,
+    save_uploaded_video,
+    delete_image,
+    delete_video,
+    image_file,
+    find_cached_detection,
+    cache_detection,
+    model_cache_variant,
+    model_ready,
     process_image,
+    process_video,
+    process_burst,
     get_detection_result,
-    get_image_path,
-    get_annotated_image_path,
+    get_image_variant,
+    threshold_detections,
+    DETECTION_CONF,
+    DETECTION_CONF_FLOOR,
 )
 
+logger = logging.getLogger(__name__)
+
 # CV-specific router
 cv_router = APIRouter(
     prefix="/api/inventoryCV",
@@ -39,42 +56,176 @@ cv_router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+async def _upload_chunks(file: UploadFile):
+    """Read an upload in chunks instead of all at once"""
+    while True:
+        chunk = await file.read(IMAGE_STORAGE_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
 # Computer Vision specific endpoints
 @cv_router.post("/upload")
-async def upload_image(file: UploadFile = File(...)):
+async def upload_image(
+    file: UploadFile = File(...),
+    tiled: bool = Query(False, description="Use sliced inference for high-resolution shelf photos"),
+    tile_size: int = Query(640, ge=160, le=1920, description="Tile side length in pixels"),
+    tile_overlap: float = Query(0.2, ge=0.0, lt=0.9, description="Fraction of overlap between neighbouring tiles")
+):
     """Upload an image for processing"""
     try:
         # Check file type
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="File must be an image")
+        if not model_ready():
+            raise HTTPException(status_code=503, detail="Detection model is not ready, try again shortly")
         
-        # Read file content
-        file_data = await file.read()
+        # Stream the file to image storage, hashing it on the way
+        image_id, content_hash = await save_uploaded_stream(_upload_chunks(file))
+        
+        async with image_file(image_id) as image_path:
+            if not image_path:
+                raise HTTPException(status_code=500, detail="Uploaded image could not be stored")
+            
+            # Return the earlier result if this photo was already processed
+            variant = model_cache_variant(f"tiled:{tile_size}:{tile_overlap}" if tiled else "default")
+            fingerprint = fingerprint_stored_image(content_hash, image_path, variant)
+            cached_result = await find_cached_detection(fingerprint)
+            if cached_result:
+                await delete_image(image_id)
+                return {
+                    "detection_id": cached_result["detection_id"],
+                    "message": f"Image already processed. Detected {len(cached_result['ingredients'])} ingredients.",
+                    "cached": True
+                }
+            
+            # Process the image
+            process_result = await process_image(
+                image_id, tiled=tiled, tile_size=tile_size, tile_overlap=tile_overlap,
+                image_path=image_path
+            )
         
-        # Save to temporary storage
-        image_id = await save_uploaded_image(file_data)
+        if not process_result["success"]:
+            raise HTTPException(status_code=400, detail=process_result["message"])
         
-        # Get defaults for detection
-        defaults = await get_ingredient_default_quantities()
+        await cache_detection(fingerprint, process_result["detection_id"])
         
-        # Process the image
-        process_result = await process_image(image_id, defaults)
+        return {
+            "detection_id": process_result["detection_id"],
+            "message": f"Image uploaded and processed successfully. Detected {process_result['ingredients_count']} ingredients.",
+            "cached": False
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+@cv_router.post("/upload/sequence")
+async def upload_sequence(files: List[UploadFile] = File(...)):
+    """Upload a short video or a burst of photos for processing
+    
+    Frames are sampled adaptively and objects are tracked across them, so
+    an item that shows up in several frames is counted once. The result is
+    read from /detected/{detection_id} like a single image; its image is the
+    frame in which the most items were seen.
+    
+    Args:
+        files: One video file, or up to VIDEO_MAX_FRAMES photos in the order taken
+    """
+    # Deleted again unless a detection result ends up referring to it
+    video_key = None
+    keep_video = False
+    try:
+        content_types = [file.content_type or "" for file in files]
+        is_video = any(content_type.startswith("video/") for content_type in content_types)
+        if is_video and len(files) != 1:
+            raise HTTPException(status_code=400, detail="Upload a single video or a burst of images")
+        if not is_video:
+            if not all(content_type.startswith("image/") for content_type in content_types):
+                raise HTTPException(status_code=400, detail="Files must be a video or images")
+            if len(files) > VIDEO_MAX_FRAMES:
+                raise HTTPException(status_code=400, detail=f"A burst can have at most {VIDEO_MAX_FRAMES} images")
+        if not model_ready():
+            raise HTTPException(status_code=503, detail="Detection model is not ready, try again shortly")
+        
+        # Whole-upload hash, so sending the same clip or burst again returns the earlier result
+        if is_video:
+            image_id, video_key, content_hash = await save_uploaded_video(_upload_chunks(files[0]), files[0].filename)
+        else:
+            digest = hashlib.sha256()
+            for file in files:
+                async for chunk in _upload_chunks(file):
+                    digest.update(chunk)
+                await file.seek(0)
+            content_hash = digest.hexdigest()
+        
+        variant = model_cache_variant("video" if is_video else "burst")
+        fingerprint = {"content_hash": content_hash, "variant": variant, "perceptual_hash": None}
+        cached_result = await find_cached_detection(fingerprint)
+        if cached_result:
+            return {
+                "detection_id": cached_result["detection_id"],
+                "message": f"Upload already processed. Detected {len(cached_result['ingredients'])} ingredients.",
+                "cached": True
+            }
+        
+        if is_video:
+            process_result = await process_video(image_id, video_key)
+        else:
+            process_result = await process_burst([file.file for file in files])
         
         if not process_result["success"]:
             raise HTTPException(status_code=400, detail=process_result["message"])
+        keep_video = True
+        
+        await cache_detection(fingerprint, process_result["detection_id"])
         
         return {
             "detection_id": process_result["detection_id"],
-            "message": f"Image uploaded and processed successfully. Detected {process_result['ingredients_count']} ingredients."
+            "message": (
+                f"Processed {process_result['frames']} frames. Counted {process_result['items']} items "
+                f"as {process_result['ingredients_count']} ingredients."
+            ),
+            "frames": process_result["frames"],
+            "items": process_result["items"],
+            "cached": False
         }
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    finally:
+        if video_key and not keep_video:
+            await delete_video(video_key)
+
+def _parse_class_thresholds(values: Optional[List[str]]) -> Dict[str, float]:
+    """Parse per-class thresholds given as "class_name:conf" strings"""
+    thresholds = {}
+    for value in values or []:
+        name, separator, conf = value.rpartition(":")
+        try:
+            threshold = float(conf)
+        except ValueError:
+            threshold = None
+        if not separator or not name or threshold is None or not 0 <= threshold <= 1:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid class threshold '{value}', expected class_name:conf with conf between 0 and 1"
+            )
+        thresholds[name] = threshold
+    return thresholds
 
 @cv_router.get("/detected/{detection_id}")
-async def get_detected_ingredients(detection_id: str):
-    """Get detected ingredients from an uploaded image"""
+async def get_detected_ingredients(
+    detection_id: str,
+    conf: Optional[float] = Query(None, ge=0.0, le=1.0, description="Confidence threshold (default: DETECTION_CONF)"),
+    class_conf: Optional[List[str]] = Query(None, description="Per-class threshold as class_name:conf, repeatable")
+):
+    """Get detected ingredients from an uploaded image
+    
+    Boxes are stored down to DETECTION_CONF_FLOOR, so other thresholds are
+    applied to the stored boxes without running the model again.
+    """
     try:
         # Get detection result
         result = await get_detection_result(detection_id)
@@ -82,54 +233,108 @@ async def get_detected_ingredients(detection_id: str):
         if not result:
             raise HTTPException(status_code=404, detail=f"Detection result with ID {detection_id} not found")
         
+        thresholds = _parse_class_thresholds(class_conf)
+        if conf is None and not thresholds:
+            filtered = result
+        else:
+            try:
+                filtered = threshold_detections(
+                    result, DETECTION_CONF if conf is None else conf, thresholds
+                )
+            except ValueError as ve:
+                raise HTTPException(status_code=400, detail=str(ve))
+        
         # Get the base URL for image
         base_url = f"/api/inventoryCV/image/{result['annotated_image_id']}"
         
-        return {
+        return MongoJSONResponse({
             "detection_id": detection_id,
-            "ingredients": result["ingredients"],
+            "ingredients": filtered["ingredients"],
+            "boxes": filtered["boxes"],
+            "conf": filtered["conf"],
+            "class_conf": thresholds,
+            "conf_floor": DETECTION_CONF_FLOOR,
+            "image_size": result.get("image_size"),
+            "mode": result.get("mode", "image"),
+            "frames": result.get("frames"),
             "image_url": base_url,
+            "thumbnail_url": f"{base_url}?size=thumb",
             "timestamp": result["timestamp"]
-        }
+        })
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
 @cv_router.get("/image/{image_id}")
-async def get_image(image_id: str, annotated: bool = True):
+async def get_image(
+    image_id: str,
+    annotated: bool = True,
+    size: str = Query("full", description="Size variant: " + ", ".join(IMAGE_SIZES)),
+    format: Optional[str] = Query(None, description="Image format: " + ", ".join(IMAGE_FORMATS)),
+    conf: Optional[float] = Query(None, ge=0.0, le=1.0, description="Confidence threshold for the drawn boxes"),
+    class_conf: Optional[List[str]] = Query(None, description="Per-class threshold as class_name:conf, repeatable"),
+    if_none_match: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range")
+):
     """Get an image by ID
     
+    Annotated images are drawn from the stored boxes on first request and
+    cached per variant. Responses carry an ETag, so clients can revalidate
+    with If-None-Match and get 304 Not Modified instead of the image.
+    Originals are streamed from image storage in chunks, and a single
+    byte range can be requested with the Range header.
+    
     Args:
         image_id: The ID of the image
         annotated: Whether to return the annotated version (default: True)
+        size: thumb (320px), medium (1024px) or full
+        format: jpeg or webp (default: the stored original when nothing
+            is drawn or resized, otherwise jpeg)
     """
     try:
-        if annotated:
-            # Look for image using the original ID in the predict folder
-            image_path = TEMP_DIR / "predict" / f"{image_id}.jpg"
-            
-            # If annotated doesn't exist, fall back to original
-            if not image_path.exists():
-                image_path = await get_image_path(image_id)
-        else:
-            # Get original image
-            image_path = await get_image_path(image_id)
+        if size not in IMAGE_SIZES or (format is not None and format not in IMAGE_FORMATS):
+            raise HTTPException(status_code=400, detail="Unsupported image size or format")
+        
+        try:
+            variant = await get_image_variant(
+                image_id, annotated, size, format, conf, _parse_class_thresholds(class_conf), if_none_match
+            )
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
         
-        if not image_path or not image_path.exists():
+        if not variant:
             raise HTTPException(status_code=404, detail=f"Image with ID {image_id} not found")
         
-        # Return file response with the consistent name for the frontend
-        return FileResponse(
-            path=str(image_path),
-            media_type="image/jpeg",
-            filename="image0.jpg"  # Always return as image0.jpg to frontend
-        )
-    
-        #delete all the photos
-        #asyncio.create_task(delayed_cleanup())
-
-
+        headers = {
+            "ETag": variant["etag"],
+            "Cache-Control": f"private, max-age={IMAGE_CACHE_MAX_AGE}",
+            "Content-Disposition": f'inline; filename="{variant["filename"]}"',
+            "Accept-Ranges": "bytes"
+        }
+        if variant["not_modified"]:
+            return Response(status_code=304, headers=headers)
+        
+        size_bytes = variant["size"]
+        try:
+            byte_range = parse_byte_range(range_header, size_bytes)
+        except ValueError as ve:
+            raise HTTPException(status_code=416, detail=str(ve), headers={"Content-Range": f"bytes */{size_bytes}"})
+        
+        status_code = 200
+        start, end = 0, size_bytes - 1
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size_bytes}"
+        
+        if variant["body"] is not None:
+            return Response(variant["body"][start:end + 1], status_code=status_code,
+                            media_type=variant["media_type"], headers=headers)
+        
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(storage.open_stream(variant["key"], start, end), status_code=status_code,
+                                 media_type=variant["media_type"], headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -164,19 +369,19 @@ async def confirm_inventory_update(
                     # Use 1 as default quantity to add, or you can use suggested_quantity if present
                     quantity = ingredient.get("suggested_quantity", 1)
                     processed_updates[ingredient["ingredient_name"]] = quantity  # Or quantity if you want to use actual values
-
-                    print(f"Raw detected ingredient: {ingredient}")
-                    print(f"Suggested quantity: {ingredient.get('suggested_quantity')}")
-                    print(f"Final quantity to add: {quantity}")
         else:
             # Already in the correct format
             processed_updates = updates
         
-        # Log what we're updating for debugging
-        print(f"Updating inventory with: {processed_updates}")
+        # One (sampled) debug record per confirmation rather than lines per ingredient
+        logger.debug("Updating inventory from detection", extra={
+            "detection_id": detection_id, "updates": processed_updates
+        })
         
         # Update inventory with confirmed quantities
-        update_result = await update_multiple_inventory_items(processed_updates)
+        update_result = await update_multiple_inventory_items(
+            processed_updates, source="cv_detection", reference_id=detection_id
+        )
         
         
         return {
@@ -1,11 +1,20 @@
 import motor.motor_asyncio
-from pymongo import IndexModel, ASCENDING
+from pymongo import IndexModel, ASCENDING, UpdateOne, ReturnDocument
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 from bson.objectid import ObjectId
 from typing import Dict, List, Optional, Union, Any
+import time
+import asyncio
+import logging
+
+from app.services.db_monitoring import PoolStatsListener, CommandTimingListener
+from app.utils.metrics import METRICS_ENABLED, registry, sample_lines, stage_timer
+from app.services.events import broker, order_delta, movement_delta
+from app.services.response_cache import response_cache
+from app.services.ingredient_index import ingredient_index
 
 # Build path to .env
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent  # Adjust based on your file location
@@ -18,115 +27,370 @@ load_dotenv(dotenv_path=env_path)
 MONGODB_URL = os.getenv("MONGODB_URL")
 DB_NAME = os.getenv("DB_NAME", "warung_bangjul")
 
-# Global variables to hold MongoDB connection objects, initialized in setup_database
+logger = logging.getLogger(__name__)
+
+
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else None
+
+
+# Connection pool settings (PyMongo defaults when unset)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = _optional_int("MONGODB_MAX_IDLE_TIME_MS")
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = _optional_int("MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "20000"))
+MONGODB_SOCKET_TIMEOUT_MS = _optional_int("MONGODB_SOCKET_TIMEOUT_MS")
+# Wire compression in order of preference, e.g. "zstd,snappy,zlib".
+# zstd needs the zstandard package and snappy needs python-snappy;
+# PyMongo skips compressors whose package is not installed.
+MONGODB_COMPRESSORS = os.getenv("MONGODB_COMPRESSORS", "")
+
+# Serverless deployments (Vercel, AWS Lambda) reuse one lazily created client
+# across warm invocations and never create indexes per cold start
+SERVERLESS = os.getenv("SERVERLESS", "").lower() in ("1", "true", "yes") or bool(
+    os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME")
+)
+
+# Collects connection pool statistics for the /health/db endpoint
+pool_listener = PoolStatsListener()
+
+
+def _pool_metrics() -> List[str]:
+    servers = pool_listener.snapshot()
+    lines = []
+    for name, key, documentation in (
+        ("mongodb_pool_open_connections", "open_connections", "Open pooled connections"),
+        ("mongodb_pool_in_use_connections", "in_use_connections", "Connections checked out of the pool"),
+    ):
+        lines += sample_lines(name, documentation, [({"server": server}, stats[key]) for server, stats in servers.items()])
+    lines += sample_lines(
+        "mongodb_pool_checkout_wait_p95_seconds", "95th percentile connection checkout wait",
+        [({"server": server}, stats["checkout_wait_ms"]["p95"] / 1000) for server, stats in servers.items()]
+    )
+    return lines
+
+
+registry.add_collector(_pool_metrics)
+
+
+def get_client_options() -> Dict[str, Any]:
+    """Build AsyncIOMotorClient keyword arguments from the pool configuration"""
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+        "event_listeners": [pool_listener],
+    }
+    if METRICS_ENABLED:
+        options["event_listeners"].append(CommandTimingListener())
+    if MONGODB_MAX_IDLE_TIME_MS is not None:
+        options["maxIdleTimeMS"] = MONGODB_MAX_IDLE_TIME_MS
+    if MONGODB_WAIT_QUEUE_TIMEOUT_MS is not None:
+        options["waitQueueTimeoutMS"] = MONGODB_WAIT_QUEUE_TIMEOUT_MS
+    if MONGODB_SOCKET_TIMEOUT_MS is not None:
+        options["socketTimeoutMS"] = MONGODB_SOCKET_TIMEOUT_MS
+    if MONGODB_COMPRESSORS:
+        options["compressors"] = MONGODB_COMPRESSORS
+    return options
+
+
+# Menu seeded by the schema migrations when a deployment is first initialized
+DEFAULT_MENU = [
+    {
+        "code": "SE",
+        "name": "Chicken with Salted Egg",
+        "price": 130,
+        "ingredients": [
+            {"name": "chicken_breast", "quantity": 150, "unit": "grams"},
+            {"name": "salted_egg_yolk", "quantity": 1.33, "unit": "pieces"},
+            {"name": "flour_marinade", "quantity": 10, "unit": "grams"},
+            {"name": "flour_batter", "quantity": 66.67, "unit": "grams"},
+            {"name": "salt_marinade", "quantity": 0.83, "unit": "grams"},
+            {"name": "salt_batter", "quantity": 1.67, "unit": "grams"},
+            {"name": "fish_sauce", "quantity": 2.5, "unit": "grams"},
+            {"name": "msg", "quantity": 0.83, "unit": "grams"},
+            {"name": "garlic", "quantity": 2.5, "unit": "grams"},
+            {"name": "baking_powder", "quantity": 0.83, "unit": "grams"},
+            {"name": "white_pepper", "quantity": 0.83, "unit": "grams"},
+            {"name": "oyster_sauce", "quantity": 2.5, "unit": "grams"},
+            {"name": "condensed_milk", "quantity": 3.33, "unit": "grams"},
+            {"name": "chili_big", "quantity": 1, "unit": "pieces"},
+            {"name": "chili_small", "quantity": 0.33, "unit": "pieces"},
+            {"name": "lime_leaves", "quantity": 1, "unit": "pieces"},
+            {"name": "butter", "quantity": 5, "unit": "grams"},
+            {"name": "chicken_powder", "quantity": 1.25, "unit": "grams"},
+            {"name": "milk", "quantity": 50, "unit": "mL"}
+        ]
+    },
+    {
+        "code": "T",
+        "name": "Sunny Side Up Egg",
+        "price": 15,
+        "ingredients": [
+            {"name": "chicken_egg", "quantity": 1, "unit": "piece"},
+            {"name": "oil", "quantity": 0.01, "unit": "liter"}
+        ]
+    }
+]
+
+# Default quantities added per detected item, based on defaultquantity.md
+DEFAULT_INGREDIENT_QUANTITIES = [
+    {
+        "ingredient_name": "AP Flour",
+        "default_quantity": 1000.0,
+        "unit": "grams",
+        "packaging_description": "bag"
+    },
+    {
+        "ingredient_name": "Salt",
+        "default_quantity": 1000.0,
+        "unit": "grams",
+        "packaging_description": "pack"
+    },
+    {
+        "ingredient_name": "Sugar",
+        "default_quantity": 2000.0,
+        "unit": "grams",
+        "packaging_description": "bag"
+    },
+    {
+        "ingredient_name": "Egg",
+        "default_quantity": 10.0,
+        "unit": "pieces",
+        "packaging_description": "carton",
+        "aliases": ["chicken_egg"]
+    },
+    {
+        "ingredient_name": "Onion",
+        "default_quantity": 1.0,
+        "unit": "pieces",
+        "packaging_description": "single"
+    },
+    {
+        "ingredient_name": "Baking Powder",
+        "default_quantity": 90.0,
+        "unit": "grams",
+        "packaging_description": "bottle"
+    },
+    {
+        "ingredient_name": "Rice Flour",
+        "default_quantity": 600.0,
+        "unit": "grams",
+        "packaging_description": "bag"
+    },
+    # Keep some of the original items that might be used in the menu
+    {
+        "ingredient_name": "flour_marinade",
+        "default_quantity": 1000.0,
+        "unit": "grams",
+        "packaging_description": "pack"
+    },
+    {
+        "ingredient_name": "flour_batter",
+        "default_quantity": 1000.0,
+        "unit": "grams",
+        "packaging_description": "pack"
+    },
+    {
+        "ingredient_name": "salt_marinade",
+        "default_quantity": 500.0,
+        "unit": "grams",
+        "packaging_description": "pack"
+    },
+    {
+        "ingredient_name": "salt_batter",
+        "default_quantity": 500.0,
+        "unit": "grams",
+        "packaging_description": "pack"
+    },
+    {
+        "ingredient_name": "chicken_breast",
+        "default_quantity": 1000.0,
+        "unit": "grams",
+        "packaging_description": "pack"
+    },
+    {
+        "ingredient_name": "milk",
+        "default_quantity": 1000.0,
+        "unit": "mL",
+        "packaging_description": "carton"
+    }
+]
+
+# Global variables to hold MongoDB connection objects, initialized in connect_database
 client = None
 db = None
 
-# Collections - these will be initialized in setup_database
+# Collections - these will be initialized in connect_database
 orders_collection = None
 menu_collection = None
 inventory_collection = None
 ingredient_defaults_collection = None
+schema_version_collection = None
+inventory_movements_collection = None
+inventory_snapshots_collection = None
+
+# Sources recorded on inventory movements
+MOVEMENT_SOURCES = ("cv_detection", "order", "manual")
+
+# ID of the document in schema_version holding the applied migration version
+SCHEMA_VERSION_ID = "schema"
+
+def connect_database():
+    """
+    Create the MongoDB client and collection handles if they do not exist yet
+
+    Creating the client does no network I/O; connections are opened on first
+    use and pooled. Module state survives between warm serverless invocations,
+    so after the first call this is just a None check.
+
+    Returns:
+        The database handle
+    """
+    global client, db, orders_collection, menu_collection, inventory_collection, ingredient_defaults_collection
+    global schema_version_collection, inventory_movements_collection, inventory_snapshots_collection
+
+    if client is None:
+        client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL, **get_client_options())
+        db = client[DB_NAME]
+
+        orders_collection = db.orders
+        menu_collection = db.menu
+        inventory_collection = db.inventory
+        ingredient_defaults_collection = db.ingredient_defaults
+        schema_version_collection = db.schema_version
+        inventory_movements_collection = db.inventory_movements
+        inventory_snapshots_collection = db.inventory_snapshots
+
+    return db
 
 async def setup_database():
-    """Set up database indexes and initial data if needed"""
+    """Connect to the database and check that the deployment is reachable
+    
+    Indexes and seed data are managed by the versioned migrations in
+    app/services/migrations.py, applied once by initialize_db.py.
+    """
     try:
-        global client, db, orders_collection, menu_collection, inventory_collection, ingredient_defaults_collection
-        
-        # Create MongoDB client
-        client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
-        db = client[DB_NAME]
+        # Create MongoDB client and collection handles
+        connect_database()
 
         # Test MongoDB Connection
         try:
             await client.admin.command('ping')
-            print("Pinged your deployment. You successfully connected to MongoDB!")
+            logger.info("Pinged your deployment. You successfully connected to MongoDB!")
         except Exception as e:
-            print(f"MongoDB connection error: {e}")
+            logger.error("MongoDB connection error: %s", e)
             return False
-            
-        # Initialize collections
-        orders_collection = db.orders
-        menu_collection = db.menu
-        inventory_collection = db.inventory
-        ingredient_defaults_collection = db.ingredient_defaults
-        
-        # Create indexes for better query performance
-        order_indexes = [
-            IndexModel([("customer_name", ASCENDING)]),
-            IndexModel([("order_date", ASCENDING)]),
-            IndexModel([("status", ASCENDING)])
-        ]
-
-        inventory_indexes = [
-            IndexModel([("ingredient_name", ASCENDING)], unique=True)
-        ]
-        
-        # Create indexes
-        await orders_collection.create_indexes(order_indexes)
-        await inventory_collection.create_indexes(inventory_indexes)
-        print("Database indexes created successfully.")
-        
-        # Check if menu collection has data, if not, initialize with default menu
-        if await menu_collection.count_documents({}) == 0:
-            default_menu = [
-                {
-                    "code": "SE",
-                    "name": "Chicken with Salted Egg",
-                    "price": 130,
-                    "ingredients": [
-                        {"name": "chicken_breast", "quantity": 150, "unit": "grams"},
-                        {"name": "salted_egg_yolk", "quantity": 1.33, "unit": "pieces"},
-                        {"name": "flour_marinade", "quantity": 10, "unit": "grams"},
-                        {"name": "flour_batter", "quantity": 66.67, "unit": "grams"},
-                        {"name": "salt_marinade", "quantity": 0.83, "unit": "grams"},
-                        {"name": "salt_batter", "quantity": 1.67, "unit": "grams"},
-                        {"name": "fish_sauce", "quantity": 2.5, "unit": "grams"},
-                        {"name": "msg", "quantity": 0.83, "unit": "grams"},
-                        {"name": "garlic", "quantity": 2.5, "unit": "grams"},
-                        {"name": "baking_powder", "quantity": 0.83, "unit": "grams"},
-                        {"name": "white_pepper", "quantity": 0.83, "unit": "grams"},
-                        {"name": "oyster_sauce", "quantity": 2.5, "unit": "grams"},
-                        {"name": "condensed_milk", "quantity": 3.33, "unit": "grams"},
-                        {"name": "chili_big", "quantity": 1, "unit": "pieces"},
-                        {"name": "chili_small", "quantity": 0.33, "unit": "pieces"},
-                        {"name": "lime_leaves", "quantity": 1, "unit": "pieces"},
-                        {"name": "butter", "quantity": 5, "unit": "grams"},
-                        {"name": "chicken_powder", "quantity": 1.25, "unit": "grams"},
-                        {"name": "milk", "quantity": 50, "unit": "mL"}
-                    ]
-                },
-                {
-                    "code": "T",
-                    "name": "Sunny Side Up Egg",
-                    "price": 15,
-                    "ingredients": [
-                        {"name": "chicken_egg", "quantity": 1, "unit": "piece"},
-                        {"name": "oil", "quantity": 0.01, "unit": "liter"}
-                    ]
-                }
-            ]
-            await menu_collection.insert_many(default_menu)
-            print("Default menu items added to database.")
-            
-            # Initialize inventory with ingredients from menu
-            await initialize_inventory_from_menu()
-            
-            # Initialize default quantities for ingredients
-            await initialize_default_quantities()
         
         return True
     except Exception as e:
-        print(f"Error setting up database: {e}")
+        logger.error("Error setting up database: %s", e)
         return False
 
+async def get_schema_version() -> int:
+    """Get the version of the last applied schema migration (0 if none)"""
+    document = await schema_version_collection.find_one({"_id": SCHEMA_VERSION_ID})
+    return document["version"] if document else 0
+
+async def record_schema_version(version: int, description: str):
+    """Record that a schema migration has been applied"""
+    now = datetime.now()
+    await schema_version_collection.update_one(
+        {"_id": SCHEMA_VERSION_ID},
+        {
+            "$set": {"version": version, "updated_at": now},
+            "$push": {"applied": {"version": version, "description": description, "applied_at": now}}
+        },
+        upsert=True
+    )
+
+async def create_indexes():
+    """Create indexes for better query performance"""
+    order_indexes = [
+        IndexModel([("customer_name", ASCENDING)]),
+        IndexModel([("order_date", ASCENDING)]),
+        IndexModel([("status", ASCENDING)])
+    ]
+
+    menu_indexes = [
+        IndexModel([("code", ASCENDING)])
+    ]
+
+    inventory_indexes = [
+        IndexModel([("ingredient_name", ASCENDING)], unique=True)
+    ]
+
+    ingredient_defaults_indexes = [
+        IndexModel([("ingredient_name", ASCENDING)])
+    ]
+
+    await orders_collection.create_indexes(order_indexes)
+    await menu_collection.create_indexes(menu_indexes)
+    await inventory_collection.create_indexes(inventory_indexes)
+    await ingredient_defaults_collection.create_indexes(ingredient_defaults_indexes)
+    logger.info("Database indexes created successfully.")
+
+async def seed_default_menu():
+    """Add the default menu items that are not in the menu yet, in one bulk write"""
+    operations = [
+        UpdateOne({"code": item["code"]}, {"$setOnInsert": item}, upsert=True)
+        for item in DEFAULT_MENU
+    ]
+    result = await menu_collection.bulk_write(operations, ordered=False)
+    response_cache.invalidate("menu")
+    logger.info("Default menu seeded (%s items added).", result.upserted_count)
+
+async def get_database_health() -> Dict[str, Any]:
+    """Ping the deployment and report connection pool statistics"""
+    if client is None:
+        return {
+            "status": "unavailable",
+            "message": "Database client has not been initialized"
+        }
+
+    try:
+        start = time.perf_counter()
+        await client.admin.command('ping')
+        ping_ms = (time.perf_counter() - start) * 1000
+        status = "ok"
+        message = None
+    except Exception as e:
+        ping_ms = None
+        status = "error"
+        message = str(e)
+
+    options = client.options.pool_options
+    health = {
+        "status": status,
+        "ping_ms": round(ping_ms, 3) if ping_ms is not None else None,
+        "pool_options": {
+            "max_pool_size": options.max_pool_size,
+            "min_pool_size": options.min_pool_size,
+            "max_idle_time_seconds": options.max_idle_time_seconds,
+            "wait_queue_timeout": options.wait_queue_timeout,
+            "compressors": [c.strip() for c in MONGODB_COMPRESSORS.split(",") if c.strip()],
+            "server_selection_timeout": client.options.server_selection_timeout,
+        },
+        "servers": pool_listener.snapshot()
+    }
+    if message:
+        health["message"] = message
+    return health
+
 async def save_order(order_data):
     """Save an order to the database"""
     try:
-        result = await orders_collection.insert_one(order_data)
+        with stage_timer("db_write"):
+            result = await orders_collection.insert_one(order_data)
+        response_cache.invalidate("orders")
+        broker.emit("orders", order_delta(order_data))
         return str(result.inserted_id)
     except Exception as e:
-        print(f"Error saving order: {e}")
+        logger.error("Error saving order: %s", e)
         raise
 
 async def get_orders(start_date=None, end_date=None, status=None):
@@ -147,9 +411,46 @@ async def get_orders(start_date=None, end_date=None, status=None):
         orders = await cursor.to_list(length=100)
         return orders
     except Exception as e:
-        print(f"Error retrieving orders: {e}")
+        logger.error("Error retrieving orders: %s", e)
         raise
         
+async def get_daily_item_counts(after: Optional[datetime], until: datetime) -> List[Dict[str, Any]]:
+    """Roll up ordered quantities per day and menu code for orders in (after, until]
+    
+    Returns:
+        List of {"day": "YYYY-MM-DD", "code": menu code, "quantity": total,
+        "last_order_date": newest order in the group}
+    """
+    order_date = {"$lte": until}
+    if after:
+        order_date["$gt"] = after
+    
+    pipeline = [
+        {"$match": {"order_date": order_date}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$order_date"}},
+                "code": "$items.code"
+            },
+            "quantity": {"$sum": "$items.quantity"},
+            "last_order_date": {"$max": "$order_date"}
+        }}
+    ]
+    try:
+        return [
+            {
+                "day": row["_id"]["day"],
+                "code": row["_id"]["code"],
+                "quantity": row["quantity"],
+                "last_order_date": row["last_order_date"]
+            }
+            async for row in orders_collection.aggregate(pipeline)
+        ]
+    except Exception as e:
+        logger.error("Error rolling up orders: %s", e)
+        raise
+
 async def get_menu_items():
     """Get all menu items with their recipes"""
     try:
@@ -157,7 +458,7 @@ async def get_menu_items():
         menu_items = await cursor.to_list(length=100)
         return menu_items
     except Exception as e:
-        print(f"Error retrieving menu: {e}")
+        logger.error("Error retrieving menu: %s", e)
         raise
 
 async def update_order_status(order_id, new_status):
@@ -167,18 +468,24 @@ async def update_order_status(order_id, new_status):
             {"_id": order_id},
             {"$set": {"status": new_status}}
         )
+        response_cache.invalidate("orders")
         return result.modified_count > 0
     except Exception as e:
-        print(f"Error updating order status: {e}")
+        logger.error("Error updating order status: %s", e)
         raise
 
 # New inventory management functions
 
-async def initialize_inventory_from_menu():
-    """Initialize inventory collection with ingredients from menu"""
+async def initialize_inventory_from_menu(menu_items: Optional[List[Dict]] = None):
+    """Initialize inventory collection with ingredients from menu
+    
+    Args:
+        menu_items: Menu items to take ingredients from (default: the whole menu)
+    """
     try:
         # Get all menu items
-        menu_items = await get_menu_items()
+        if menu_items is None:
+            menu_items = await get_menu_items()
         
         # Extract unique ingredients
         unique_ingredients = {}
@@ -195,136 +502,84 @@ async def initialize_inventory_from_menu():
                         "last_updated": datetime.now()
                     }
         
-        # Add ingredients to inventory collection if they don't exist
-        for name, data in unique_ingredients.items():
-            await inventory_collection.update_one(
-                {"ingredient_name": name},
-                {"$setOnInsert": data},
-                upsert=True
-            )
+        # Add ingredients that don't exist yet in a single round trip
+        if unique_ingredients:
+            await inventory_collection.bulk_write([
+                UpdateOne({"ingredient_name": name}, {"$setOnInsert": data}, upsert=True)
+                for name, data in unique_ingredients.items()
+            ], ordered=False)
+            response_cache.invalidate("inventory")
         
-        print(f"Initialized inventory with {len(unique_ingredients)} ingredients")
+        logger.info("Initialized inventory with %s ingredients", len(unique_ingredients))
         return True
     except Exception as e:
-        print(f"Error initializing inventory: {e}")
+        logger.error("Error initializing inventory: %s", e)
         return False
 
-async def initialize_default_quantities():
-    """Initialize default quantities for ingredients"""
+async def initialize_default_quantities(default_quantities: Optional[List[Dict]] = None):
+    """Initialize default quantities for ingredients
+    
+    Args:
+        default_quantities: Defaults to store (default: DEFAULT_INGREDIENT_QUANTITIES)
+    """
     try:
-        # Define default quantities for ingredients based on defaultquantity.md
-        default_quantities = [
-            {
-                "ingredient_name": "AP Flour",
-                "default_quantity": 1000.0,
-                "unit": "grams",
-                "packaging_description": "bag"
-            },
-            {
-                "ingredient_name": "Salt",
-                "default_quantity": 1000.0,
-                "unit": "grams",
-                "packaging_description": "pack"
-            },
-            {
-                "ingredient_name": "Sugar",
-                "default_quantity": 2000.0,
-                "unit": "grams",
-                "packaging_description": "bag"
-            },
-            {
-                "ingredient_name": "Egg",
-                "default_quantity": 10.0,
-                "unit": "pieces",
-                "packaging_description": "carton"
-            },
-            {
-                "ingredient_name": "Onion",
-                "default_quantity": 1.0,
-                "unit": "pieces",
-                "packaging_description": "single"
-            },
-            {
-                "ingredient_name": "Baking Powder",
-                "default_quantity": 90.0,
-                "unit": "grams",
-                "packaging_description": "bottle"
-            },
-            {
-                "ingredient_name": "Rice Flour",
-                "default_quantity": 600.0,
-                "unit": "grams",
-                "packaging_description": "bag"
-            },
-            # Keep some of the original items that might be used in the menu
-            {
-                "ingredient_name": "Egg",
-                "default_quantity": 10.0,
-                "unit": "pieces",
-                "packaging_description": "carton"
-            },
-            {
-                "ingredient_name": "flour_marinade",
-                "default_quantity": 1000.0,
-                "unit": "grams",
-                "packaging_description": "pack"
-            },
-            {
-                "ingredient_name": "flour_batter",
-                "default_quantity": 1000.0,
-                "unit": "grams",
-                "packaging_description": "pack"
-            },
-            {
-                "ingredient_name": "salt_marinade",
-                "default_quantity": 500.0,
-                "unit": "grams",
-                "packaging_description": "pack"
-            },
-            {
-                "ingredient_name": "salt_batter",
-                "default_quantity": 500.0,
-                "unit": "grams",
-                "packaging_description": "pack"
-            },
-            {
-                "ingredient_name": "chicken_breast",
-                "default_quantity": 1000.0,
-                "unit": "grams",
-                "packaging_description": "pack"
-            },
-            {
-                "ingredient_name": "milk",
-                "default_quantity": 1000.0,
-                "unit": "mL",
-                "packaging_description": "carton"
-            }
-        ]
+        if default_quantities is None:
+            default_quantities = DEFAULT_INGREDIENT_QUANTITIES
+        if not default_quantities:
+            return True
         
-        # Add default quantities to database
-        for default in default_quantities:
-            await ingredient_defaults_collection.update_one(
+        now = datetime.now()
+        
+        # One bulk write per collection instead of two round trips per ingredient
+        await ingredient_defaults_collection.bulk_write([
+            UpdateOne(
                 {"ingredient_name": default["ingredient_name"]},
                 {"$set": default},
                 upsert=True
             )
-            
-            # Also ensure this ingredient exists in the inventory collection
-            await inventory_collection.update_one(
+            for default in default_quantities
+        ], ordered=False)
+        ingredient_index.invalidate()
+        
+        # Also ensure these ingredients exist in the inventory collection
+        await inventory_collection.bulk_write([
+            UpdateOne(
                 {"ingredient_name": default["ingredient_name"]},
                 {"$setOnInsert": {
                     "ingredient_name": default["ingredient_name"],
                     "quantity": 0,
                     "unit": default["unit"],
-                    "last_updated": datetime.now()
+                    "last_updated": now
                 }},
                 upsert=True
             )
+            for default in default_quantities
+        ], ordered=False)
         
-        print(f"Initialized {len(default_quantities)} default quantities")
+        logger.info("Initialized %s default quantities", len(default_quantities))
         return True
     except Exception as e:
-        print(f"Error initializing default quantities: {e}")
+        logger.error("Error initializing default quantities: %s", e)
+        return False
+
+async def import_menu_items(menu_items: List[Dict]):
+    """Insert or replace menu items by code and add their ingredients to the inventory
+    
+    Args:
+        menu_items: Menu items with code, name, price and ingredients
+    """
+    try:
+        if menu_items:
+            result = await menu_collection.bulk_write([
+                UpdateOne({"code": item["code"]}, {"$set": item}, upsert=True)
+                for item in menu_items
+            ], ordered=False)
+            response_cache.invalidate("menu")
+            logger.info("Imported %s menu items (%s new)", len(menu_items), result.upserted_count)
+        
+        return await initialize_inventory_from_menu(menu_items)
+    except Exception as e:
+        logger.error("Error importing menu items: %s", e)
         return False
 
 async def get_inventory_items():
@@ -334,7 +589,7 @@ async def get_inventory_items():
         inventory_items = await cursor.to_list(length=None)
         return inventory_items
     except Exception as e:
-        print(f"Error retrieving inventory: {e}")
+        logger.error("Error retrieving inventory: %s", e)
         raise
 
 async def get_inventory_item(ingredient_name: str):
@@ -343,53 +598,143 @@ async def get_inventory_item(ingredient_name: str):
         item = await inventory_collection.find_one({"ingredient_name": ingredient_name})
         return item
     except Exception as e:
-        print(f"Error retrieving inventory item: {e}")
+        logger.error("Error retrieving inventory item: %s", e)
         raise
 
-async def update_inventory_item(ingredient_name: str, quantity_to_add: float):
+async def record_inventory_movements(movements: List[Dict[str, Any]], source: str,
+                                     reference_ids: Optional[List[str]] = None):
+    """Append stock changes to the inventory_movements ledger
+    
+    Args:
+        movements: List of {"ingredient_name", "delta", "unit"} dictionaries
+        source: What caused the change, one of MOVEMENT_SOURCES
+        reference_ids: Detection or order IDs that caused the change
+    """
+    if source not in MOVEMENT_SOURCES:
+        raise ValueError(f"Unknown movement source: {source}")
+    
+    documents = [
+        {
+            "ingredient_name": movement["ingredient_name"],
+            "delta": movement["delta"],
+            "unit": movement.get("unit"),
+            "source": source,
+            "reference_ids": list(reference_ids or []),
+            "created_at": movement.get("created_at") or datetime.now()
+        }
+        for movement in movements
+        if movement["delta"] != 0
+    ]
+    # Every stock change goes through here, so this also covers the inventory cache
+    response_cache.invalidate("inventory")
+    if documents:
+        await inventory_movements_collection.insert_many(documents, ordered=False)
+        for document in documents:
+            broker.emit("inventory", movement_delta(document))
+    return len(documents)
+
+async def update_inventory_item(ingredient_name: str, quantity_to_add: float,
+                                source: str = "manual", reference_id: Optional[str] = None):
     """Update quantity of a specific inventory item"""
     try:
-        # Get current item
-        current_item = await get_inventory_item(ingredient_name)
+        # Increment in place; no read-modify-write round trip
+        updated_item = await inventory_collection.find_one_and_update(
+            {"ingredient_name": ingredient_name},
+            {
+                "$inc": {"quantity": quantity_to_add},
+                "$set": {"last_updated": datetime.now()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
         
-        if not current_item:
+        if not updated_item:
             return {
                 "success": False,
                 "message": f"Inventory item '{ingredient_name}' not found"
             }
         
-        # Calculate new quantity
-        new_quantity = current_item["quantity"] + quantity_to_add
-        
-        # Update the item
-        result = await inventory_collection.update_one(
-            {"ingredient_name": ingredient_name},
-            {
-                "$set": {
-                    "quantity": new_quantity,
-                    "last_updated": datetime.now()
-                }
-            }
+        await record_inventory_movements(
+            [{"ingredient_name": ingredient_name, "delta": quantity_to_add, "unit": updated_item["unit"]}],
+            source,
+            [reference_id] if reference_id else None
         )
         
+        new_quantity = updated_item["quantity"]
         return {
-            "success": result.modified_count > 0,
+            "success": True,
             "message": f"Updated {ingredient_name} quantity to {new_quantity}",
             "new_quantity": new_quantity,
-            "unit": current_item["unit"]
+            "unit": updated_item["unit"]
         }
     except Exception as e:
-        print(f"Error updating inventory item: {e}")
+        logger.error("Error updating inventory item: %s", e)
         raise
 
-async def update_multiple_inventory_items(updates: Dict[str, float]):
-    """Update multiple inventory items at once"""
+async def update_multiple_inventory_items(updates: Dict[str, float], source: str = "cv_detection",
+                                          reference_id: Optional[str] = None):
+    """Update multiple inventory items at once
+    
+    Args:
+        updates: Dictionary in format {ingredient_name: quantity_to_add}
+        source: Movement source recorded in the ledger
+        reference_id: Detection ID (or other reference) recorded in the ledger
+    """
     try:
-        results = {}
+        updates = {name: float(quantity) for name, quantity in updates.items()}
+        names = list(updates)
+        
+        # Only existing ingredients are updated, as with update_inventory_item
+        existing = {
+            item["ingredient_name"]
+            for item in await inventory_collection.find(
+                {"ingredient_name": {"$in": names}}, {"ingredient_name": 1}
+            ).to_list(length=None)
+        }
+        
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {"ingredient_name": name},
+                {"$inc": {"quantity": updates[name]}, "$set": {"last_updated": now}}
+            )
+            for name in names if name in existing
+        ]
+        if operations:
+            with stage_timer("db_write"):
+                await inventory_collection.bulk_write(operations, ordered=False)
+        
+        # Read the new quantities back in one query
+        updated_items = {
+            item["ingredient_name"]: item
+            for item in await inventory_collection.find(
+                {"ingredient_name": {"$in": list(existing)}}
+            ).to_list(length=None)
+        }
+        
+        await record_inventory_movements(
+            [
+                {"ingredient_name": name, "delta": updates[name], "unit": item["unit"], "created_at": now}
+                for name, item in updated_items.items()
+            ],
+            source,
+            [reference_id] if reference_id else None
+        )
         
-        for ingredient_name, quantity_to_add in updates.items():
-            result = await update_inventory_item(ingredient_name, quantity_to_add)
-            results[ingredient_name] = result
+        results = {}
+        for name in names:
+            item = updated_items.get(name)
+            if item is None:
+                results[name] = {
+                    "success": False,
+                    "message": f"Inventory item '{name}' not found"
+                }
+            else:
+                results[name] = {
+                    "success": True,
+                    "message": f"Updated {name} quantity to {item['quantity']}",
+                    "new_quantity": item["quantity"],
+                    "unit": item["unit"]
+                }
         
         return {
             "success": True,
@@ -397,9 +742,219 @@ async def update_multiple_inventory_items(updates: Dict[str, float]):
             "results": results
         }
     except Exception as e:
-        print(f"Error updating multiple inventory items: {e}")
+        logger.error("Error updating multiple inventory items: %s", e)
+        raise
+
+async def set_inventory_quantities(updates: Dict[str, Dict[str, Any]]):
+    """Set absolute quantities for inventory items, creating missing ones
+    
+    The difference to the previous quantity is recorded as a manual movement.
+    
+    Args:
+        updates: Dictionary in format {ingredient_name: {"amount": value, "unit": unit}}
+    """
+    try:
+        if not updates:
+            return 0
+        
+        now = datetime.now()
+        names = list(updates)
+        # Each item is set and its previous quantity read in one atomic step, so
+        # a deduction running at the same time cannot slip between them
+        previous = await asyncio.gather(*[
+            inventory_collection.find_one_and_update(
+                {"ingredient_name": name},
+                {"$set": {
+                    "quantity": float(updates[name]["amount"]),
+                    "unit": updates[name]["unit"],
+                    "last_updated": now
+                }},
+                projection={"quantity": 1},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+            for name in names
+        ])
+        
+        await record_inventory_movements(
+            [
+                {
+                    "ingredient_name": name,
+                    "delta": float(updates[name]["amount"]) - ((before or {}).get("quantity") or 0),
+                    "unit": updates[name]["unit"],
+                    "created_at": now
+                }
+                for name, before in zip(names, previous)
+            ],
+            "manual"
+        )
+        # Every item is written (last_updated always changes) or created
+        return len(names)
+    except Exception as e:
+        logger.error("Error setting inventory quantities: %s", e)
+        raise
+
+async def deduct_inventory_quantities(deductions: Dict[str, float], units: Optional[Dict[str, str]] = None,
+                                      order_ids: Optional[List[str]] = None) -> List[str]:
+    """Subtract quantities from inventory items that still have enough stock
+    
+    Each deduction only applies if the item holds at least the amount, so
+    concurrent deductions can never push stock below zero.
+    
+    Args:
+        deductions: Dictionary in format {ingredient_name: amount_to_subtract}
+        units: Units of the deducted ingredients, recorded in the ledger
+        order_ids: IDs of the orders the deduction is for, recorded in the ledger
+        
+    Returns:
+        Names of the ingredients that were deducted
+    """
+    try:
+        now = datetime.now()
+        names = list(deductions)
+        # Conditional updates run concurrently so we learn which ones applied
+        results = await asyncio.gather(*[
+            inventory_collection.update_one(
+                {"ingredient_name": name, "quantity": {"$gte": deductions[name]}},
+                {"$inc": {"quantity": -deductions[name]}, "$set": {"last_updated": now}}
+            )
+            for name in names
+        ])
+        deducted = [name for name, result in zip(names, results) if result.modified_count]
+        
+        units = units or {}
+        await record_inventory_movements(
+            [
+                {"ingredient_name": name, "delta": -deductions[name], "unit": units.get(name), "created_at": now}
+                for name in deducted
+            ],
+            "order",
+            order_ids
+        )
+        return deducted
+    except Exception as e:
+        logger.error("Error deducting inventory quantities: %s", e)
         raise
 
+async def migrate_legacy_inventory_document():
+    """Move the old single {"_id": "inventory"} document into per-ingredient items"""
+    legacy_collection = db.ingredients
+    legacy = await legacy_collection.find_one({"_id": "inventory"})
+    if not legacy:
+        logger.info("No legacy inventory document to migrate.")
+        return
+    
+    fallback_time = legacy.get("last_updated", datetime.now())
+    operations = [
+        UpdateOne(
+            {"ingredient_name": name},
+            {"$set": {
+                "quantity": float(details.get("amount", 0)),
+                "unit": details.get("unit", "unit"),
+                "last_updated": fallback_time
+            }},
+            upsert=True
+        )
+        for name, details in legacy.items()
+        if name not in ("_id", "last_updated") and isinstance(details, dict)
+    ]
+    if operations:
+        await inventory_collection.bulk_write(operations, ordered=False)
+    
+    await legacy_collection.delete_one({"_id": "inventory"})
+    response_cache.invalidate("inventory")
+    logger.info("Migrated %s ingredients from the legacy inventory document.", len(operations))
+
+async def create_ledger_indexes():
+    """Create indexes for the inventory movement ledger and its snapshots"""
+    await inventory_movements_collection.create_indexes([
+        IndexModel([("created_at", ASCENDING)]),
+        IndexModel([("ingredient_name", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("source", ASCENDING), ("reference_ids", ASCENDING)])
+    ])
+    await inventory_snapshots_collection.create_indexes([
+        IndexModel([("taken_at", ASCENDING)], unique=True)
+    ])
+    logger.info("Inventory ledger indexes created successfully.")
+
+async def get_inventory_movements(ingredient_name: Optional[str] = None, source: Optional[str] = None,
+                                  reference_id: Optional[str] = None, start_date: Optional[datetime] = None,
+                                  end_date: Optional[datetime] = None, limit: int = 100):
+    """Get inventory movements, newest first, with optional filtering"""
+    query = {}
+    if ingredient_name:
+        query["ingredient_name"] = ingredient_name
+    if source:
+        query["source"] = source
+    if reference_id:
+        query["reference_ids"] = reference_id
+    if start_date or end_date:
+        query["created_at"] = {}
+        if start_date:
+            query["created_at"]["$gte"] = start_date
+        if end_date:
+            query["created_at"]["$lte"] = end_date
+    
+    cursor = inventory_movements_collection.find(query).sort("created_at", -1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+async def count_inventory_movements(after: Optional[datetime] = None) -> int:
+    """Count movements recorded after a point in time (all movements if None)"""
+    query = {"created_at": {"$gt": after}} if after else {}
+    return await inventory_movements_collection.count_documents(query)
+
+async def sum_inventory_movements(after: Optional[datetime], until: datetime) -> Dict[str, Dict[str, Any]]:
+    """Sum movement deltas per ingredient in the window (after, until]
+    
+    Returns:
+        Dictionary in format {ingredient_name: {"delta": total, "unit": unit, "count": movements}}
+    """
+    created_at = {"$lte": until}
+    if after:
+        created_at["$gt"] = after
+    
+    pipeline = [
+        {"$match": {"created_at": created_at}},
+        {"$sort": {"created_at": 1}},
+        {"$group": {
+            "_id": "$ingredient_name",
+            "delta": {"$sum": "$delta"},
+            "unit": {"$last": "$unit"},
+            "count": {"$sum": 1}
+        }}
+    ]
+    totals = {}
+    async for row in inventory_movements_collection.aggregate(pipeline):
+        totals[row["_id"]] = {"delta": row["delta"], "unit": row["unit"], "count": row["count"]}
+    return totals
+
+async def get_latest_inventory_snapshot(at: Optional[datetime] = None):
+    """Get the newest inventory snapshot taken at or before a point in time"""
+    query = {"taken_at": {"$lte": at}} if at else {}
+    return await inventory_snapshots_collection.find_one(query, sort=[("taken_at", -1)])
+
+async def save_inventory_snapshot(taken_at: datetime, quantities: Dict[str, Dict[str, Any]],
+                                  movement_count: int = 0):
+    """Store the stock of every ingredient at a point in time
+    
+    Args:
+        taken_at: Time the snapshot represents
+        quantities: Dictionary in format {ingredient_name: {"quantity": value, "unit": unit}}
+        movement_count: Number of movements folded in since the previous snapshot
+    """
+    # Stored as a list because ingredient names may contain "." or "$"
+    snapshot = {
+        "taken_at": taken_at,
+        "items": [
+            {"ingredient_name": name, "quantity": details["quantity"], "unit": details.get("unit")}
+            for name, details in quantities.items()
+        ],
+        "movement_count": movement_count,
+        "created_at": datetime.now()
+    }
+    await inventory_snapshots_collection.replace_one({"taken_at": taken_at}, snapshot, upsert=True)
+    return snapshot
+
 async def get_ingredient_default_quantities():
     """Get all default quantities for ingredients"""
     try:
@@ -407,7 +962,7 @@ async def get_ingredient_default_quantities():
         defaults = await cursor.to_list(length=None)
         return defaults
     except Exception as e:
-        print(f"Error retrieving default quantities: {e}")
+        logger.error("Error retrieving default quantities: %s", e)
         raise
 
 async def get_ingredient_default(ingredient_name: str):
@@ -416,7 +971,7 @@ async def get_ingredient_default(ingredient_name: str):
         default = await ingredient_defaults_collection.find_one({"ingredient_name": ingredient_name})
         return default
     except Exception as e:
-        print(f"Error retrieving default quantity: {e}")
+        logger.error("Error retrieving default quantity: %s", e)
         raise
 
 async def update_ingredient_default(ingredient_name: str, default_data: Dict[str, Any]):
@@ -430,11 +985,12 @@ async def update_ingredient_default(ingredient_name: str, default_data: Dict[str
             {"$set": default_data},
             upsert=True
         )
+        ingredient_index.invalidate()
         
         return {
             "success": True,
             "message": f"Updated default quantity for {ingredient_name}"
         }
     except Exception as e:
-        print(f"Error updating default quantity: {e}")
+        logger.error("Error updating default quantity: %s", e)
         raise
\ No newline at end of file
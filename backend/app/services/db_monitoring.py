@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from pymongo import monitoring
+
+from app.utils.metrics import mongodb_command_duration
+
+# Number of recent checkouts used for wait time statistics
+WAIT_TIME_WINDOW = 1000
+
+
+def _percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Collect connection pool statistics from PyMongo pool events
+
+    Tracks open and checked-out connections per server, checkout failures
+    and how long requests waited to get a connection from the pool.
+    """
+
+    def __init__(self, window: int = WAIT_TIME_WINDOW):
+        self._lock = threading.Lock()
+        # PyMongo fires checkout events on the thread doing the checkout
+        self._local = threading.local()
+        self._window = window
+        self._servers = {}
+
+    def _server(self, address) -> Dict:
+        key = f"{address[0]}:{address[1]}"
+        if key not in self._servers:
+            self._servers[key] = {
+                "open_connections": 0,
+                "in_use_connections": 0,
+                "checkouts": 0,
+                "failed_checkouts": 0,
+                "pool_cleared": 0,
+                "wait_times_ms": deque(maxlen=self._window),
+            }
+        return self._servers[key]
+
+    def pool_created(self, event):
+        with self._lock:
+            self._server(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._server(event.address)["pool_cleared"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servers.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            self._server(event.address)["open_connections"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["open_connections"] = max(0, server["open_connections"] - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        with self._lock:
+            self._server(event.address)["failed_checkouts"] += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        with self._lock:
+            server = self._server(event.address)
+            server["checkouts"] += 1
+            server["in_use_connections"] += 1
+            if started is not None:
+                server["wait_times_ms"].append((time.perf_counter() - started) * 1000)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            server = self._server(event.address)
+            server["in_use_connections"] = max(0, server["in_use_connections"] - 1)
+
+    def snapshot(self) -> Dict:
+        """
+        Get current pool statistics per server
+
+        Returns:
+            Dictionary keyed by "host:port" with connection counts and
+            checkout wait time statistics in milliseconds
+        """
+        with self._lock:
+            # Copy the wait times too; the listener keeps appending to the deque
+            servers = {
+                key: {**stats, "wait_times_ms": list(stats["wait_times_ms"])}
+                for key, stats in self._servers.items()
+            }
+
+        for stats in servers.values():
+            waits = sorted(stats.pop("wait_times_ms"))
+            stats["checkout_wait_ms"] = {
+                "samples": len(waits),
+                "avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "p50": round(_percentile(waits, 0.50), 3),
+                "p95": round(_percentile(waits, 0.95), 3),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            }
+        return servers
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """Record the latency of every MongoDB command in the metrics registry"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1e6, event.command_name, "success")
+
+    def failed(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1e6, event.command_name, "failure")
@@ -0,0 +1,223 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import cv2
+import numpy as np
+
+from app.utils.lru import LRUCache
+
+# Cache configuration
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "128"))
+# Off by default: a new photo of an unchanged-looking shelf must not reuse old counts
+PERCEPTUAL_HASH_ENABLED = os.getenv("DETECTION_CACHE_PHASH", "false").lower() in ("1", "true", "yes")
+# Maximum Hamming distance (out of 64 bits) for two uploads to be compared pixel by pixel
+PERCEPTUAL_HASH_MAX_DISTANCE = int(os.getenv("DETECTION_CACHE_PHASH_DISTANCE", "4"))
+# Largest mean difference (0-1) allowed in any block of the thumbnails of a near duplicate
+PIXEL_DIFF_MAX = float(os.getenv("DETECTION_CACHE_PIXEL_DIFF", "0.03"))
+
+# Side of the grayscale thumbnail compared for near duplicates, and of the blocks it is split into
+_THUMBNAIL_SIZE = 64
+_BLOCK_SIZE = 8
+
+
+def compute_content_hash(file_data: bytes) -> str:
+    """
+    Compute the SHA-256 digest of the uploaded bytes
+
+    Args:
+        file_data: Binary image data
+
+    Returns:
+        Hex digest identifying byte-identical uploads
+    """
+    return hashlib.sha256(file_data).hexdigest()
+
+
+def compute_perceptual_hash(file_data: bytes) -> Optional[int]:
+    """
+    Compute a 64-bit difference hash (dHash) of the image
+
+    Re-encoded or resized copies of the same photo produce hashes within
+    a few bits of each other, unlike the SHA-256 digest.
+
+    Args:
+        file_data: Binary image data
+
+    Returns:
+        64-bit integer hash, or None if the image cannot be decoded
+    """
+    return _difference_hash(_decode_reduced(file_data))
+
+
+def _decode_reduced(file_data: bytes) -> Optional[np.ndarray]:
+    buffer = np.frombuffer(file_data, dtype=np.uint8)
+    # Decoding at 1/8 scale is plenty for the thumbnails and much cheaper
+    img = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None or img.size == 0:
+        img = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    return img
+
+
+def _read_reduced(image_path: Path) -> Optional[np.ndarray]:
+    img = cv2.imread(str(image_path), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if img is None or img.size == 0:
+        img = cv2.imread(str(image_path), cv2.IMREAD_GRAYSCALE)
+    return img
+
+
+def compute_perceptual_hash_file(image_path: Path) -> Optional[int]:
+    """
+    Compute the dHash of an image file without reading it into memory first
+
+    Args:
+        image_path: Path to the image
+
+    Returns:
+        64-bit integer hash, or None if the image cannot be decoded
+    """
+    return _difference_hash(_read_reduced(image_path))
+
+
+def _difference_hash(img: Optional[np.ndarray]) -> Optional[int]:
+    if img is None or img.size == 0:
+        return None
+
+    thumbnail = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _pixel_thumbnail(img: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """Grayscale float thumbnail in [0, 1] used to confirm near-duplicate matches"""
+    if img is None or img.size == 0:
+        return None
+    thumbnail = cv2.resize(img, (_THUMBNAIL_SIZE, _THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    return thumbnail.astype(np.float32) / 255.0
+
+
+def max_block_difference(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Largest mean absolute difference over the blocks of two thumbnails
+
+    Re-encoding spreads a tiny difference over the whole image, while an
+    item added to or taken off a shelf changes a few blocks a lot, which
+    a whole-image hash or mean can miss.
+    """
+    blocks = _THUMBNAIL_SIZE // _BLOCK_SIZE
+    diff = np.abs(a - b).reshape(blocks, _BLOCK_SIZE, blocks, _BLOCK_SIZE)
+    return float(diff.mean(axis=(1, 3)).max())
+
+
+def _perceptual_fingerprint(img: Optional[np.ndarray]) -> Dict:
+    if not PERCEPTUAL_HASH_ENABLED:
+        return {"perceptual_hash": None, "thumbnail": None}
+    return {"perceptual_hash": _difference_hash(img), "thumbnail": _pixel_thumbnail(img)}
+
+
+def fingerprint_image(file_data: bytes, variant: str = "default") -> Dict:
+    """
+    Build the cache key for an uploaded image
+
+    Args:
+        file_data: Binary image data
+        variant: Inference options the result depends on, so the same photo
+            processed with different settings is cached separately
+
+    Returns:
+        Dictionary with the content hash, inference variant and (when
+        enabled) the perceptual hash and thumbnail
+    """
+    return {
+        "content_hash": compute_content_hash(file_data),
+        "variant": variant,
+        **_perceptual_fingerprint(_decode_reduced(file_data) if PERCEPTUAL_HASH_ENABLED else None),
+    }
+
+
+def fingerprint_stored_image(content_hash: str, image_path: Path, variant: str = "default") -> Dict:
+    """
+    Build the cache key for an upload that was streamed to storage
+
+    Args:
+        content_hash: SHA-256 hex digest computed while the upload was written
+        image_path: Local path to the stored image
+        variant: Inference options the result depends on
+
+    Returns:
+        Dictionary in the same form as fingerprint_image
+    """
+    return {
+        "content_hash": content_hash,
+        "variant": variant,
+        **_perceptual_fingerprint(_read_reduced(image_path) if PERCEPTUAL_HASH_ENABLED else None),
+    }
+
+
+class DetectionCache:
+    """LRU cache mapping image fingerprints to detection IDs"""
+
+    def __init__(self, maxsize: int = DETECTION_CACHE_SIZE,
+                 on_evict: Optional[Callable[[str], None]] = None,
+                 max_distance: int = PERCEPTUAL_HASH_MAX_DISTANCE,
+                 max_pixel_difference: float = PIXEL_DIFF_MAX):
+        self._on_evict = on_evict
+        self.max_distance = max_distance
+        self.max_pixel_difference = max_pixel_difference
+        self._entries = LRUCache(maxsize, on_evict=self._evicted)
+
+    def _evicted(self, key: tuple, entry: Dict) -> None:
+        if self._on_evict:
+            self._on_evict(entry["detection_id"])
+
+    def lookup(self, fingerprint: Dict) -> Optional[str]:
+        """
+        Find the detection ID of a previously processed copy of an image
+
+        Args:
+            fingerprint: Result of fingerprint_image
+
+        Returns:
+            Cached detection ID or None on a miss
+        """
+        variant = fingerprint.get("variant", "default")
+        entry = self._entries.get((fingerprint["content_hash"], variant))
+        if entry:
+            return entry["detection_id"]
+
+        perceptual_hash = fingerprint.get("perceptual_hash")
+        thumbnail = fingerprint.get("thumbnail")
+        if perceptual_hash is None or thumbnail is None:
+            return None
+
+        # Near-duplicate search; the cache is small so a linear scan is cheap.
+        # A close hash only nominates a candidate, the thumbnails must agree too
+        for key, entry in self._entries.items():
+            if entry["perceptual_hash"] is None or entry["thumbnail"] is None or key[1] != variant:
+                continue
+            if bin(entry["perceptual_hash"] ^ perceptual_hash).count("1") > self.max_distance:
+                continue
+            if max_block_difference(entry["thumbnail"], thumbnail) <= self.max_pixel_difference:
+                self._entries.get(key)  # Mark as recently used
+                return entry["detection_id"]
+
+        return None
+
+    def store(self, fingerprint: Dict, detection_id: str) -> None:
+        """Remember the detection produced for an image fingerprint"""
+        key = (fingerprint["content_hash"], fingerprint.get("variant", "default"))
+        self._entries.set(key, {
+            "detection_id": detection_id,
+            "perceptual_hash": fingerprint.get("perceptual_hash"),
+            "thumbnail": fingerprint.get("thumbnail"),
+        })
+
+    def discard(self, detection_id: str) -> None:
+        """Drop every fingerprint pointing at a detection without triggering eviction"""
+        for key, entry in self._entries.items():
+            if entry["detection_id"] == detection_id:
+                self._entries.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
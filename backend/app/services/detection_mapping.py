@@ -0,0 +1,192 @@
+"""
+Post-processing of YOLO detections
+
+Works on the (N, 6) box array [x1, y1, x2, y2, confidence, class_id] that
+the model returns, pulled off the device once per image. Counts and best
+confidence per class are aggregated with NumPy instead of per-box Python
+objects. Kept free of the YOLO imports so it can be used and tested
+without the model.
+"""
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from app.services.ingredient_index import ClassNames, ClassTable
+
+
+def split_detections(data: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split a box array into class IDs, confidences and corner coordinates
+
+    Args:
+        data: (N, 6) array of [x1, y1, x2, y2, confidence, class_id]
+
+    Returns:
+        (class_ids as int64, confidences as float32, (N, 4) xyxy as float32)
+    """
+    data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+    return data[:, 5].astype(np.int64), data[:, 4], data[:, :4]
+
+
+def aggregate_by_class(class_ids: np.ndarray, confidences: np.ndarray,
+                       num_classes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Count detections and find the highest confidence per class
+
+    Args:
+        class_ids: Class ID of each detection
+        confidences: Confidence of each detection
+        num_classes: Length of the output arrays (at least max class ID + 1)
+
+    Returns:
+        (counts, max_confidences), both indexed by class ID; classes
+        without detections have a count and confidence of 0
+    """
+    counts = np.bincount(class_ids, minlength=num_classes)
+    max_confidences = np.zeros(len(counts), dtype=np.float32)
+    np.maximum.at(max_confidences, class_ids, confidences)
+    return counts, max_confidences
+
+
+def confidence_mask(class_ids: np.ndarray, confidences: np.ndarray, names: ClassNames, conf: float,
+                    class_conf: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Select detections at or above their class's confidence threshold
+
+    Args:
+        class_ids: Class ID of each detection
+        confidences: Confidence of each detection
+        names: Class names of the model
+        conf: Threshold for classes without their own
+        class_conf: Per-class thresholds keyed by class name
+
+    Returns:
+        Boolean mask over the detections
+
+    Raises:
+        ValueError: If class_conf names a class the model does not have
+    """
+    class_ids = np.asarray(class_ids, dtype=np.int64)
+    if not class_conf:
+        return np.asarray(confidences) >= conf
+
+    ids = {name: class_id for class_id, name in _enumerate_names(names)}
+    unknown = sorted(set(class_conf) - set(ids))
+    if unknown:
+        raise ValueError(f"Unknown classes: {', '.join(unknown)}")
+
+    size = max(max(ids.values(), default=-1) + 1, int(class_ids.max()) + 1 if len(class_ids) else 0)
+    thresholds = np.full(size, conf, dtype=np.float32)
+    for name, value in class_conf.items():
+        thresholds[ids[name]] = value
+    return np.asarray(confidences) >= thresholds[class_ids]
+
+
+def _enumerate_names(names: ClassNames):
+    return names.items() if isinstance(names, Mapping) else enumerate(names)
+
+
+def _class_name(names: ClassNames, class_id: int) -> str:
+    try:
+        return names[class_id]
+    except (KeyError, IndexError):
+        return str(class_id)
+
+
+def map_detections_to_ingredients(class_ids: np.ndarray, confidences: np.ndarray,
+                                  table: ClassTable) -> List[Dict]:
+    """
+    Map detected objects to ingredients with default quantities
+
+    Args:
+        class_ids: Class ID of each detection
+        confidences: Confidence of each detection
+        table: Class to ingredient table from build_class_table
+
+    Returns:
+        List of ingredients with suggested quantities, in order of first
+        detection; classes mapped to the same ingredient are counted together
+    """
+    if len(class_ids) == 0:
+        return []
+
+    # One lookup turns class IDs into ingredient indices
+    ingredient_ids = table.ingredient_ids[np.asarray(class_ids, dtype=np.int64)]
+    counts, max_confidences = aggregate_by_class(ingredient_ids, np.asarray(confidences),
+                                                 len(table.ingredient_names))
+
+    # Present ingredients in the order they were first detected
+    present, first_seen = np.unique(ingredient_ids, return_index=True)
+    present = present[np.argsort(first_seen)]
+    quantities = table.quantities[present]
+    present_counts = counts[present]
+    suggested = quantities * present_counts
+
+    ingredients = []
+    for index, count, confidence, quantity, has_default in zip(
+        present.tolist(), present_counts.tolist(), max_confidences[present].tolist(),
+        suggested.tolist(), (~np.isnan(quantities)).tolist()
+    ):
+        ingredients.append({
+            "ingredient_name": table.ingredient_names[index],
+            "confidence": confidence,
+            # Without a default, the count is used as the quantity
+            "suggested_quantity": quantity if has_default else count,
+            "unit": table.units[index],
+            "count": count  # Adding count for transparency
+        })
+    return ingredients
+
+
+def detection_boxes(class_ids: np.ndarray, confidences: np.ndarray, xyxy: np.ndarray,
+                    names: ClassNames) -> List[Dict]:
+    """
+    Box-level detections for drawing overlays on the client
+
+    Args:
+        class_ids: Class ID of each detection
+        confidences: Confidence of each detection
+        xyxy: (N, 4) corners in pixels of the decoded image the boxes were
+            detected on, reported as image_size (a reduced decode can be
+            smaller than the upload)
+        names: Class names of the model
+
+    Returns:
+        List of {"class_id", "class_name", "confidence", "box": [x1, y1, x2, y2]}
+    """
+    boxes = np.round(np.asarray(xyxy, dtype=np.float64), 1).tolist()
+    confidences = np.round(np.asarray(confidences, dtype=np.float64), 4).tolist()
+    return [
+        {
+            "class_id": class_id,
+            "class_name": _class_name(names, class_id),
+            "confidence": confidence,
+            "box": box
+        }
+        for class_id, confidence, box in zip(np.asarray(class_ids).tolist(), confidences, boxes)
+    ]
+
+
+def filter_detections(detections: Tuple[np.ndarray, np.ndarray, np.ndarray], names: ClassNames,
+                      table: ClassTable, conf: float,
+                      class_conf: Optional[Dict[str, float]] = None) -> Dict[str, List[Dict]]:
+    """
+    Re-threshold stored detections and aggregate them into ingredients
+
+    Args:
+        detections: (class_ids, confidences, xyxy) from split_detections
+        names: Class names of the model
+        table: Class to ingredient table from build_class_table
+        conf: Threshold for classes without their own
+        class_conf: Per-class thresholds keyed by class name
+
+    Returns:
+        Dictionary with the "ingredients" and "boxes" that pass the thresholds
+    """
+    class_ids, confidences, xyxy = detections
+    mask = confidence_mask(class_ids, confidences, names, conf, class_conf)
+    class_ids, confidences, xyxy = class_ids[mask], confidences[mask], xyxy[mask]
+    return {
+        "ingredients": map_detections_to_ingredients(class_ids, confidences, table),
+        "boxes": detection_boxes(class_ids, confidences, xyxy, names)
+    }
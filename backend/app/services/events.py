@@ -0,0 +1,214 @@
+"""
+Real-time change events
+
+Order inserts and inventory movements are published from MongoDB change
+streams when the deployment supports them (replica sets and Atlas), so
+every API instance sees writes made by the others. Without change streams
+the write paths publish in-process instead. Detection results only live
+in memory and are always published in-process.
+
+Events carry compact deltas rather than whole documents; clients receive
+them over Server-Sent Events (see /api/events). Event IDs are
+"<epoch>-<sequence>", the epoch being random per process: a client that
+reconnects to another instance, or after a restart, sends an ID from a
+foreign epoch and gets no replay instead of unrelated events.
+"""
+import asyncio
+import logging
+import os
+import secrets
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Topics clients can subscribe to
+EVENT_TOPICS = ("orders", "inventory", "detections")
+
+# Events buffered per subscriber before the oldest are dropped
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+# Recent events kept so reconnecting clients can catch up via Last-Event-ID
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "256"))
+# Use change streams when available
+CHANGE_STREAMS_ENABLED = os.getenv("CHANGE_STREAMS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Server error code for "$changeStream is only supported on replica sets"
+_CHANGE_STREAMS_UNSUPPORTED = 40573
+
+
+def order_delta(order: Dict) -> Dict:
+    """Compact representation of a new order"""
+    return {
+        "order_id": str(order.get("_id")) if order.get("_id") is not None else None,
+        "customer_name": order.get("customer_name"),
+        "order_date": order.get("order_date"),
+        "status": order.get("status"),
+        "items": [{"code": item["code"], "quantity": item["quantity"]} for item in order.get("items", [])]
+    }
+
+
+def movement_delta(movement: Dict) -> Dict:
+    """Compact representation of an inventory movement"""
+    return {
+        "ingredient_name": movement["ingredient_name"],
+        "delta": movement["delta"],
+        "unit": movement.get("unit"),
+        "source": movement.get("source"),
+        "reference_ids": movement.get("reference_ids", []),
+        "created_at": movement.get("created_at")
+    }
+
+
+class Subscription:
+    """Queue of events for one connected client"""
+
+    def __init__(self, topics: Iterable[str], maxsize: int = EVENT_QUEUE_SIZE):
+        self.topics = set(topics)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: Dict) -> None:
+        if event["topic"] not in self.topics:
+            return
+        if self.queue.full():
+            # Slow client: drop the oldest event rather than block publishers
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class EventBroker:
+    """
+    In-process publish/subscribe hub
+
+    Must be used from the event loop thread; publishing never blocks.
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, epoch: Optional[str] = None):
+        self._subscriptions: Set[Subscription] = set()
+        self._history = deque(maxlen=history_size)
+        # Sequence numbers are only comparable within one epoch
+        self.epoch = epoch or secrets.token_hex(4)
+        self._next_id = 1
+        # Topics currently fed by a change stream
+        self._streaming: Set[str] = set()
+
+    def publish(self, topic: str, data: Any) -> Dict:
+        """Send an event to every subscriber of the topic"""
+        event = {"id": f"{self.epoch}-{self._next_id}", "sequence": self._next_id,
+                 "topic": topic, "data": data, "time": datetime.now()}
+        self._next_id += 1
+        self._history.append(event)
+        for subscription in list(self._subscriptions):
+            subscription.offer(event)
+        return event
+
+    def emit(self, topic: str, data: Any) -> Optional[Dict]:
+        """
+        Publish a change made by this process
+
+        Skipped while a change stream feeds the topic, since the stream
+        delivers the same change to every instance.
+        """
+        if topic in self._streaming:
+            return None
+        return self.publish(topic, data)
+
+    def set_streaming(self, topic: str, streaming: bool) -> None:
+        if streaming:
+            self._streaming.add(topic)
+        else:
+            self._streaming.discard(topic)
+
+    def is_streaming(self, topic: str) -> bool:
+        return topic in self._streaming
+
+    def _sequence_of(self, event_id: str) -> Optional[int]:
+        """Sequence number of an event ID from this broker's epoch, else None"""
+        epoch, _, sequence = event_id.rpartition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, topics: Iterable[str], last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Register a subscriber
+
+        Args:
+            topics: Topics to receive
+            last_event_id: Replay buffered events newer than this ID; IDs
+                from another epoch (instance or restart) replay nothing
+
+        Returns:
+            Subscription whose queue receives the events
+        """
+        subscription = Subscription(topics)
+        last_sequence = self._sequence_of(last_event_id) if last_event_id else None
+        if last_sequence is not None:
+            for event in self._history:
+                if event["sequence"] > last_sequence:
+                    subscription.offer(event)
+        elif last_event_id:
+            logger.debug("Not replaying events after %s from another epoch", last_event_id)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+
+# Shared broker for the application
+broker = EventBroker()
+
+
+async def watch_collection(topic: str, collection, to_delta: Callable[[Dict], Any],
+                           retry_delay: float = 5.0) -> None:
+    """
+    Publish inserts on a collection from its change stream until cancelled
+
+    Falls back to in-process events for good if the deployment does not
+    support change streams, and resumes after transient errors.
+    """
+    resume_token = None
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    while True:
+        try:
+            async with collection.watch(pipeline, resume_after=resume_token) as stream:
+                broker.set_streaming(topic, True)
+                logger.info("Publishing %s events from a change stream.", topic)
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    broker.publish(topic, to_delta(change["fullDocument"]))
+        except asyncio.CancelledError:
+            raise
+        except (OperationFailure, NotImplementedError) as e:
+            if isinstance(e, NotImplementedError) or e.code == _CHANGE_STREAMS_UNSUPPORTED:
+                logger.info("Change streams unavailable for %s, using in-process events.", topic)
+                return
+            logger.warning("Change stream for %s failed: %s", topic, e)
+        except Exception as e:
+            logger.warning("Change stream for %s failed: %s", topic, e)
+        finally:
+            broker.set_streaming(topic, False)
+
+        await asyncio.sleep(retry_delay)
+
+
+def start_change_streams() -> List[asyncio.Task]:
+    """Start change stream watchers for the order and inventory topics"""
+    if not CHANGE_STREAMS_ENABLED:
+        return []
+
+    from app.services import db
+
+    return [
+        asyncio.create_task(watch_collection("orders", db.orders_collection, order_delta)),
+        asyncio.create_task(watch_collection("inventory", db.inventory_movements_collection, movement_delta)),
+    ]
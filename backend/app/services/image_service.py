@@ -1,26 +1,180 @@
+import hashlib
 import os
 import uuid
 import shutil
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Any
+from typing import Any, AsyncIterable, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 from datetime import datetime, timedelta
 import time
+import logging
+import asyncio
+import cv2
 
 
 # Import direct YOLO functions
-from app.services.models.yolo_model import predict, TEMP_DIR
+from app.services.models.yolo_model import (
+    get_model,
+    model_registry,
+    predict,
+    predict_batch,
+    predict_tiled,
+    TEMP_DIR,
+    PREDICT_DIR,
+)
+from app.services.detection_cache import DetectionCache
+from app.services.detection_mapping import (
+    filter_detections,
+    split_detections,
+)
+from app.services.events import broker
+from app.services.ingredient_index import ingredient_index
+from app.services.image_variants import IMAGE_FORMATS, cached_variant, discard_variants, get_variant, variant_etag
+from app.services.storage import storage
+from app.services.tracking import TRACK_MIN_HITS, ByteTracker
+from app.services.video_pipeline import burst_frames, run_frame_pipeline, sample_video_frames
+from app.utils.metrics import stage_timer
 
 # Define base directory for temporary image storage
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 if not os.path.exists(TEMP_DIR):
     os.makedirs(TEMP_DIR, exist_ok=True)
 
+logger = logging.getLogger(__name__)
+
+# Inference keeps every box at or above the floor; results are filtered to
+# DETECTION_CONF by default and can be re-thresholded without the model
+DETECTION_CONF_FLOOR = float(os.getenv("DETECTION_CONF_FLOOR", "0.25"))
+DETECTION_CONF = float(os.getenv("DETECTION_CONF", "0.7"))
+
 # Storage for detection results
 detection_results = {}
 
+# Deletions scheduled from synchronous code, kept referenced until they finish
+_pending_deletes = set()
+
+# Video containers kept under their own extension; anything else is stored as .mp4
+VIDEO_EXTENSIONS = {".mp4", ".m4v", ".mov", ".avi", ".mkv", ".webm"}
+
+
+def image_key(image_id: str) -> str:
+    """Storage key of an uploaded image"""
+    return f"{image_id}.jpg"
+
+
+def video_key(image_id: str, filename: Optional[str]) -> str:
+    """Storage key of an uploaded video, keeping a known container extension"""
+    suffix = Path(filename or "").suffix.lower()
+    return f"{image_id}{suffix if suffix in VIDEO_EXTENSIONS else '.mp4'}"
+
+
+async def _delete_stored(key: str) -> None:
+    try:
+        await storage.delete(key)
+    except Exception as e:
+        logger.error("Error deleting %s from storage: %s", key, e)
+
+
+async def delete_image(image_id: str) -> None:
+    """Delete an uploaded image from storage"""
+    await _delete_stored(image_key(image_id))
+
+
+async def delete_video(key: str) -> None:
+    """Delete an uploaded video from storage"""
+    await _delete_stored(key)
+
+
+def _discard_detection(detection_id: str) -> None:
+    """Forget a detection evicted from the cache and delete its image files"""
+    result = detection_results.pop(detection_id, None)
+    discard_variants(detection_id)
+    try:
+        (PREDICT_DIR / f"{detection_id}.jpg").unlink()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error("Error deleting annotated image %s: %s", detection_id, e)
+
+    # Evictions happen inside request handlers; the uploads are deleted in the background
+    keys = [image_key(detection_id)]
+    if result and result.get("source_key"):
+        keys.append(result["source_key"])
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning("No event loop to delete image %s", detection_id)
+        return
+    for key in keys:
+        task = loop.create_task(_delete_stored(key))
+        _pending_deletes.add(task)
+        task.add_done_callback(_pending_deletes.discard)
+
+
+# Deduplicates repeated uploads of the same photo; evicting an entry
+# also drops its detection result and images
+detection_cache = DetectionCache(on_evict=_discard_detection)
+
+
+async def find_cached_detection(fingerprint: Dict) -> Optional[Dict]:
+    """
+    Look up the detection result of a previously uploaded copy of an image
+
+    Args:
+        fingerprint: Fingerprint of the uploaded image from fingerprint_image
+
+    Returns:
+        Detection result dictionary or None if the image has not been seen
+    """
+    detection_id = detection_cache.lookup(fingerprint)
+    if not detection_id:
+        return None
+
+    result = detection_results.get(detection_id)
+
+    # Temporary images may have been cleaned up since; treat that as a miss
+    if not result or await storage.stat(image_key(detection_id)) is None:
+        detection_cache.discard(detection_id)
+        return None
+
+    return result
+
+
+def model_ready() -> bool:
+    """Whether a detection model is loaded; starts loading one in the background if not"""
+    return get_model() is not None
+
+
+def model_cache_variant(variant: str) -> str:
+    """
+    Tag a detection cache variant with the active model version
+    
+    After a model swap, uploads of an already processed photo then run the
+    new model instead of returning the previous model's detections.
+    
+    Args:
+        variant: Inference options the result depends on
+        
+    Returns:
+        Variant string for fingerprint_image / fingerprint_stored_image
+    """
+    handle = model_registry.active()
+    version = handle.version if handle else "none"
+    return f"{version}/{variant}"
+
+
+async def cache_detection(fingerprint: Dict, detection_id: str) -> None:
+    """
+    Remember the detection produced for an uploaded image
+
+    Args:
+        fingerprint: Fingerprint of the uploaded image from fingerprint_image
+        detection_id: Unique ID for the detection
+    """
+    detection_cache.store(fingerprint, detection_id)
+
 async def save_uploaded_image(file_data: bytes) -> str:
     """
-    Save uploaded image to temporary storage
+    Save uploaded image to image storage
     
     Args:
         file_data: Binary image data
@@ -28,58 +182,95 @@ async def save_uploaded_image(file_data: bytes) -> str:
     Returns:
         Unique ID for the saved image
     """
-    # Generate unique ID
-    image_id = str(uuid.uuid4())
-    
-    # Define file path
-    file_path = TEMP_DIR / f"{image_id}.jpg"
+    image_id, _ = await save_uploaded_stream(_single_chunk(file_data))
+    return image_id
+
+
+async def save_uploaded_stream(chunks: AsyncIterable[bytes]) -> Tuple[str, str]:
+    """
+    Stream an uploaded image to image storage, hashing it on the way
     
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(file_data)
+    Args:
+        chunks: Chunks of binary image data
         
-    return image_id
+    Returns:
+        (unique ID for the saved image, SHA-256 hex digest of its bytes)
+    """
+    image_id = str(uuid.uuid4())
+    return image_id, await _save_hashed(image_key(image_id), chunks)
 
-async def get_image_path(image_id: str) -> Optional[Path]:
+
+async def save_uploaded_video(chunks: AsyncIterable[bytes], filename: Optional[str] = None) -> Tuple[str, str, str]:
     """
-    Get path to a temporarily stored image
+    Stream an uploaded video to image storage, hashing it on the way
     
     Args:
-        image_id: Unique ID for the image
+        chunks: Chunks of the video file
+        filename: Client file name, for the container extension
         
     Returns:
-        Path to the image or None if not found
+        (unique ID for the upload, storage key of the video, SHA-256 hex digest)
     """
-    file_path = TEMP_DIR / f"{image_id}.jpg"
+    image_id = str(uuid.uuid4())
+    key = video_key(image_id, filename)
+    return image_id, key, await _save_hashed(key, chunks)
+
+
+async def _save_hashed(key: str, chunks: AsyncIterable[bytes]) -> str:
+    digest = hashlib.sha256()
     
-    if file_path.exists():
-        return file_path
+    async def hashed():
+        async for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
     
-    return None
+    await storage.save_stream(key, hashed())
+    return digest.hexdigest()
 
 
-async def process_image(image_id: str, defaults: List[Dict]) -> Dict:
+def image_file(image_id: str):
+    """
+    Local path to a stored image, for use as `async with image_file(id) as path`
+    
+    With a remote backend the image is downloaded to a temporary file that
+    is removed on exit. The path is None if the image does not exist.
+    """
+    return storage.local_copy(image_key(image_id))
+
+
+async def process_image(image_id: str, tiled: bool = False,
+                        tile_size: int = 640, tile_overlap: float = 0.2,
+                        image_path: Optional[Path] = None) -> Dict:
     """
     Process an image with YOLOv11 model
     
     Args:
         image_id: Unique ID for the image
-        defaults: List of default quantities for ingredients
+        tiled: Run sliced inference for high-resolution images
+        tile_size: Tile side length in pixels when tiled is set
+        tile_overlap: Fraction of overlap between neighbouring tiles
+        image_path: Local copy of the image if the caller already has one
         
     Returns:
         Dictionary with detection results
     """
-    # Get image path
-    image_path = await get_image_path(image_id)
+    if image_path is None:
+        async with image_file(image_id) as local_path:
+            if not local_path:
+                return {
+                    "success": False,
+                    "message": f"Image with ID {image_id} not found"
+                }
+            return await process_image(image_id, tiled, tile_size, tile_overlap, local_path)
     
-    if not image_path:
-        return {
-            "success": False,
-            "message": f"Image with ID {image_id} not found"
-        }
-    
-    # Run prediction with YOLO
-    results = predict(str(image_path), save=True)
+    # Run prediction with YOLO in a worker thread so decode and inference do
+    # not stall other requests. The annotated image is rendered from the
+    # stored boxes when it is requested
+    if tiled:
+        results = await asyncio.to_thread(predict_tiled, str(image_path), conf=DETECTION_CONF_FLOOR,
+                                          tile_size=tile_size, overlap=tile_overlap)
+    else:
+        results = await asyncio.to_thread(predict, str(image_path), conf=DETECTION_CONF_FLOOR)
     
     if not results or len(results) == 0:
         return {
@@ -87,44 +278,43 @@ async def process_image(image_id: str, defaults: List[Dict]) -> Dict:
             "message": "No objects detected in the image"
         }
     
-    # Record that the annotated image will be in the predict folder
-    annotated_image_path = TEMP_DIR / "predict" / f"{image_id}.jpg"
-
-    # Check if the annotated image exists
-    '''
-    predicted_exists = annotated_image_path.exists()
-    print(f"Annotated image expected at: {annotated_image_path}, exists: {predicted_exists}")
-    '''
-    
-    # Extract detected classes from results
     result = results[0]
-    detections = []
-    
-    # Process boxes to get class names and confidence
-    boxes = result.boxes
-    for i in range(len(boxes)):
-        class_id = int(boxes[i].cls)
-        class_name = result.names[class_id]
-        confidence = float(boxes[i].conf)
-        
-        detections.append({
-            "class_id": class_id,
-            "class_name": class_name,
-            "confidence": confidence
-        })
+    height, width = result.orig_shape[:2]
     
-    # Map detected ingredients to default quantities
-    detected_ingredients = map_detections_to_ingredients(detections, defaults)
+    # Keep every box down to the floor threshold, pulled off the device once as a (N, 6) array
+    detections = split_detections(result.boxes.data.cpu().numpy())
+    return await _store_detection(image_id, detections, result.names, width, height)
+
+
+async def _store_detection(image_id: str, detections: Tuple, names: Any, width: int, height: int,
+                           **extra) -> Dict:
+    """Keep a detection result with its ingredients at the default threshold and announce it"""
+    # Cached per model and defaults version instead of read on every upload
+    class_table = await ingredient_index.class_table(names)
     
-    # Store detection results
     result_data = {
         "detection_id": image_id,
-        "ingredients": detected_ingredients,
+        "detections": detections,
+        "names": names,
+        "class_table": class_table,
+        "image_size": {"width": int(width), "height": int(height)},
         "annotated_image_id": image_id,  # Use the actual image ID
-        "timestamp": datetime.now()
+        "timestamp": datetime.now(),
+        **extra
     }
+    with stage_timer("map_ingredients"):
+        result_data.update(threshold_detections(result_data))
+    detected_ingredients = result_data["ingredients"]
     
     detection_results[image_id] = result_data
+    broker.emit("detections", {
+        "detection_id": image_id,
+        "ingredients": [
+            {"ingredient_name": item["ingredient_name"], "count": item["count"]}
+            for item in detected_ingredients
+        ],
+        "timestamp": result_data["timestamp"]
+    })
     
     return {
         "success": True,
@@ -133,68 +323,125 @@ async def process_image(image_id: str, defaults: List[Dict]) -> Dict:
     }
 
 
-def map_detections_to_ingredients(detections: List[Dict], defaults: List[Dict]) -> List[Dict]:
+async def process_video(image_id: str, key: str) -> Dict:
     """
-    Map detected objects to ingredients with default quantities
+    Count the items in a short video, each physical item once
     
     Args:
-        detections: List of detected objects from YOLOv11
-        defaults: List of default quantities for ingredients
+        image_id: Unique ID for the upload
+        key: Storage key of the video from save_uploaded_video
         
     Returns:
-        List of ingredients with suggested quantities
+        Dictionary with detection results, like process_image, plus the
+        number of "frames" processed and unique "items" counted
     """
-    # Create lookup dictionary from defaults
-    default_lookup = {item["ingredient_name"]: item for item in defaults}
-    
-    # Count instances of each ingredient
-    ingredient_counts = {}
-    ingredient_confidences = {}  # Track highest confidence for each ingredient
+    async with storage.local_copy(key) as video_path:
+        if not video_path:
+            return {
+                "success": False,
+                "message": f"Video with ID {image_id} not found"
+            }
+        return await _process_frames(image_id, sample_video_frames(video_path), TRACK_MIN_HITS,
+                                     mode="video", source_key=key)
+
+
+async def process_burst(files: List[BinaryIO]) -> Dict:
+    """
+    Count the items in a burst of photos, each physical item once
     
-    for detection in detections:
-        ingredient_name = detection["class_name"]
-        confidence = detection["confidence"]
+    Args:
+        files: Open image files in the order they were taken
         
-        # Increment count
-        if ingredient_name in ingredient_counts:
-            ingredient_counts[ingredient_name] += 1
-            # Keep the highest confidence score
-            if confidence > ingredient_confidences[ingredient_name]:
-                ingredient_confidences[ingredient_name] = confidence
-        else:
-            ingredient_counts[ingredient_name] = 1
-            ingredient_confidences[ingredient_name] = confidence
-    
-    # Map counts to ingredients with proper quantities
-    ingredients = []
-
-    
-    for ingredient_name, count in ingredient_counts.items():
-        # Get default quantity if available
-        if ingredient_name in default_lookup:
-            default = default_lookup[ingredient_name]
-            
-            # Calculate total quantity based on count and default
-            total_quantity = default["default_quantity"] * count
-            
-            ingredients.append({
-                "ingredient_name": ingredient_name,
-                "confidence": ingredient_confidences[ingredient_name],
-                "suggested_quantity": total_quantity,
-                "unit": default["unit"],
-                "count": count  # Adding count for transparency
-            })
-        else:
-            # If no default available, use placeholder values
-            ingredients.append({
-                "ingredient_name": ingredient_name,
-                "confidence": ingredient_confidences[ingredient_name],
-                "suggested_quantity": count,  # Use count as quantity
-                "unit": "unit",
-                "count": count  # Adding count for transparency
-            })
+    Returns:
+        Dictionary with detection results, like process_video
+    """
+    # Every photo counts: a burst has too few frames to require repeat sightings
+    return await _process_frames(str(uuid.uuid4()), burst_frames(files), 1, mode="burst")
+
+
+async def _process_frames(image_id: str, frames: Iterator, min_hits: int, **extra) -> Dict:
+    """Track detections across frames and store one detection per counted item"""
+    model = get_model()
+    if model is None:
+        return {
+            "success": False,
+            "message": "Detection model is not available"
+        }
+    
+    def detect(images):
+        detections = predict_batch(images, conf=DETECTION_CONF_FLOOR, model=model)
+        if detections is None:
+            raise RuntimeError("Detection model is not available")
+        return detections
     
-    return ingredients
+    tracker = ByteTracker()
+    try:
+        with stage_timer("track"):
+            run = await asyncio.to_thread(run_frame_pipeline, frames, detect, tracker)
+    except (ValueError, RuntimeError) as e:
+        # Unreadable video, or the model became unavailable mid-upload
+        return {
+            "success": False,
+            "message": str(e)
+        }
+    
+    keyframe = run["keyframe"]
+    if keyframe is None:
+        return {
+            "success": False,
+            "message": "No frames could be read"
+        }
+    
+    # The frame where most items were seen stands in for the image
+    ok, encoded = cv2.imencode(".jpg", keyframe.image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        return {
+            "success": False,
+            "message": "Could not encode the key frame"
+        }
+    await storage.save_stream(image_key(image_id), _single_chunk(encoded.tobytes()))
+    
+    width, height = keyframe.size
+    # Boxes placed where each item is in the key frame, which is the image they are drawn on
+    items = tracker.summary(keyframe.size, min_hits, frame=run["keyframe_step"])
+    logger.info("Tracked %s items over %s frames in %s batches", len(items["class_ids"]), run["frames"],
+                run["batches"], extra={"decode_wait_seconds": run["decode_wait_seconds"],
+                                       "inference_seconds": run["inference_seconds"]})
+    
+    frames_info = {"processed": run["frames"], "keyframe_index": keyframe.index}
+    response = await _store_detection(
+        image_id, (items["class_ids"], items["confidences"], items["xyxy"]), model.names, width, height,
+        frames=frames_info, **extra
+    )
+    response["frames"] = run["frames"]
+    response["items"] = len(items["class_ids"])
+    return response
+
+
+async def _single_chunk(data: bytes):
+    yield data
+
+
+def threshold_detections(result: Dict, conf: float = DETECTION_CONF,
+                         class_conf: Optional[Dict[str, float]] = None) -> Dict:
+    """
+    Filter a detection's stored boxes and aggregate them into ingredients
+
+    Args:
+        result: Detection result from process_image
+        conf: Confidence threshold, raised to DETECTION_CONF_FLOOR if lower
+        class_conf: Per-class thresholds keyed by class name
+
+    Returns:
+        Dictionary with "ingredients", "boxes" and the "conf" applied
+
+    Raises:
+        ValueError: If class_conf names an unknown class
+    """
+    conf = max(conf, DETECTION_CONF_FLOOR)
+    filtered = filter_detections(result["detections"], result["names"], result["class_table"], conf, class_conf)
+    filtered["conf"] = conf
+    return filtered
 
 
 async def get_detection_result(detection_id: str) -> Optional[Dict]:
@@ -210,27 +457,78 @@ async def get_detection_result(detection_id: str) -> Optional[Dict]:
     return detection_results.get(detection_id)
 
 
-async def get_annotated_image_path(detection_id: str) -> Optional[Path]:
+async def get_image_variant(image_id: str, annotated: bool = True, size: str = "full", fmt: Optional[str] = None,
+                            conf: Optional[float] = None, class_conf: Optional[Dict[str, float]] = None,
+                            if_none_match: Optional[str] = None) -> Optional[Dict]:
     """
-    Get path to an annotated image
+    Get an original or annotated image, rendered on first request
     
     Args:
-        detection_id: Unique ID for the detection
+        image_id: Unique ID for the image (the detection ID for uploads)
+        annotated: Draw the detection's boxes; falls back to the original
+            image when there is no detection result
+        size: Size variant, a key of IMAGE_SIZES
+        fmt: Output format, a key of IMAGE_FORMATS; None serves the stored
+            original when nothing is drawn or resized and JPEG otherwise
+        conf: Confidence threshold for the drawn boxes (default: DETECTION_CONF)
+        class_conf: Per-class thresholds keyed by class name
+        if_none_match: If-None-Match header from the client
         
     Returns:
-        Path to the annotated image or None if not found
+        Dictionary with "etag", "media_type", "filename", "size",
+        "not_modified" (the client's copy is current) and "body" (rendered
+        bytes, or None when the original is to be streamed from "key"),
+        or None if the image does not exist
+        
+    Raises:
+        ValueError: If class_conf names an unknown class
     """
-    result = detection_results.get(detection_id)
-    
-    if not result:
+    key = image_key(image_id)
+    stat = await storage.stat(key)
+    if stat is None:
         return None
     
-    annotated_image_id = result["annotated_image_id"]
-    file_path = TEMP_DIR / "predict"/ f"{annotated_image_id}.jpg"
+    result = detection_results.get(image_id) if annotated else None
+    boxes = None
+    variant = ("original",)
+    if result:
+        if conf is None and not class_conf:
+            boxes = result["boxes"]
+        else:
+            boxes = threshold_detections(result, DETECTION_CONF if conf is None else conf, class_conf)["boxes"]
+        variant = ("annotated", result["timestamp"].isoformat(), conf, sorted((class_conf or {}).items()))
+    
+    # The stored bytes are served as they are, in chunks, when no rendering is needed
+    original = boxes is None and size == "full" and fmt is None
+    fmt = fmt or "jpeg"
+    etag = variant_etag(image_id, stat["version"], size, "original" if original else fmt, *variant)
+    extension, media_type = IMAGE_FORMATS[fmt][:2]
+    response = {
+        "etag": etag,
+        "media_type": media_type,
+        "filename": f"{image_id}{extension}",
+        "key": key,
+        "size": stat["size"],
+        "not_modified": False,
+        "body": None
+    }
     
-    if file_path.exists():
-        return file_path
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        response["not_modified"] = True
+        return response
+    if original:
+        return response
     
-    return None
-
-
+    width = result["image_size"]["width"] if result else None
+    with stage_timer("render_image"):
+        rendered = cached_variant(image_id, etag)
+        if rendered is None:
+            async with image_file(image_id) as image_path:
+                if image_path is None:
+                    return None
+                rendered = await asyncio.to_thread(get_variant, image_id, etag, image_path, boxes, width, size, fmt)
+    if rendered is None:
+        return None
+    response["body"] = rendered[0]
+    response["size"] = len(rendered[0])
+    return response
@@ -0,0 +1,152 @@
+"""
+On-demand image variants
+
+Annotated images are drawn from a detection's stored boxes when they are
+requested instead of being written after every prediction. Each variant
+(annotated or original, size, format, thresholds) is rendered once and
+kept in an in-memory LRU keyed by image ID and ETag. The ETag also lets
+clients revalidate with If-None-Match and skip the download entirely.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.models.preprocess import decode_image
+from app.utils.lru import LRUCache
+
+# Rendered variants kept in memory
+IMAGE_VARIANT_CACHE_SIZE = int(os.getenv("IMAGE_VARIANT_CACHE_SIZE", "64"))
+# Cache-Control max-age for images; a variant's URL always maps to the same bytes
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", "86400"))
+
+# Longest side in pixels per size variant, None keeps the original size
+IMAGE_SIZES = {"thumb": 320, "medium": 1024, "full": None}
+
+# Format -> (file extension, media type, OpenCV quality flag, quality)
+IMAGE_FORMATS = {
+    "jpeg": (".jpg", "image/jpeg", cv2.IMWRITE_JPEG_QUALITY, 85),
+    "webp": (".webp", "image/webp", cv2.IMWRITE_WEBP_QUALITY, 80),
+}
+
+# BGR colours cycled through by class ID
+_PALETTE = [
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (52, 147, 26), (187, 212, 0),
+    (168, 153, 44), (255, 194, 0), (147, 69, 52), (255, 115, 100), (236, 24, 0),
+]
+
+_variants = LRUCache(IMAGE_VARIANT_CACHE_SIZE)
+
+
+def variant_etag(*parts) -> str:
+    """Strong ETag for a variant, derived from everything its bytes depend on"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def draw_boxes(img: np.ndarray, boxes: List[Dict], scale: float = 1.0) -> np.ndarray:
+    """
+    Draw labelled boxes onto an image in place
+
+    Args:
+        img: BGR image
+        boxes: Boxes from detection_boxes, in pixels of the result's image_size
+        scale: Factor from image_size pixels to img pixels
+
+    Returns:
+        The same image
+    """
+    line_width = max(1, round(max(img.shape[:2]) / 400))
+    font_scale = line_width / 3
+    for box in boxes:
+        color = _PALETTE[box["class_id"] % len(_PALETTE)]
+        x1, y1, x2, y2 = (int(round(value * scale)) for value in box["box"])
+        if x2 <= x1 or y2 <= y1:
+            # Tracked items outside a video's key frame are clipped to nothing
+            continue
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, line_width, cv2.LINE_AA)
+
+        label = f"{box['class_name']} {box['confidence']:.2f}"
+        (text_width, text_height), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 1)
+        top = y1 - text_height - baseline if y1 - text_height - baseline >= 0 else y1
+        cv2.rectangle(img, (x1, top), (x1 + text_width, top + text_height + baseline), color, -1)
+        cv2.putText(img, label, (x1, top + text_height), cv2.FONT_HERSHEY_SIMPLEX,
+                    font_scale, (255, 255, 255), 1, cv2.LINE_AA)
+    return img
+
+
+def render_variant(image_path: Path, boxes: Optional[List[Dict]], original_width: Optional[int],
+                   size: str = "full", fmt: str = "jpeg") -> Optional[bytes]:
+    """
+    Decode, resize, annotate and encode one image variant
+
+    Args:
+        image_path: Path to the original image
+        boxes: Boxes to draw, or None for the plain image
+        original_width: Width the box coordinates refer to
+        size: Key of IMAGE_SIZES
+        fmt: Key of IMAGE_FORMATS
+
+    Returns:
+        Encoded image bytes, or None if the image cannot be read
+    """
+    max_side = IMAGE_SIZES[size]
+    # Large JPEGs are decoded at a reduced scale when a small variant is wanted
+    img = decode_image(image_path, max_side) if max_side else cv2.imread(str(image_path))
+    if img is None:
+        return None
+
+    if max_side and max(img.shape[:2]) > max_side:
+        ratio = max_side / max(img.shape[:2])
+        img = cv2.resize(img, (round(img.shape[1] * ratio), round(img.shape[0] * ratio)),
+                         interpolation=cv2.INTER_AREA)
+
+    if boxes:
+        draw_boxes(img, boxes, img.shape[1] / original_width if original_width else 1.0)
+
+    _, _, quality_flag, quality = IMAGE_FORMATS[fmt]
+    ok, encoded = cv2.imencode(IMAGE_FORMATS[fmt][0], img, [quality_flag, quality])
+    return encoded.tobytes() if ok else None
+
+
+def cached_variant(image_id: str, etag: str) -> Optional[Tuple[bytes, str]]:
+    """Return a rendered variant if it is cached, without touching the original"""
+    return _variants.get((image_id, etag))
+
+
+def get_variant(image_id: str, etag: str, image_path: Path, boxes: Optional[List[Dict]],
+                original_width: Optional[int], size: str, fmt: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Return a variant from the cache, rendering it on a miss
+
+    Args:
+        image_id: ID of the original image
+        etag: ETag of the variant from variant_etag
+        image_path: Path to the original image
+        boxes: Boxes to draw, or None for the plain image
+        original_width: Width the box coordinates refer to
+        size: Key of IMAGE_SIZES
+        fmt: Key of IMAGE_FORMATS
+
+    Returns:
+        (image bytes, media type), or None if the image cannot be read
+    """
+    cached = _variants.get((image_id, etag))
+    if cached is None:
+        body = render_variant(image_path, boxes, original_width, size, fmt)
+        if body is None:
+            return None
+        cached = (body, IMAGE_FORMATS[fmt][1])
+        _variants.set((image_id, etag), cached)
+    return cached
+
+
+def discard_variants(image_id: str) -> None:
+    """Drop the cached variants of an image, e.g. when it is deleted"""
+    for key, _ in _variants.items():
+        if key[0] == image_id:
+            _variants.pop(key)
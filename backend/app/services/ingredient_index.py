@@ -0,0 +1,183 @@
+"""
+Model class to inventory ingredient index
+
+YOLO class names do not always match the ingredient names in
+ingredient_defaults ("egg" for "Egg", "chicken_egg" for "Egg"). Names are
+matched case-insensitively, treating spaces, "_" and "-" alike, and
+through aliases: an "aliases" list on a defaults document, or
+INGREDIENT_ALIASES for the whole deployment.
+
+For a model's class names the index is precomputed as arrays indexed by
+class ID, so mapping a batch of detections is one NumPy lookup. The
+defaults are read once and cached until a write in this process bumps
+their version, or INGREDIENT_DEFAULTS_TTL passes (writes from other
+processes, e.g. initialize_db.py).
+
+Configuration:
+    INGREDIENT_ALIASES: JSON object mapping class names to ingredient
+        names, e.g. {"chicken_egg": "Egg", "flour": "AP Flour"}
+    INGREDIENT_DEFAULTS_TTL: Seconds before cached defaults are re-read (default 300)
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from app.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INGREDIENT_ALIASES = json.loads(os.getenv("INGREDIENT_ALIASES", "{}"))
+INGREDIENT_DEFAULTS_TTL = float(os.getenv("INGREDIENT_DEFAULTS_TTL", "300"))
+
+# Class names as a list indexed by class ID, or the {class_id: name} dict Ultralytics uses
+ClassNames = Union[Sequence[str], Mapping[int, str]]
+
+_SEPARATORS = re.compile(r"[\s_\-]+")
+
+
+def normalize_name(name: str) -> str:
+    """Matching key for a class or ingredient name: "AP_Flour" and "ap flour" are equal"""
+    return _SEPARATORS.sub(" ", str(name)).strip().casefold()
+
+
+class ClassTable:
+    """
+    Per-class mapping to ingredients as arrays
+
+    Attributes:
+        ingredient_ids: Ingredient index for each class ID
+        ingredient_names: Canonical ingredient name per ingredient index
+        quantities: Default quantity per ingredient index, NaN without a default
+        units: Unit per ingredient index
+    """
+
+    def __init__(self, ingredient_ids: np.ndarray, ingredient_names: List[str],
+                 quantities: np.ndarray, units: List[str]):
+        self.ingredient_ids = ingredient_ids
+        self.ingredient_names = ingredient_names
+        self.quantities = quantities
+        self.units = units
+
+    def __len__(self) -> int:
+        return len(self.ingredient_ids)
+
+
+def build_class_table(names: ClassNames, defaults: List[Dict],
+                      aliases: Optional[Dict[str, str]] = None) -> ClassTable:
+    """
+    Resolve every class of a model to an ingredient and its default quantity
+
+    Classes that resolve to the same ingredient share its index, so their
+    detections are counted together. Classes without a match keep their
+    own name, no default quantity and "unit" as the unit.
+
+    Args:
+        names: Class names of the model
+        defaults: Documents from ingredient_defaults, optionally with "aliases"
+        aliases: Extra class name -> ingredient name aliases, taking precedence
+
+    Returns:
+        ClassTable covering class IDs 0 to the highest ID in names
+    """
+    ingredient_names: List[str] = []
+    quantities: List[float] = []
+    units: List[str] = []
+    lookup: Dict[str, int] = {}
+
+    def add(name: str, quantity: float = np.nan, unit: str = "unit") -> int:
+        ingredient_names.append(name)
+        quantities.append(quantity)
+        units.append(unit)
+        return len(ingredient_names) - 1
+
+    for default in defaults:
+        index = add(default["ingredient_name"], float(default["default_quantity"]), default["unit"])
+        lookup.setdefault(normalize_name(default["ingredient_name"]), index)
+    # Aliases never shadow a real ingredient name
+    for index, default in enumerate(defaults):
+        for alias in default.get("aliases") or []:
+            lookup.setdefault(normalize_name(alias), index)
+    for alias, target in (aliases or {}).items():
+        key = normalize_name(target)
+        if key not in lookup:
+            lookup[key] = add(target)
+        lookup[normalize_name(alias)] = lookup[key]
+
+    class_names = dict(names.items() if isinstance(names, Mapping) else enumerate(names))
+    ingredient_ids = np.empty(max(class_names, default=-1) + 1, dtype=np.int64)
+    for class_id in range(len(ingredient_ids)):
+        name = class_names.get(class_id, str(class_id))
+        key = normalize_name(name)
+        if key not in lookup:
+            lookup[key] = add(name)
+        ingredient_ids[class_id] = lookup[key]
+
+    return ClassTable(ingredient_ids, ingredient_names, np.asarray(quantities, dtype=np.float64), units)
+
+
+async def _load_defaults() -> List[Dict]:
+    # Imported here because app.services.db invalidates this module's index
+    from app.services.db import get_ingredient_default_quantities
+    return await get_ingredient_default_quantities()
+
+
+class IngredientIndex:
+    """Cached ingredient defaults and the class tables built from them"""
+
+    def __init__(self, load: Callable = _load_defaults, aliases: Optional[Dict[str, str]] = None,
+                 ttl: float = INGREDIENT_DEFAULTS_TTL, maxsize: int = 8):
+        self._load = load
+        self.aliases = INGREDIENT_ALIASES if aliases is None else aliases
+        self.ttl = ttl
+        self.version = 0
+        self.loads = 0
+        self._defaults: Optional[List[Dict]] = None
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        # Keyed by the defaults load and the class names, one per model in use
+        self._tables = LRUCache(maxsize)
+
+    def invalidate(self) -> None:
+        """Mark the cached defaults stale; called by the defaults write paths"""
+        self.version += 1
+
+    def _is_current(self) -> bool:
+        return (self._defaults is not None and self._loaded_version == self.version
+                and time.monotonic() - self._loaded_at < self.ttl)
+
+    async def defaults(self) -> List[Dict]:
+        """Ingredient defaults, read from the database only when stale"""
+        if not self._is_current():
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                # Concurrent uploads wait for a single read
+                if not self._is_current():
+                    version = self.version
+                    defaults = await self._load()
+                    self.loads += 1
+                    self._defaults, self._loaded_version, self._loaded_at = defaults, version, time.monotonic()
+                    logger.debug("Loaded %s ingredient defaults (version %s)", len(defaults), version)
+        return self._defaults
+
+    async def class_table(self, names: ClassNames) -> ClassTable:
+        """Class table for a model's class names against the current defaults"""
+        defaults = await self.defaults()
+        items = tuple(names.items() if isinstance(names, Mapping) else enumerate(names))
+        key = (self._loaded_version, self._loaded_at, items)
+        table = self._tables.get(key)
+        if table is None:
+            table = build_class_table(names, defaults, self.aliases)
+            self._tables.set(key, table)
+        return table
+
+
+# Shared index for the application
+ingredient_index = IngredientIndex()
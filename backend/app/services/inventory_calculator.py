@@ -1,22 +1,29 @@
+import logging
 from typing import Dict, List, Union
 from datetime import datetime
-from app.services.db import get_orders, get_menu_items
+from app.services.db import (
+    get_orders,
+    get_menu_items,
+    get_inventory_items,
+    set_inventory_quantities,
+    deduct_inventory_quantities,
+)
 
+logger = logging.getLogger(__name__)
 
-async def calculate_today_ingredients() -> Dict[str, Dict]:
+
+def expand_order_ingredients(menu_items: List[Dict], orders: List[Dict]) -> Dict[str, Dict]:
     """
-    Calculate ingredients needed for today's orders
+    Expand ordered menu items into the ingredients their recipes need
     
+    Args:
+        menu_items: Menu items with their recipes
+        orders: Orders with their items
+        
     Returns:
-        Dictionary of ingredients with quantities needed for today's orders
+        Dictionary with "ingredients_needed" ({name: {"quantity", "unit"}})
+        and "item_counts" ({menu code: quantity ordered})
     """
-    # Define today's time range
-    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-    
-    # Get all menu items with their recipes
-    menu_items = await get_menu_items()
-    
     # Create recipe lookup dictionary
     recipes = {}
     for item in menu_items:
@@ -28,12 +35,9 @@ async def calculate_today_ingredients() -> Dict[str, Dict]:
             for ingredient in item["ingredients"]
         }
     
-    # Query to get today's orders
-    today_orders = await get_orders(today, tomorrow)
-    
-    # Count today's ordered items
+    # Count ordered items
     item_counts = {}
-    for order in today_orders:
+    for order in orders:
         for item in order["items"]:
             code = item["code"]
             quantity = item["quantity"]
@@ -62,20 +66,46 @@ async def calculate_today_ingredients() -> Dict[str, Dict]:
     for ingredient in ingredients_needed:
         ingredients_needed[ingredient]["quantity"] = round(ingredients_needed[ingredient]["quantity"], 2)
     
+    return {
+        "ingredients_needed": ingredients_needed,
+        "item_counts": item_counts
+    }
+
+
+async def calculate_today_ingredients() -> Dict[str, Dict]:
+    """
+    Calculate ingredients needed for today's orders
+    
+    Returns:
+        Dictionary of ingredients with quantities needed for today's orders
+    """
+    # Define today's time range
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    tomorrow = today.replace(hour=23, minute=59, second=59, microsecond=999999)
+    
+    # Get all menu items with their recipes
+    menu_items = await get_menu_items()
+    
+    # Query to get today's orders
+    today_orders = await get_orders(today, tomorrow)
+    
+    expanded = expand_order_ingredients(menu_items, today_orders)
+    
     # Add order summary for reference
     order_summary = {
         "total_orders": len(today_orders),
-        "item_counts": item_counts
+        "item_counts": expanded["item_counts"]
     }
     
     return {
-        "ingredients_needed": ingredients_needed,
-        "order_summary": order_summary
+        "ingredients_needed": expanded["ingredients_needed"],
+        "order_summary": order_summary,
+        "order_ids": [str(order["_id"]) for order in today_orders if "_id" in order]
     }
     
 async def update_ingredient_inventory(updates: Dict[str, Dict[str, Union[float, str]]]) -> Dict:
     """
-    Update the ingredients inventory document
+    Set ingredient quantities in the inventory collection
     
     Args:
         updates: Dictionary of ingredients to update in format: 
@@ -85,33 +115,9 @@ async def update_ingredient_inventory(updates: Dict[str, Dict[str, Union[float,
     Returns:
         Dictionary with status and message
     """
-    # Create a reference to the ingredients collection
-    ingredients_collection = db.ingredients
-    
     try:
-        # Get the current inventory document (there should be only one)
-        inventory = await ingredients_collection.find_one({"_id": "inventory"})
-        
-        # If no inventory document exists, create one
-        if not inventory:
-            inventory = {
-                "_id": "inventory",
-                "last_updated": datetime.now()
-            }
-        
-        # Update inventory with new values
-        for ingredient, details in updates.items():
-            inventory[ingredient] = details
-        
-        # Update the last_updated timestamp
-        inventory["last_updated"] = datetime.now()
-        
-        # Save the updated inventory
-        await ingredients_collection.replace_one(
-            {"_id": "inventory"}, 
-            inventory, 
-            upsert=True
-        )
+        # One find_one_and_update upsert per ingredient, run concurrently
+        await set_inventory_quantities(updates)
         
         return {
             "status": "success",
@@ -130,20 +136,32 @@ async def get_ingredient_inventory() -> Dict:
     Get current inventory of all ingredients
     
     Returns:
-        Dictionary containing all ingredients with their amounts and units
+        Dictionary containing all ingredients with their amounts and units,
+        plus the most recent "last_updated" timestamp
+        
+    Raises:
+        Exception: If the inventory cannot be read; an empty result would
+            be cached by /api/inventory as if the shelves were empty
     """
-    # Create a reference to the ingredients collection
-    ingredients_collection = db.ingredients
-    
     try:
-        inventory = await ingredients_collection.find_one({"_id": "inventory"})
-        if not inventory:
-            # Initialize empty inventory if it doesn't exist
-            return {"_id": "inventory", "last_updated": datetime.now()}
-        return inventory
+        items = await get_inventory_items()
     except Exception as e:
-        print(f"Error retrieving ingredients: {e}")
-        return {}
+        logger.error("Error retrieving ingredients: %s", e)
+        raise
+    
+    inventory = {}
+    last_updated = None
+    for item in items:
+        inventory[item["ingredient_name"]] = {
+            "amount": item["quantity"],
+            "unit": item["unit"],
+            "last_updated": item.get("last_updated")
+        }
+        if item.get("last_updated") and (last_updated is None or item["last_updated"] > last_updated):
+            last_updated = item["last_updated"]
+    
+    inventory["last_updated"] = last_updated or datetime.now()
+    return inventory
         
 async def update_ingredients_from_today_orders() -> Dict:
     """
@@ -161,7 +179,7 @@ async def update_ingredients_from_today_orders() -> Dict:
         # Get current inventory
         inventory = await get_ingredient_inventory()
         
-        updates = {}
+        deductions = {}
         insufficient_ingredients = []
         
         # Check each ingredient needed for today's orders
@@ -170,7 +188,7 @@ async def update_ingredients_from_today_orders() -> Dict:
             required_unit = details["unit"]
             
             # Check if ingredient exists in inventory
-            if name in inventory and name != "_id" and name != "last_updated":
+            if name in inventory and name != "last_updated":
                 current = inventory[name]
                 current_amount = current["amount"]
                 current_unit = current["unit"]
@@ -186,8 +204,7 @@ async def update_ingredients_from_today_orders() -> Dict:
                 # Check if we have enough
                 if current_amount >= required_amount:
                     # We have enough, subtract the used amount
-                    new_amount = current_amount - required_amount
-                    updates[name] = {"amount": new_amount, "unit": current_unit}
+                    deductions[name] = required_amount
                 else:
                     # Not enough of this ingredient
                     insufficient_ingredients.append({
@@ -206,11 +223,30 @@ async def update_ingredients_from_today_orders() -> Dict:
                     "unit": required_unit
                 })
         
-        # Update inventory with the changes
-        if updates:
-            result = await update_ingredient_inventory(updates)
-            update_status = result["status"]
-            update_message = result["message"]
+        # Subtract with targeted conditional updates
+        updated_ingredients = []
+        if deductions:
+            try:
+                updated_ingredients = await deduct_inventory_quantities(
+                    deductions,
+                    units={name: ingredients_needed[name]["unit"] for name in deductions},
+                    order_ids=today_data["order_ids"]
+                )
+                update_status = "success"
+                update_message = f"Updated {len(updated_ingredients)} ingredients"
+            except Exception as e:
+                update_status = "error"
+                update_message = f"Database error: {str(e)}"
+            
+            # Stock may have changed since it was read
+            for name in deductions:
+                if name not in updated_ingredients and update_status == "success":
+                    insufficient_ingredients.append({
+                        "name": name,
+                        "issue": "Stock changed while processing",
+                        "required": deductions[name],
+                        "unit": ingredients_needed[name]["unit"]
+                    })
         else:
             update_status = "warning"
             update_message = "No ingredients updated"
@@ -218,7 +254,7 @@ async def update_ingredients_from_today_orders() -> Dict:
         return {
             "status": update_status,
             "message": update_message,
-            "updated_ingredients": list(updates.keys()),
+            "updated_ingredients": updated_ingredients,
             "insufficient_ingredients": insufficient_ingredients,
             "order_summary": today_data["order_summary"]
         }
@@ -0,0 +1,337 @@
+"""
+Ingredient depletion forecasting
+
+Daily ordered quantities per menu item are kept in a (days x menu items)
+matrix and multiplied through the recipe matrix (menu items x ingredients)
+to get daily consumption per ingredient. Consumption is projected over a
+horizon with a moving average or a weekday profile, and days until
+stockout are computed for every ingredient in one vectorized pass.
+
+The order matrix is built once and then only extended with orders newer
+than the last one seen, so repeated forecasts cost one small rollup query.
+"""
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.db import get_daily_item_counts, get_inventory_items, get_menu_items
+from app.utils.lru import LRUCache
+
+# Forecast configuration
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "28"))
+FORECAST_WINDOW_DAYS = int(os.getenv("FORECAST_WINDOW_DAYS", "7"))
+FORECAST_HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "14"))
+FORECAST_LOW_STOCK_DAYS = float(os.getenv("FORECAST_LOW_STOCK_DAYS", "3"))
+# Full rebuilds pick up menu and recipe changes
+FORECAST_REBUILD_SECONDS = int(os.getenv("FORECAST_REBUILD_SECONDS", "3600"))
+# Orders newer than this are left for the next refresh, so an order whose
+# insert lands after a later one is not skipped by the watermark
+FORECAST_ORDER_LAG = timedelta(seconds=int(os.getenv("FORECAST_ORDER_LAG", "5")))
+
+FORECAST_METHODS = ("moving_average", "weekday")
+
+
+def build_recipe_matrix(menu_items: List[Dict]) -> Tuple[List[str], List[str], Dict[str, str], np.ndarray]:
+    """
+    Turn menu recipes into a (menu items x ingredients) quantity matrix
+
+    Args:
+        menu_items: Menu documents with code and ingredients
+
+    Returns:
+        (menu codes, ingredient names, recipe unit per ingredient, matrix)
+    """
+    codes = [item["code"] for item in menu_items]
+    ingredients = []
+    units = {}
+    for item in menu_items:
+        for ingredient in item["ingredients"]:
+            if ingredient["name"] not in units:
+                ingredients.append(ingredient["name"])
+                units[ingredient["name"]] = ingredient["unit"]
+
+    columns = {name: index for index, name in enumerate(ingredients)}
+    matrix = np.zeros((len(codes), len(ingredients)), dtype=np.float64)
+    for row, item in enumerate(menu_items):
+        for ingredient in item["ingredients"]:
+            matrix[row, columns[ingredient["name"]]] += ingredient["quantity"]
+
+    return codes, ingredients, units, matrix
+
+
+def project_consumption(history: np.ndarray, weekdays: np.ndarray, method: str,
+                        window: int, horizon: int, start_weekday: int) -> np.ndarray:
+    """
+    Project daily consumption per ingredient over the horizon
+
+    Args:
+        history: (days x ingredients) consumption of completed days, oldest first
+        weekdays: Weekday (0 = Monday) of each history row
+        method: "moving_average" or "weekday"
+        window: Number of most recent days averaged by the moving average
+        horizon: Number of days to project
+        start_weekday: Weekday of the first projected day
+
+    Returns:
+        (horizon x ingredients) projected consumption
+    """
+    if history.shape[0] == 0:
+        return np.zeros((horizon, history.shape[1]))
+
+    if method == "moving_average":
+        rate = history[-window:].mean(axis=0)
+        return np.broadcast_to(rate, (horizon, history.shape[1])).copy()
+
+    # Mean consumption per weekday; weekdays without history use the overall mean
+    totals = np.zeros((7, history.shape[1]))
+    np.add.at(totals, weekdays, history)
+    days_seen = np.bincount(weekdays, minlength=7)
+    profile = np.where(
+        days_seen[:, None] > 0,
+        totals / np.maximum(days_seen, 1)[:, None],
+        history.mean(axis=0)
+    )
+    return profile[(start_weekday + np.arange(horizon)) % 7]
+
+
+def days_until_stockout(stock: np.ndarray, projection: np.ndarray) -> np.ndarray:
+    """
+    Compute fractional days until each ingredient runs out
+
+    Stock that lasts beyond the horizon is extrapolated with the mean
+    projected rate; ingredients that are not consumed never run out (inf).
+
+    Args:
+        stock: Current stock per ingredient
+        projection: (horizon x ingredients) projected consumption
+
+    Returns:
+        Days until stockout per ingredient
+    """
+    horizon, count = projection.shape
+    if horizon == 0:
+        return np.full(count, np.inf)
+
+    columns = np.arange(count)
+    cumulative = np.cumsum(projection, axis=0)
+    reached = cumulative >= stock
+    hit = reached.any(axis=0)
+    first = reached.argmax(axis=0)
+
+    # Interpolate within the day the stock runs out
+    before = np.where(first > 0, cumulative[np.maximum(first - 1, 0), columns], 0.0)
+    rate = projection[first, columns]
+    fraction = np.divide(stock - before, rate, out=np.zeros(count), where=rate > 0)
+
+    days = np.full(count, np.inf)
+    days[hit] = first[hit] + fraction[hit]
+
+    mean_rate = projection.mean(axis=0)
+    beyond = ~hit & (mean_rate > 0)
+    days[beyond] = horizon + (stock[beyond] - cumulative[-1, beyond]) / mean_rate[beyond]
+    return np.maximum(days, 0)
+
+
+class ForecastEngine:
+    """Order history matrix with incremental refresh and cached forecasts"""
+
+    def __init__(self, history_days: int = FORECAST_HISTORY_DAYS):
+        self.history_days = history_days
+        # Created on first use so it binds to the serving event loop
+        self._lock = None
+        self._forecasts = LRUCache(32)
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all state; the next forecast rebuilds from the database"""
+        self._codes = None
+        self._ingredients = []
+        self._units = {}
+        self._recipes = None
+        self._counts = None
+        self._start_day = None
+        self._first_day = None
+        self._watermark = None
+        self._version = 0
+        self._built_at = 0.0
+        self._forecasts.clear()
+
+    def _shift_to(self, today: date) -> None:
+        """Move the history window so its last row is today"""
+        end_day = self._start_day + timedelta(days=self._counts.shape[0] - 1)
+        shift = (today - end_day).days
+        if shift <= 0:
+            return
+        if shift >= self._counts.shape[0]:
+            self._counts[:] = 0
+        else:
+            self._counts = np.roll(self._counts, -shift, axis=0)
+            self._counts[-shift:] = 0
+        self._start_day += timedelta(days=shift)
+        self._version += 1
+
+    def _apply_rollup(self, rows: List[Dict]) -> None:
+        """Add rolled-up order quantities into the history matrix"""
+        if not rows:
+            return
+        code_index = {code: index for index, code in enumerate(self._codes)}
+        day_rows, code_columns, quantities = [], [], []
+        for row in rows:
+            day_offset = (date.fromisoformat(row["day"]) - self._start_day).days
+            column = code_index.get(row["code"])
+            # Codes without a recipe are ignored, as in calculate_today_ingredients
+            if column is not None and 0 <= day_offset < self._counts.shape[0]:
+                day_rows.append(day_offset)
+                code_columns.append(column)
+                quantities.append(row["quantity"])
+            if self._watermark is None or row["last_order_date"] > self._watermark:
+                self._watermark = row["last_order_date"]
+
+        if day_rows:
+            np.add.at(self._counts, (np.array(day_rows), np.array(code_columns)), quantities)
+            first = min(day_rows)
+            first_day = self._start_day + timedelta(days=first)
+            if self._first_day is None or first_day < self._first_day:
+                self._first_day = first_day
+        self._version += 1
+
+    async def refresh(self) -> None:
+        """Bring the history matrix up to date, rebuilding it when stale"""
+        now = datetime.now()
+        today = now.date()
+        until = now - FORECAST_ORDER_LAG
+
+        if self._codes is None or time.monotonic() - self._built_at > FORECAST_REBUILD_SECONDS:
+            self.reset()
+            self._codes, self._ingredients, self._units, self._recipes = build_recipe_matrix(
+                await get_menu_items()
+            )
+            self._start_day = today - timedelta(days=self.history_days)
+            self._counts = np.zeros((self.history_days + 1, len(self._codes)))
+            start = datetime.combine(self._start_day, datetime.min.time())
+            self._apply_rollup(await get_daily_item_counts(start - timedelta(microseconds=1), until))
+            self._built_at = time.monotonic()
+            return
+
+        self._shift_to(today)
+        if self._first_day is not None and self._first_day < self._start_day:
+            self._first_day = self._start_day
+        self._apply_rollup(await get_daily_item_counts(self._watermark, until))
+
+    def _projection(self, method: str, window: int, horizon: int, today: date) -> Tuple[np.ndarray, int]:
+        # Completed days only: today's orders are still coming in
+        first = 0
+        if self._first_day is not None:
+            first = (self._first_day - self._start_day).days
+        counts = self._counts[first:-1] if self._first_day is not None else self._counts[:0]
+        consumption = counts @ self._recipes
+
+        weekdays = (self._start_day.weekday() + first + np.arange(consumption.shape[0])) % 7
+        projection = project_consumption(consumption, weekdays, method, window, horizon, today.weekday())
+        return projection, consumption.shape[0]
+
+    async def forecast(self, method: str = "weekday", window: int = FORECAST_WINDOW_DAYS,
+                       horizon: int = FORECAST_HORIZON_DAYS,
+                       low_stock_days: float = FORECAST_LOW_STOCK_DAYS) -> Dict:
+        """
+        Forecast days until stockout for every ingredient
+
+        Args:
+            method: "moving_average" or "weekday"
+            window: Days averaged by the moving average
+            horizon: Days of consumption to project
+            low_stock_days: Ingredients running out within this many days are "low"
+
+        Returns:
+            Dictionary with forecast metadata and per-ingredient results,
+            soonest stockout first
+        """
+        if method not in FORECAST_METHODS:
+            raise ValueError(f"Unknown forecast method: {method}")
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self.refresh()
+            inventory = await get_inventory_items()
+
+            stock_version = max((item.get("last_updated") or datetime.min for item in inventory), default=None)
+            key = (self._version, stock_version, len(inventory), method, window, horizon, low_stock_days)
+            cached = self._forecasts.get(key)
+            if cached is not None:
+                return cached
+
+            today = date.today()
+            projection, history_used = self._projection(method, window, horizon, today)
+
+            # Inventory items that no recipe uses are listed with zero consumption
+            stocked = {item["ingredient_name"]: item for item in inventory}
+            names = self._ingredients + [name for name in stocked if name not in self._units]
+            projection = np.pad(projection, ((0, 0), (0, len(names) - projection.shape[1])))
+
+            stock = np.zeros(len(names))
+            mismatched = np.zeros(len(names), dtype=bool)
+            for column, name in enumerate(names):
+                item = stocked.get(name)
+                if item is None:
+                    continue
+                stock[column] = item.get("quantity", 0)
+                mismatched[column] = name in self._units and item.get("unit") != self._units[name]
+
+            days = days_until_stockout(stock, projection)
+            daily = projection.mean(axis=0) if horizon else np.zeros(len(names))
+
+            result = self._format(names, stocked, stock, daily, days, mismatched, low_stock_days, today)
+            result = {
+                "generated_at": datetime.now(),
+                "method": method,
+                "window_days": window,
+                "horizon_days": horizon,
+                "history_days_used": history_used,
+                "orders_through": self._watermark,
+                "ingredients": result
+            }
+            self._forecasts.set(key, result)
+            return result
+
+    def _format(self, names, stocked, stock, daily, days, mismatched, low_stock_days, today) -> List[Dict]:
+        results = []
+        for column, name in enumerate(names):
+            item = stocked.get(name)
+            remaining = float(days[column])
+            if item is None:
+                status = "not_in_inventory"
+            elif mismatched[column]:
+                status = "unit_mismatch"
+            elif remaining <= 0:
+                status = "out_of_stock"
+            elif remaining <= low_stock_days:
+                status = "low"
+            else:
+                status = "ok"
+
+            known = status != "unit_mismatch" and np.isfinite(remaining)
+            results.append({
+                "ingredient_name": name,
+                "unit": item.get("unit") if item else self._units.get(name),
+                "stock": float(stock[column]),
+                "daily_consumption": round(float(daily[column]), 4),
+                "days_until_stockout": round(remaining, 2) if known else None,
+                "stockout_date": (today + timedelta(days=int(remaining))).isoformat() if known else None,
+                "status": status
+            })
+
+        results.sort(key=lambda entry: (
+            entry["days_until_stockout"] is None,
+            entry["days_until_stockout"] or 0,
+            entry["ingredient_name"]
+        ))
+        return results
+
+
+# Shared engine used by the API
+forecast_engine = ForecastEngine()
@@ -0,0 +1,139 @@
+"""
+Inventory movement ledger
+
+Every stock change is appended to the inventory_movements collection and
+the inventory collection is kept as the materialized current stock.
+Periodic snapshots fold the movements into per-ingredient totals, so the
+stock at any past time is the newest snapshot before it plus the
+movements recorded since.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.services.db import (
+    get_inventory_items,
+    count_inventory_movements,
+    sum_inventory_movements,
+    get_latest_inventory_snapshot,
+    save_inventory_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background compactions, 0 disables the background task
+LEDGER_COMPACTION_INTERVAL = int(os.getenv("LEDGER_COMPACTION_INTERVAL", "3600"))
+# Only write a new snapshot once this many movements have been recorded
+LEDGER_COMPACTION_MIN_MOVEMENTS = int(os.getenv("LEDGER_COMPACTION_MIN_MOVEMENTS", "500"))
+# Snapshots stop this far in the past so movements still being written are not skipped
+LEDGER_SNAPSHOT_LAG = timedelta(seconds=int(os.getenv("LEDGER_SNAPSHOT_LAG", "60")))
+
+
+def _now_ms() -> datetime:
+    # MongoDB stores milliseconds; truncate so stored window bounds are exact
+    now = datetime.now()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def _snapshot_quantities(snapshot: Optional[Dict]) -> Dict[str, Dict]:
+    if not snapshot:
+        return {}
+    return {
+        item["ingredient_name"]: {"quantity": item["quantity"], "unit": item.get("unit")}
+        for item in snapshot["items"]
+    }
+
+
+def _apply_movements(quantities: Dict[str, Dict], totals: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Add summed movement deltas onto snapshot quantities"""
+    result = {name: dict(details) for name, details in quantities.items()}
+    for name, total in totals.items():
+        current = result.setdefault(name, {"quantity": 0.0, "unit": total["unit"]})
+        current["quantity"] = round(current["quantity"] + total["delta"], 6)
+        if current.get("unit") is None:
+            current["unit"] = total["unit"]
+    return result
+
+
+async def create_baseline_snapshot() -> Dict:
+    """
+    Snapshot the current inventory collection
+
+    Used once when the ledger is introduced, so stock that existed before
+    any movement was recorded is part of point-in-time queries.
+    """
+    items = await get_inventory_items()
+    quantities = {
+        item["ingredient_name"]: {"quantity": item.get("quantity", 0), "unit": item.get("unit")}
+        for item in items
+    }
+    snapshot = await save_inventory_snapshot(_now_ms(), quantities)
+    logger.info("Inventory baseline snapshot created (%s ingredients).", len(quantities))
+    return snapshot
+
+
+async def compact_inventory_ledger(min_movements: int = 0) -> Optional[Dict]:
+    """
+    Fold the movements since the newest snapshot into a new snapshot
+
+    Args:
+        min_movements: Skip compaction while fewer movements are pending
+
+    Returns:
+        The new snapshot, or None if there was nothing to compact
+    """
+    taken_at = _now_ms() - LEDGER_SNAPSHOT_LAG
+    previous = await get_latest_inventory_snapshot()
+    after = previous["taken_at"] if previous else None
+    if after and after >= taken_at:
+        return None
+
+    pending = await count_inventory_movements(after)
+    if pending == 0 or pending < min_movements:
+        return None
+
+    totals = await sum_inventory_movements(after, taken_at)
+    if not totals:
+        return None
+
+    quantities = _apply_movements(_snapshot_quantities(previous), totals)
+    movement_count = sum(total["count"] for total in totals.values())
+    snapshot = await save_inventory_snapshot(taken_at, quantities, movement_count)
+    logger.info("Inventory ledger compacted (%s movements up to %s).", movement_count, taken_at.isoformat())
+    return snapshot
+
+
+async def get_stock_at(at: datetime) -> Dict:
+    """
+    Reconstruct the stock of every ingredient at a point in time
+
+    Args:
+        at: Point in time to reconstruct
+
+    Returns:
+        Dictionary with the requested time, the snapshot used and
+        {ingredient_name: {"quantity", "unit"}} under "inventory"
+    """
+    snapshot = await get_latest_inventory_snapshot(at)
+    after = snapshot["taken_at"] if snapshot else None
+    totals = await sum_inventory_movements(after, at)
+
+    return {
+        "at": at,
+        "snapshot_taken_at": after,
+        "movements_replayed": sum(total["count"] for total in totals.values()),
+        "inventory": _apply_movements(_snapshot_quantities(snapshot), totals)
+    }
+
+
+async def run_periodic_compaction(interval: int = LEDGER_COMPACTION_INTERVAL,
+                                  min_movements: int = LEDGER_COMPACTION_MIN_MOVEMENTS):
+    """Compact the ledger every `interval` seconds until cancelled"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await compact_inventory_ledger(min_movements)
+        except Exception as e:
+            logger.error("Inventory ledger compaction failed: %s", e)
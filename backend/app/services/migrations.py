@@ -0,0 +1,87 @@
+"""
+Versioned schema migrations
+
+Each migration runs once per deployment. The last applied version is kept
+in the schema_version collection; initialize_db.py applies pending
+migrations and app startup only checks the stored version.
+"""
+import logging
+from typing import Dict, List
+
+from app.services.db import (
+    create_indexes,
+    seed_default_menu,
+    initialize_inventory_from_menu,
+    initialize_default_quantities,
+    migrate_legacy_inventory_document,
+    create_ledger_indexes,
+    get_schema_version,
+    record_schema_version,
+)
+from app.services.inventory_ledger import create_baseline_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+async def _seed_inventory():
+    # The initializers report failure instead of raising
+    if not await initialize_inventory_from_menu():
+        raise RuntimeError("Failed to initialize inventory from menu")
+    if not await initialize_default_quantities():
+        raise RuntimeError("Failed to initialize default quantities")
+
+
+async def _create_inventory_ledger():
+    await create_ledger_indexes()
+    await create_baseline_snapshot()
+
+
+# (version, description, coroutine function) in the order they must be applied
+MIGRATIONS = [
+    (1, "Create order, menu, inventory and ingredient default indexes", create_indexes),
+    (2, "Seed the default menu", seed_default_menu),
+    (3, "Seed inventory and ingredient defaults from the menu", _seed_inventory),
+    (4, "Move the single-document ingredients inventory into the inventory collection",
+     migrate_legacy_inventory_document),
+    (5, "Create the inventory movement ledger and a baseline snapshot", _create_inventory_ledger),
+]
+
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+async def apply_migrations() -> List[int]:
+    """
+    Apply all migrations newer than the stored schema version
+
+    Returns:
+        Versions of the migrations that were applied
+    """
+    current_version = await get_schema_version()
+    applied = []
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        logger.info("Applying migration %s: %s", version, description)
+        await migrate()
+        await record_schema_version(version, description)
+        applied.append(version)
+
+    return applied
+
+
+async def check_schema_version() -> Dict:
+    """
+    Compare the stored schema version with the latest migration
+
+    Returns:
+        Dictionary with the current and latest version and whether the
+        database is up to date
+    """
+    current_version = await get_schema_version()
+    return {
+        "current_version": current_version,
+        "latest_version": LATEST_SCHEMA_VERSION,
+        "up_to_date": current_version >= LATEST_SCHEMA_VERSION
+    }
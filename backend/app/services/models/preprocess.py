@@ -0,0 +1,211 @@
+"""
+Image preprocessing for YOLO inference
+
+Images are decoded at a reduced scale where possible and letterboxed once
+into pooled, pre-allocated buffers, so the model receives a ready-made
+input tensor and Ultralytics does not resize the image a second time.
+"""
+import queue
+import struct
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+# Model input size and the grey used by Ultralytics for letterbox padding
+INPUT_SIZE = 640
+PAD_VALUE = 114
+
+# IMREAD_REDUCED_* flags keyed by their downscale factor, largest first
+_REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# JPEG start-of-frame markers that carry the image dimensions
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def read_jpeg_size(image_path: Union[str, Path]) -> Optional[Tuple[int, int]]:
+    """
+    Read the dimensions of a JPEG from its header without decoding it
+
+    Args:
+        image_path: Path to the image
+
+    Returns:
+        (width, height), or None if the file is not a readable JPEG
+    """
+    try:
+        with open(image_path, "rb") as f:
+            if f.read(2) != b"\xff\xd8":
+                return None
+            while True:
+                byte = f.read(1)
+                while byte and byte != b"\xff":
+                    byte = f.read(1)
+                while byte == b"\xff":
+                    byte = f.read(1)
+                if not byte:
+                    return None
+
+                marker = byte[0]
+                if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                    continue  # Markers without a length field
+
+                segment_length = struct.unpack(">H", f.read(2))[0]
+                if marker in _SOF_MARKERS:
+                    height, width = struct.unpack(">xHH", f.read(5))
+                    return width, height
+                f.seek(segment_length - 2, 1)
+    except (OSError, struct.error):
+        return None
+
+
+def choose_reduction(width: int, height: int, target_size: int = INPUT_SIZE) -> int:
+    """
+    Pick the largest JPEG decode downscale that still covers the model input
+
+    Args:
+        width: Full image width
+        height: Full image height
+        target_size: Model input side length
+
+    Returns:
+        Downscale factor (1, 2, 4 or 8)
+    """
+    longest_side = max(width, height)
+    for factor, _ in _REDUCED_COLOR_FLAGS:
+        if longest_side // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_image(image_path: Union[str, Path], target_size: int = INPUT_SIZE) -> Optional[np.ndarray]:
+    """
+    Decode an image as BGR, at a reduced scale for large JPEGs
+
+    Args:
+        image_path: Path to the image
+        target_size: Model input side length the image will be letterboxed to
+
+    Returns:
+        BGR image array, or None if the image cannot be read
+    """
+    flag = cv2.IMREAD_COLOR
+    size = read_jpeg_size(image_path)
+    if size:
+        factor = choose_reduction(size[0], size[1], target_size)
+        flag = dict(_REDUCED_COLOR_FLAGS).get(factor, cv2.IMREAD_COLOR)
+
+    return cv2.imread(str(image_path), flag)
+
+
+class InputBuffers:
+    """Pre-allocated letterbox canvas and model input array for one request"""
+
+    def __init__(self, size: int = INPUT_SIZE):
+        self.size = size
+        self.canvas = np.empty((size, size, 3), dtype=np.uint8)
+        # NCHW float32 in [0, 1]; torch.from_numpy shares this memory
+        self.tensor = np.empty((1, 3, size, size), dtype=np.float32)
+
+
+class BufferPool:
+    """Thread-safe pool of InputBuffers reused across requests"""
+
+    def __init__(self, size: int = INPUT_SIZE, max_buffers: int = 4):
+        self.size = size
+        self._free = queue.LifoQueue(maxsize=max_buffers)
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a set of buffers, allocating a new one if the pool is empty"""
+        try:
+            buffers = self._free.get_nowait()
+        except queue.Empty:
+            buffers = InputBuffers(self.size)
+
+        try:
+            yield buffers
+        finally:
+            try:
+                self._free.put_nowait(buffers)
+            except queue.Full:
+                pass  # Pool already holds enough buffers; let this one be collected
+
+
+def letterbox_into(img: np.ndarray, canvas: np.ndarray) -> Tuple[float, int, int]:
+    """
+    Resize an image into a square canvas, keeping its aspect ratio
+
+    Matches the Ultralytics letterbox: the image is centred and the borders
+    are filled with PAD_VALUE.
+
+    Args:
+        img: BGR image
+        canvas: Square uint8 buffer to write into
+
+    Returns:
+        (gain, pad_x, pad_y) needed to map boxes back onto img
+    """
+    size = canvas.shape[0]
+    height, width = img.shape[:2]
+    gain = min(size / height, size / width)
+    new_w, new_h = int(round(width * gain)), int(round(height * gain))
+    pad_x = int(round((size - new_w) / 2 - 0.1))
+    pad_y = int(round((size - new_h) / 2 - 0.1))
+
+    canvas[:pad_y] = PAD_VALUE
+    canvas[pad_y + new_h:] = PAD_VALUE
+    canvas[pad_y:pad_y + new_h, :pad_x] = PAD_VALUE
+    canvas[pad_y:pad_y + new_h, pad_x + new_w:] = PAD_VALUE
+
+    region = canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+    if (new_w, new_h) == (width, height):
+        np.copyto(region, img)
+    else:
+        # Resizing straight into the canvas avoids an intermediate array
+        cv2.resize(img, (new_w, new_h), dst=region, interpolation=cv2.INTER_LINEAR)
+
+    return gain, pad_x, pad_y
+
+
+def fill_input_tensor(buffers: InputBuffers) -> np.ndarray:
+    """
+    Convert the letterboxed BGR canvas into the NCHW RGB model input in place
+
+    Args:
+        buffers: Buffers whose canvas has been filled by letterbox_into
+
+    Returns:
+        The buffers' float32 input array
+    """
+    cv2.cvtColor(buffers.canvas, cv2.COLOR_BGR2RGB, dst=buffers.canvas)
+    np.copyto(buffers.tensor[0], buffers.canvas.transpose(2, 0, 1), casting="unsafe")
+    buffers.tensor *= 1 / 255.0
+    return buffers.tensor
+
+
+def scale_boxes_to_image(boxes: np.ndarray, gain: float, pad_x: int, pad_y: int,
+                         shape: Tuple[int, int]) -> np.ndarray:
+    """
+    Map xyxy boxes from letterboxed input coordinates back onto the image
+
+    Args:
+        boxes: (N, 4+) array whose first four columns are xyxy
+        gain: Scale returned by letterbox_into
+        pad_x: Horizontal padding returned by letterbox_into
+        pad_y: Vertical padding returned by letterbox_into
+        shape: (height, width) of the image the boxes should refer to
+
+    Returns:
+        Copy of boxes with the first four columns rescaled and clipped
+    """
+    boxes = np.array(boxes, dtype=np.float32, copy=True)
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / gain).clip(0, shape[1])
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / gain).clip(0, shape[0])
+    return boxes
@@ -0,0 +1,428 @@
+"""
+Versioned model registry with background loading and hot swap
+
+Model versions live in MODEL_REGISTRY_DIR, one directory each:
+
+    models/registry/
+        2025-06-01-shelf/
+            model.pt
+            metadata.json   {"description": "...", "created_at": "...", "artifact": "model.pt", ...}
+        ACTIVE              name of the version to load at startup
+
+A new version is loaded and warmed up in a background thread, then
+swapped in with a single assignment. Requests take a reference to the
+active model when they start, so in-flight requests finish on the old
+model and it is released once the last of them is done. Without any
+registered version the legacy models/yolo11-model.pt is used.
+
+Requests never load a model themselves: until the first load finishes
+there is no active model and callers answer "not ready", while the load
+(or, after a failure, a retry) runs in the background.
+
+A second version can run as a shadow on a sample of requests. Shadow
+inference runs on its own thread after the response's inference, never
+more than one at a time, and only its latency and agreement with the
+active model are recorded.
+
+Configuration:
+    MODEL_REGISTRY_DIR: Registry directory (default models/registry)
+    MODEL_VERSION: Version to load at startup, overriding ACTIVE
+    MODEL_WARMUP_RUNS: Inferences run on a new model before it is swapped in (default 2)
+    SHADOW_SAMPLE_RATE: Fraction of requests also run on the shadow model (default 0.1)
+    MODEL_LOAD_RETRY_SECONDS: Seconds before a failed startup load is retried (default 30)
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.tracking import box_iou
+from app.utils.metrics import sample_lines
+
+logger = logging.getLogger(__name__)
+
+MODELS_DIR = Path(__file__).resolve().parent.parent.parent.parent / "models"
+MODEL_REGISTRY_DIR = Path(os.getenv("MODEL_REGISTRY_DIR", str(MODELS_DIR / "registry")))
+MODEL_VERSION = os.getenv("MODEL_VERSION")
+MODEL_WARMUP_RUNS = int(os.getenv("MODEL_WARMUP_RUNS", "2"))
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1"))
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv("MODEL_LOAD_RETRY_SECONDS", "30"))
+
+# Version name used for the artifact outside the registry
+LEGACY_VERSION = "default"
+LEGACY_MODEL_PATH = MODELS_DIR / "yolo11-model.pt"
+
+ACTIVE_FILE = "ACTIVE"
+METADATA_FILE = "metadata.json"
+DEFAULT_ARTIFACT = "model.pt"
+
+
+class ModelHandle:
+    """A loaded model and the version it came from"""
+
+    def __init__(self, version: str, model: Any, metadata: Dict, load_seconds: float = 0.0):
+        self.version = version
+        self.model = model
+        self.metadata = metadata
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now()
+
+    def describe(self) -> Dict:
+        return {
+            "version": self.version,
+            "metadata": self.metadata,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 3),
+        }
+
+
+def compare_detections(primary: np.ndarray, shadow: np.ndarray, iou: float = 0.5) -> Dict:
+    """
+    Compare the detections of two models on the same input
+
+    Args:
+        primary: (N, 6) [x1, y1, x2, y2, confidence, class_id] from the active model
+        shadow: (M, 6) detections from the shadow model, in the same coordinates
+        iou: Overlap needed for two boxes of the same class to match
+
+    Returns:
+        Dictionary with both counts, the number of matched boxes and the
+        agreement (matched / max(N, M), 1.0 when both found nothing)
+    """
+    primary = np.asarray(primary, dtype=np.float64).reshape(-1, 6)
+    shadow = np.asarray(shadow, dtype=np.float64).reshape(-1, 6)
+    matched = 0
+    if len(primary) and len(shadow):
+        overlaps = box_iou(primary[:, :4], shadow[:, :4])
+        overlaps[primary[:, 5][:, None] != shadow[:, 5][None, :]] = 0
+        # Greedy one-to-one matching, best overlap first
+        rows, cols = np.nonzero(overlaps >= iou)
+        used_rows, used_cols = set(), set()
+        for index in np.argsort(-overlaps[rows, cols]):
+            row, col = int(rows[index]), int(cols[index])
+            if row not in used_rows and col not in used_cols:
+                used_rows.add(row)
+                used_cols.add(col)
+        matched = len(used_rows)
+    total = max(len(primary), len(shadow))
+    return {
+        "primary": len(primary),
+        "shadow": len(shadow),
+        "matched": matched,
+        "agreement": matched / total if total else 1.0,
+    }
+
+
+class ShadowStats:
+    """Running totals of shadow comparisons"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.samples = 0
+            self.errors = 0
+            self.skipped = 0
+            self.primary_seconds = 0.0
+            self.shadow_seconds = 0.0
+            self.agreement = 0.0
+            self.count_difference = 0
+
+    def record(self, primary_seconds: float, shadow_seconds: float, comparison: Dict) -> None:
+        with self._lock:
+            self.samples += 1
+            self.primary_seconds += primary_seconds
+            self.shadow_seconds += shadow_seconds
+            self.agreement += comparison["agreement"]
+            self.count_difference += abs(comparison["shadow"] - comparison["primary"])
+
+    def count(self, name: str) -> None:
+        """Count a sample that produced no comparison ("errors" or "skipped")"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            samples = self.samples or 1
+            return {
+                "samples": self.samples,
+                "errors": self.errors,
+                "skipped": self.skipped,
+                "primary_latency_ms": round(1000 * self.primary_seconds / samples, 2),
+                "shadow_latency_ms": round(1000 * self.shadow_seconds / samples, 2),
+                "mean_agreement": round(self.agreement / samples, 4) if self.samples else None,
+                "mean_count_difference": round(self.count_difference / samples, 3),
+            }
+
+
+class ModelRegistry:
+    """Versions on disk, the active model and an optional shadow"""
+
+    def __init__(self, load: Callable[[Path], Any], warm_up: Optional[Callable[[Any], None]] = None,
+                 root: Path = MODEL_REGISTRY_DIR, legacy_path: Path = LEGACY_MODEL_PATH,
+                 pinned_version: Optional[str] = MODEL_VERSION, shadow_rate: float = SHADOW_SAMPLE_RATE,
+                 retry_seconds: float = MODEL_LOAD_RETRY_SECONDS):
+        self._load = load
+        self._warm_up = warm_up
+        self.root = Path(root)
+        self.legacy_path = Path(legacy_path)
+        self.pinned_version = pinned_version
+        self.shadow_rate = shadow_rate
+        self.retry_seconds = retry_seconds
+        self.shadow_stats = ShadowStats()
+        self._active: Optional[ModelHandle] = None
+        self._shadow: Optional[ModelHandle] = None
+        self._lock = threading.Lock()
+        # Guards _loading, so at most one background load runs at a time
+        self._loading: Optional[Dict] = None
+        self._last_load: Optional[Dict] = None
+        self._shadow_busy = threading.Semaphore(1)
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-inference")
+
+    def versions(self) -> List[Dict]:
+        """Registered versions with their metadata, oldest first"""
+        versions = []
+        if self.root.is_dir():
+            for directory in self.root.iterdir():
+                if not directory.is_dir():
+                    continue
+                try:
+                    path, metadata = self.resolve(directory.name)
+                except (KeyError, ValueError) as e:
+                    logger.warning("Skipping model version %s: %s", directory.name, e)
+                    continue
+                versions.append({**metadata, "version": directory.name, "artifact": path.name,
+                                 "size_bytes": path.stat().st_size})
+        return sorted(versions, key=lambda item: (str(item.get("created_at", "")), item["version"]))
+
+    def resolve(self, version: str) -> Tuple[Path, Dict]:
+        """
+        Find a version's artifact and metadata
+
+        Raises:
+            KeyError: If the version or its artifact does not exist
+            ValueError: If the version name or its metadata is invalid
+        """
+        if version == LEGACY_VERSION and self.legacy_path.exists():
+            return self.legacy_path, {"description": "Model outside the registry"}
+        if not version or Path(version).name != version or version.startswith("."):
+            raise ValueError(f"Invalid model version: {version!r}")
+
+        directory = self.root / version
+        metadata_path = directory / METADATA_FILE
+        metadata = {}
+        if metadata_path.exists():
+            try:
+                metadata = json.loads(metadata_path.read_text())
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid {METADATA_FILE}: {e}")
+        artifact = directory / Path(metadata.get("artifact", DEFAULT_ARTIFACT)).name
+        if not artifact.is_file():
+            raise KeyError(f"Model version {version} not found")
+        return artifact, metadata
+
+    def _startup_version(self) -> str:
+        if self.pinned_version:
+            return self.pinned_version
+        active_file = self.root / ACTIVE_FILE
+        if active_file.exists():
+            return active_file.read_text().strip()
+        versions = self.versions()
+        return versions[-1]["version"] if versions else LEGACY_VERSION
+
+    def _build(self, version: str) -> ModelHandle:
+        """Load and warm up a version; runs in a worker thread"""
+        path, metadata = self.resolve(version)
+        started = time.perf_counter()
+        model = self._load(path)
+        if self._warm_up:
+            self._warm_up(model)
+        return ModelHandle(version, model, metadata, time.perf_counter() - started)
+
+    def active(self) -> Optional[ModelHandle]:
+        """
+        The model new requests should use, or None until one has loaded.
+        Hold on to the handle for the whole request. Never loads anything
+        itself; see ensure_loading.
+        """
+        return self._active
+
+    def ensure_loading(self) -> Optional[threading.Thread]:
+        """
+        Start loading the startup version in the background if no model is
+        loaded or loading yet. After a failed load, another attempt is made
+        at most every MODEL_LOAD_RETRY_SECONDS.
+
+        Returns:
+            The loading thread if a load was started, else None
+        """
+        if self._active is not None or self._loading is not None:
+            return None
+        last = self._last_load
+        if (last and last["state"] == "failed"
+                and (datetime.now() - last["finished_at"]).total_seconds() < self.retry_seconds):
+            return None
+
+        version = self._startup_version()
+        try:
+            return self.start_load(version, persist=False)
+        except RuntimeError:
+            return None  # Another request started it first
+        except (KeyError, ValueError) as e:
+            logger.error("Error loading model version %s: %s", version, e)
+            with self._lock:
+                self._last_load = {"version": version, "role": "active", "state": "failed",
+                                   "error": str(e), "finished_at": datetime.now()}
+            return None
+
+    def _write_active(self, version: str) -> None:
+        if version == LEGACY_VERSION or not self.root.is_dir():
+            return
+        partial = self.root / f".{ACTIVE_FILE}.tmp"
+        partial.write_text(version)
+        os.replace(partial, self.root / ACTIVE_FILE)
+
+    def start_load(self, version: str, role: str = "active",
+                   shadow_rate: Optional[float] = None, persist: bool = True) -> threading.Thread:
+        """
+        Load a version in a background thread and, once warm, swap it in
+
+        Args:
+            version: Version to load
+            role: "active" to replace the serving model, "shadow" to compare against it
+            shadow_rate: New shadow sample rate when role is "shadow"
+            persist: Save an activated version to ACTIVE for the next start
+
+        Returns:
+            The loading thread
+
+        Raises:
+            KeyError: If the version does not exist
+            ValueError: If the version name is invalid
+            RuntimeError: If another version is still loading
+        """
+        if role not in ("active", "shadow"):
+            raise ValueError("role must be 'active' or 'shadow'")
+        self.resolve(version)
+        with self._lock:
+            if self._loading is not None:
+                raise RuntimeError(f"Version {self._loading['version']} is still loading")
+            self._loading = {"version": version, "role": role, "state": "loading", "started_at": datetime.now()}
+
+        def run():
+            try:
+                handle = self._build(version)
+                if role == "active":
+                    # Requests already holding the old handle keep using it
+                    self._active = handle
+                    if persist:
+                        self._write_active(version)
+                else:
+                    if shadow_rate is not None:
+                        self.shadow_rate = shadow_rate
+                    self.shadow_stats.reset()
+                    self._shadow = handle
+                outcome = {"state": "ready"}
+                logger.info("Model version %s is now %s", version, role,
+                            extra={"load_seconds": round(handle.load_seconds, 3)})
+            except Exception as e:
+                outcome = {"state": "failed", "error": str(e)}
+                logger.exception("Error loading model version %s: %s", version, e)
+            with self._lock:
+                self._last_load = {**self._loading, **outcome, "finished_at": datetime.now()}
+                self._loading = None
+
+        thread = threading.Thread(target=run, name=f"model-load-{version}", daemon=True)
+        thread.start()
+        return thread
+
+    def stop_shadow(self) -> None:
+        """Stop shadow inference and release the shadow model"""
+        self._shadow = None
+
+    def sample_shadow(self) -> Optional[ModelHandle]:
+        """The shadow model if this request is sampled for shadow inference, else None"""
+        shadow = self._shadow
+        if shadow is None or random.random() >= self.shadow_rate:
+            return None
+        return shadow
+
+    def submit_shadow(self, shadow: ModelHandle, run: Callable[[Any], np.ndarray],
+                      primary_seconds: float, primary_detections: np.ndarray) -> bool:
+        """
+        Run a sampled request on the shadow model in the background, unless
+        a shadow run is already pending
+
+        Args:
+            shadow: Handle returned by sample_shadow
+            run: Runs the shadow model on the request's input and returns
+                detections in the same coordinates as primary_detections
+            primary_seconds: Inference time of the active model
+            primary_detections: (N, 6) detections of the active model
+
+        Returns:
+            True if the run was queued, False if it was skipped
+        """
+        if not self._shadow_busy.acquire(blocking=False):
+            self.shadow_stats.count("skipped")
+            return False
+
+        def job():
+            try:
+                started = time.perf_counter()
+                detections = run(shadow.model)
+                shadow_seconds = time.perf_counter() - started
+                self.shadow_stats.record(primary_seconds, shadow_seconds,
+                                         compare_detections(primary_detections, detections))
+            except Exception as e:
+                self.shadow_stats.count("errors")
+                logger.warning("Shadow inference on version %s failed: %s", shadow.version, e)
+            finally:
+                self._shadow_busy.release()
+
+        try:
+            self._shadow_executor.submit(job)
+        except Exception:
+            # The job never ran, so it cannot release the slot
+            self._shadow_busy.release()
+            raise
+        return True
+
+    def status(self) -> Dict:
+        active, shadow = self._active, self._shadow
+        return {
+            "active": active.describe() if active else None,
+            "shadow": {**shadow.describe(), "sample_rate": self.shadow_rate,
+                       "comparison": self.shadow_stats.summary()} if shadow else None,
+            "loading": self._loading,
+            "last_load": self._last_load,
+        }
+
+    def metrics(self) -> List[str]:
+        """Exposition lines for the metrics registry"""
+        active, shadow = self._active, self._shadow
+        lines = sample_lines("model_active_info", "Model version serving requests",
+                             [({"version": active.version}, 1)] if active else [])
+        lines += sample_lines("model_shadow_info", "Model version running in shadow",
+                              [({"version": shadow.version}, 1)] if shadow else [])
+        stats = self.shadow_stats
+        for name in ("samples", "errors", "skipped"):
+            lines += sample_lines(f"model_shadow_{name}_total", f"Shadow inference {name}",
+                                  [({}, getattr(stats, name))], "counter")
+        lines += sample_lines("model_shadow_latency_seconds_total", "Inference time on shadowed requests",
+                              [({"model": "active"}, round(stats.primary_seconds, 6)),
+                               ({"model": "shadow"}, round(stats.shadow_seconds, 6))], "counter")
+        lines += sample_lines("model_shadow_agreement_total",
+                              "Sum of per-request detection agreement with the shadow model",
+                              [({}, round(stats.agreement, 6))], "counter")
+        return lines
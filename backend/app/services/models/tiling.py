@@ -0,0 +1,131 @@
+"""
+Helpers for sliced (tiled) inference on high-resolution images
+"""
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# A tile window as (x0, y0, x1, y1) in full-image pixel coordinates
+Tile = Tuple[int, int, int, int]
+
+
+def _tile_starts(length: int, tile_size: int, stride: int) -> List[int]:
+    """Start offsets along one axis, with the last tile flush against the edge"""
+    if length <= tile_size:
+        return [0]
+
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def compute_tiles(width: int, height: int, tile_size: int = 640, overlap: float = 0.2) -> List[Tile]:
+    """
+    Cut an image into overlapping square tiles
+
+    Args:
+        width: Image width in pixels
+        height: Image height in pixels
+        tile_size: Side length of each tile in pixels
+        overlap: Fraction of a tile shared with its neighbour (0 <= overlap < 1)
+
+    Returns:
+        List of tile windows covering the whole image
+    """
+    if tile_size <= 0:
+        raise ValueError("tile_size must be positive")
+    if not 0 <= overlap < 1:
+        raise ValueError("overlap must be in the range [0, 1)")
+
+    stride = max(1, int(round(tile_size * (1 - overlap))))
+    xs = _tile_starts(width, tile_size, stride)
+    ys = _tile_starts(height, tile_size, stride)
+
+    return [
+        (x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height))
+        for y0 in ys
+        for x0 in xs
+    ]
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray,
+                        threshold: float = 0.5, metric: str = "ios") -> np.ndarray:
+    """
+    Class-aware greedy non-maximum suppression
+
+    Args:
+        boxes: (N, 4) array of xyxy boxes
+        scores: (N,) array of confidences
+        classes: (N,) array of class IDs
+        threshold: Overlap above which the lower-scoring box is suppressed
+        metric: "iou" (intersection over union) or "ios" (intersection over
+            the smaller box), which also removes the truncated copies of an
+            object cut by a tile border
+
+    Returns:
+        Indices of the kept boxes, highest score first
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    if metric not in ("iou", "ios"):
+        raise ValueError("metric must be 'iou' or 'ios'")
+
+    # Offset boxes per class so boxes of different classes never overlap
+    offsets = classes.astype(np.float64)[:, None] * (boxes.max() + 1)
+    shifted = boxes.astype(np.float64) + offsets
+
+    x0, y0, x1, y1 = shifted.T
+    areas = (x1 - x0).clip(min=0) * (y1 - y0).clip(min=0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        inter_w = (np.minimum(x1[i], x1[rest]) - np.maximum(x0[i], x0[rest])).clip(min=0)
+        inter_h = (np.minimum(y1[i], y1[rest]) - np.maximum(y0[i], y0[rest])).clip(min=0)
+        inter = inter_w * inter_h
+
+        if metric == "iou":
+            denom = areas[i] + areas[rest] - inter
+        else:
+            denom = np.minimum(areas[i], areas[rest])
+        overlap = inter / np.maximum(denom, 1e-9)
+
+        order = rest[overlap <= threshold]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+def merge_tile_detections(tile_detections: Sequence[np.ndarray], tiles: Sequence[Tile],
+                          threshold: float = 0.5, metric: str = "ios") -> np.ndarray:
+    """
+    Shift per-tile detections into full-image coordinates and merge them
+
+    Args:
+        tile_detections: One (N, 6) array per tile of [x0, y0, x1, y1, conf, cls]
+            in tile coordinates
+        tiles: Tile windows matching tile_detections
+        threshold: Overlap threshold for cross-tile suppression
+        metric: Overlap metric passed to non_max_suppression
+
+    Returns:
+        (M, 6) array of merged detections in full-image coordinates
+    """
+    shifted = []
+    for detections, (tx, ty, _, _) in zip(tile_detections, tiles):
+        if len(detections) == 0:
+            continue
+        detections = np.asarray(detections, dtype=np.float32).copy()
+        detections[:, [0, 2]] += tx
+        detections[:, [1, 3]] += ty
+        shifted.append(detections)
+
+    if not shifted:
+        return np.empty((0, 6), dtype=np.float32)
+
+    merged = np.concatenate(shifted)
+    keep = non_max_suppression(merged[:, :4], merged[:, 4], merged[:, 5], threshold, metric)
+    return merged[keep]
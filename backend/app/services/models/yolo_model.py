@@ -4,9 +4,24 @@ import os
 import shutil
 import cv2
 import numpy as np
-import psutil
 import datetime
 import asyncio
+import logging
+import time
+import torch
+from ultralytics.engine.results import Results
+
+from app.utils.metrics import registry, stage_timer
+from app.services.models.registry import MODEL_WARMUP_RUNS, ModelRegistry
+from app.services.models.tiling import compute_tiles, merge_tile_detections
+from app.services.models.preprocess import (
+    INPUT_SIZE,
+    BufferPool,
+    decode_image,
+    fill_input_tensor,
+    letterbox_into,
+    scale_boxes_to_image,
+)
 
 # Base directory for model files
 BASE_DIR = Path(__file__).resolve().parent.parent.parent.parent
@@ -14,41 +29,59 @@ MODEL_DIR = BASE_DIR / "models"
 TEMP_DIR = BASE_DIR / "temp_images"
 PREDICT_DIR = TEMP_DIR / "predict"
 
+logger = logging.getLogger(__name__)
+
 # Create model directory if it doesn't exist
 os.makedirs(MODEL_DIR, exist_ok=True)
 os.makedirs(PREDICT_DIR, exist_ok=True)
 
-# Default model path
-DEFAULT_MODEL_PATH = str(MODEL_DIR / "yolo11-model.pt")
+# Reusable input buffers so each prediction does not allocate new arrays
+_buffer_pool = BufferPool(INPUT_SIZE)
 
-# Global model instance (loaded once and reused)
-_model = None
+def _warm_up(model):
+    """Run a few blank inputs so the first real request does not pay for CUDA/kernel setup"""
+    blank = torch.zeros((1, 3, INPUT_SIZE, INPUT_SIZE))
+    for _ in range(MODEL_WARMUP_RUNS):
+        model.predict(source=blank, imgsz=INPUT_SIZE, save=False, half=True, verbose=False)
 
-def log_memory_usage(label=""):
-    """Log current memory usage"""
-    process = psutil.Process(os.getpid())
-    memory_mb = process.memory_info().rss / (1024 * 1024)  # Convert to MB
-    print(f"Memory usage {label}: {memory_mb:.2f} MB")
+def _load_model(path):
+    with stage_timer("model_load"):
+        return YOLO(str(path))
 
-def get_model(model_path=None):
-    """Get or load the YOLO model."""
-    global _model
-    
-    if _model is None:
-        model_path = model_path or DEFAULT_MODEL_PATH
-        try:
-            log_memory_usage("Before loading model")
-            _model = YOLO(model_path)
-            log_memory_usage("After loading model")
-            #print(f"Model loaded from: {model_path}")
-        except Exception as e:
-            print(f"Error loading model: {e}")
-            return None
-    
-    return _model
+# Versioned models; the legacy models/yolo11-model.pt is used when the registry is empty
+model_registry = ModelRegistry(load=_load_model, warm_up=_warm_up)
+registry.add_collector(model_registry.metrics)
+
+def get_model():
+    """Get the active model, or None while it is still loading.
+
+    Never loads on the calling thread; without a model a background load
+    is started (or retried). Hold on to the returned model for the whole
+    request: a version swap only affects later calls.
+    """
+    handle = model_registry.active()
+    if handle is None:
+        model_registry.ensure_loading()
+        return None
+    return handle.model
+
+def _save_annotated(img, image_path, names, detections, annotate_conf=None):
+    """Draw the boxes at or above annotate_conf and save the image under its ID in PREDICT_DIR"""
+    if annotate_conf is not None:
+        detections = detections[detections[:, 4] >= annotate_conf]
+    result = Results(orig_img=img, path=str(image_path), names=names, boxes=torch.from_numpy(detections))
+    target_filename = PREDICT_DIR / f"{Path(image_path).stem}.jpg"
+    cv2.imwrite(str(target_filename), result.plot(line_width=2))
 
-def predict(image_path, conf=0.7, save=False, output_path=None):
-    """Run prediction with YOLO model."""
+def predict(image_path, conf=0.7, save=False, output_path=None, annotate_conf=None):
+    """Run prediction with YOLO model.
+
+    Args:
+        image_path: Path to the image
+        conf: Confidence threshold passed to the model
+        save: Whether to save the annotated image to PREDICT_DIR
+        annotate_conf: Only draw boxes at or above this confidence (default: all)
+    """
     
     model = get_model()
     
@@ -56,79 +89,192 @@ def predict(image_path, conf=0.7, save=False, output_path=None):
         return None
     
     try:
-        # Extract the image ID from the path
-        image_id = Path(image_path).stem
+        # Decode (reduced scale for big JPEGs) and letterbox once into pooled buffers
+        with stage_timer("decode"):
+            img = decode_image(image_path, INPUT_SIZE)
+        if img is None:
+            logger.error("Error predicting: could not read image %s", image_path)
+            return None
+
+        with _buffer_pool.acquire() as buffers:
+            with stage_timer("preprocess"):
+                gain, pad_x, pad_y = letterbox_into(img, buffers.canvas)
+                input_tensor = torch.from_numpy(fill_input_tensor(buffers))
+
+            # A ready NCHW tensor skips Ultralytics' own resize and letterbox
+            started = time.perf_counter()
+            with stage_timer("inference"):
+                letterboxed = model.predict(
+                    source=input_tensor,
+                    imgsz=INPUT_SIZE,
+                    conf=conf,
+                    save=False,
+                    half=True,
+                    verbose=False
+                )
+
+            shadow = model_registry.sample_shadow()
+            if shadow is not None:
+                # The pooled buffer is reused once released, so the shadow gets its own copy
+                _submit_shadow(shadow, input_tensor.clone(), conf, time.perf_counter() - started,
+                               letterboxed[0].boxes.data.cpu().numpy())
+
+        # Map boxes from the letterboxed input back onto the decoded image
+        with stage_timer("postprocess"):
+            detections = letterboxed[0].boxes.data.cpu().numpy()
+            detections = scale_boxes_to_image(detections, gain, pad_x, pad_y, img.shape[:2])
+            results = [Results(
+                orig_img=img,
+                path=str(image_path),
+                names=model.names,
+                boxes=torch.from_numpy(detections)
+            )]
+        
+        # Save the annotated image under the original image ID
+        if save:
+            with stage_timer("annotate"):
+                _save_annotated(img, image_path, model.names, detections, annotate_conf)
         
-        log_memory_usage("Before image read")
-        # Read and resize the image
-        img = cv2.imread(str(image_path))
-        img = cv2.resize(img, (640, 640))
-        log_memory_usage("After image resize")
+        return results
+    except Exception as e:
+        logger.exception("Error predicting: %s", e)
+        return None 
+
+def _submit_shadow(shadow, input_tensor, conf, primary_seconds, primary_detections):
+    """Compare the shadow model with the active one on the same letterboxed input"""
+    def run(model):
+        result = model.predict(source=input_tensor, imgsz=INPUT_SIZE, conf=conf,
+                               save=False, half=True, verbose=False)
+        return result[0].boxes.data.cpu().numpy()
 
-        # Run prediction on resized image
+    model_registry.submit_shadow(shadow, run, primary_seconds, primary_detections)
+
+def predict_batch(images, conf=0.7, model=None):
+    """Run the model once on a batch of decoded images.
+
+    Each image is letterboxed into one NCHW batch tensor, as in predict,
+    and its boxes are mapped back onto that image.
+
+    Args:
+        images: List of BGR images
+        conf: Confidence threshold passed to the model
+        model: Model to use instead of the active one, so all batches of
+            one video run on the same version
+
+    Returns:
+        List with an (N, 6) [x1, y1, x2, y2, confidence, class_id] array per
+        image, or None if the model is not available
+    """
+    model = model or get_model()
+
+    if model is None:
+        return None
+
+    if not images:
+        return []
+
+    batch = np.empty((len(images), 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+    letterboxes = []
+    with _buffer_pool.acquire() as buffers:
+        with stage_timer("preprocess"):
+            for index, img in enumerate(images):
+                letterboxes.append(letterbox_into(img, buffers.canvas))
+                batch[index] = fill_input_tensor(buffers)[0]
+
+    with stage_timer("inference"):
         results = model.predict(
-            source=img,
-            imgsz=640,
+            source=torch.from_numpy(batch),
+            imgsz=INPUT_SIZE,
             conf=conf,
-            save=save,
-            save_txt=False,
+            save=False,
             half=True,
-            line_width=2,
-            show_labels=True,
-            show_conf=True,
-            project=str(TEMP_DIR) if save else None,
-            name="predict" if save else None,
-            exist_ok=True
+            verbose=False
         )
-        log_memory_usage("After prediction")
-        
-        # If save is True, make sure the annotated image exists with proper filename
+
+    with stage_timer("postprocess"):
+        return [
+            scale_boxes_to_image(result.boxes.data.cpu().numpy(), gain, pad_x, pad_y, img.shape[:2])
+            for result, img, (gain, pad_x, pad_y) in zip(results, images, letterboxes)
+        ]
+
+def predict_tiled(image_path, conf=0.7, tile_size=640, overlap=0.2, iou=0.5,
+                  include_full_image=True, save=False, annotate_conf=None):
+    """Run sliced inference on a full-resolution image.
+
+    The image is cut into overlapping tiles which are sent to the model as a
+    single batch, so small items keep their native resolution. Detections are
+    shifted back into full-image coordinates and merged with cross-tile NMS.
+
+    Args:
+        image_path: Path to the image
+        conf: Confidence threshold
+        tile_size: Side length of each tile in pixels
+        overlap: Fraction of each tile shared with its neighbour
+        iou: Overlap threshold used when merging detections across tiles
+        include_full_image: Also run the downscaled full image in the same
+            batch so objects larger than a tile are still found
+        save: Whether to save the annotated image to PREDICT_DIR
+        annotate_conf: Only draw boxes at or above this confidence (default: all)
+
+    Returns:
+        List with a single Results object for the full image, like predict
+    """
+    model = get_model()
+
+    if model is None:
+        return None
+
+    try:
+        with stage_timer("decode"):
+            img = cv2.imread(str(image_path))
+        if img is None:
+            logger.error("Error predicting: could not read image %s", image_path)
+            return None
+        height, width = img.shape[:2]
+
+        tiles = compute_tiles(width, height, tile_size, overlap)
+        if include_full_image and len(tiles) > 1:
+            tiles.append((0, 0, width, height))
+
+        # Slicing returns views, so no pixel data is copied here
+        crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in tiles]
+
+        with stage_timer("inference"):
+            tile_results = model.predict(
+                source=crops,
+                imgsz=tile_size,
+                conf=conf,
+                half=True,
+                save=False,
+                verbose=False
+            )
+
+        with stage_timer("postprocess"):
+            tile_detections = [
+                np.concatenate([
+                    r.boxes.xyxy.cpu().numpy(),
+                    r.boxes.conf.cpu().numpy()[:, None],
+                    r.boxes.cls.cpu().numpy()[:, None]
+                ], axis=1) if len(r.boxes) else np.empty((0, 6), dtype=np.float32)
+                for r in tile_results
+            ]
+            merged = merge_tile_detections(tile_detections, tiles, threshold=iou)
+
+            result = Results(
+                orig_img=img,
+                path=str(image_path),
+                names=model.names,
+                boxes=torch.from_numpy(merged)
+            )
+
         if save:
-            log_memory_usage("Before saving annotated image")
-            # The annotated image might have been saved with a numeric index
-            # Let's find it and rename it to match the original image ID
-            
-            # Find the most recent plotted image in the predict directory
-            # (Usually saved as 0.jpg, 1.jpg, etc.)
-            plotted_images = list(PREDICT_DIR.glob("*.jpg"))
-            if plotted_images:
-                latest_image = max(plotted_images, key=lambda p: p.stat().st_mtime)
-                
-                # Set the target filename based on the original image ID
-                target_filename = PREDICT_DIR / f"{image_id}.jpg"
-                
-                # Remove existing target file if it exists
-                if target_filename.exists():
-                    os.remove(target_filename)
-                
-                # Copy the latest plotted image to the target filename
-                shutil.copy2(latest_image, target_filename)
-                
-                #print(f"Saved annotated image for {image_id} at {target_filename}")
-                asyncio.create_task(delayed_cleanup())
-
-            else:
-                # If no plotted image was found, we need to create one manually
-                # Get the plotted result from the results object
-                result_img = results[0].plot()  # This returns the annotated image as a numpy array
-                
-                # Convert BGR to RGB (OpenCV uses BGR, but result might be RGB)
-                if len(result_img.shape) == 3 and result_img.shape[2] == 3:
-                    result_img = cv2.cvtColor(result_img, cv2.COLOR_RGB2BGR)
-                
-                # Save the annotated image with the image ID
-                target_filename = PREDICT_DIR / f"{image_id}.jpg"
-                cv2.imwrite(str(target_filename), result_img)
-                
-                #print(f"Manually saved annotated image for {image_id} at {target_filename}")
-            log_memory_usage("After saving annotated image")
-        
-        return results
+            with stage_timer("annotate"):
+                _save_annotated(img, image_path, model.names, merged, annotate_conf)
+
+        return [result]
     except Exception as e:
-        print(f"Error predicting: {e}")
-        import traceback
-        traceback.print_exc()
-        return None 
+        logger.exception("Error predicting: %s", e)
+        return None
 
 def delete_all_temp_images():
     """Delete all image files in both TEMP_DIR and PREDICT_DIR"""
@@ -142,7 +288,7 @@ def delete_all_temp_images():
                     os.remove(file_path)
                     deleted_count += 1
                 except Exception as e:
-                    print(f"Error deleting {file_path}: {e}")
+                    logger.error("Error deleting %s: %s", file_path, e)
     
     # Delete files in PREDICT_DIR
     for ext in ['*.jpg', '*.jpeg', '*.JPG', '*.JPEG']:
@@ -152,7 +298,7 @@ def delete_all_temp_images():
                     os.remove(file_path)
                     deleted_count += 1
                 except Exception as e:
-                    print(f"Error deleting {file_path}: {e}")
+                    logger.error("Error deleting %s: %s", file_path, e)
     
     return deleted_count 
 
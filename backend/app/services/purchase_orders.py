@@ -0,0 +1,128 @@
+"""
+Purchase-order suggestions
+
+Combines current stock, the stockout forecast and the packaging sizes in
+ingredient_defaults into a shopping list rounded up to whole packages.
+All ingredients are handled together: one forecast, one defaults query and
+array arithmetic for the shortfalls.
+"""
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.db import get_ingredient_default_quantities
+from app.services.ingredient_index import INGREDIENT_ALIASES, normalize_name
+from app.services.inventory_forecast import forecast_engine
+
+# Extra days of usage kept on hand on top of the purchase horizon
+PURCHASE_SAFETY_DAYS = float(os.getenv("PURCHASE_SAFETY_DAYS", "1"))
+
+
+def _match_defaults(names: List[str], defaults: List[Dict],
+                    aliases: Optional[Dict[str, str]] = None) -> List[Optional[Dict]]:
+    """
+    Find the packaging default for each ingredient
+
+    Names resolve the way detections do in ingredient_index: exactly, then
+    ignoring case and separators, then through the "aliases" of a default
+    or the alias table ("chicken_egg" -> "Egg").
+
+    Args:
+        names: Ingredient names as used in the inventory and recipes
+        defaults: Documents from ingredient_defaults
+        aliases: Name -> ingredient name aliases (default INGREDIENT_ALIASES)
+
+    Returns:
+        The matching default for each name, or None
+    """
+    exact = {default["ingredient_name"]: default for default in defaults}
+    lookup = {}
+    for default in defaults:
+        lookup.setdefault(normalize_name(default["ingredient_name"]), default)
+    # Aliases never shadow a real ingredient name
+    for default in defaults:
+        for alias in default.get("aliases") or []:
+            lookup.setdefault(normalize_name(alias), default)
+    for alias, target in (INGREDIENT_ALIASES if aliases is None else aliases).items():
+        if normalize_name(target) in lookup:
+            lookup[normalize_name(alias)] = lookup[normalize_name(target)]
+    return [exact.get(name) or lookup.get(normalize_name(name)) for name in names]
+
+
+def _same_unit(first: Optional[str], second: Optional[str]) -> bool:
+    """Whether two unit names agree, ignoring case and plurals ("piece" and "pieces")"""
+    if not first or not second:
+        return False
+    return normalize_name(first).rstrip("s") == normalize_name(second).rstrip("s")
+
+
+async def suggest_purchase_order(horizon: int = 7, safety_days: float = PURCHASE_SAFETY_DAYS,
+                                 method: str = "weekday") -> Dict:
+    """
+    Build a shopping list that covers forecast usage over the horizon
+
+    Args:
+        horizon: Days the purchase should last
+        safety_days: Extra days of usage to keep as buffer
+        method: Forecast method, "moving_average" or "weekday"
+
+    Returns:
+        Dictionary with the items to buy and ingredients that were skipped.
+        Items with a packaging default in the same unit are rounded up to
+        whole packages, others list the exact shortfall.
+    """
+    forecast = await forecast_engine.forecast(method, horizon=horizon)
+    defaults = await get_ingredient_default_quantities()
+
+    ingredients = [item for item in forecast["ingredients"] if item["status"] != "unit_mismatch"]
+    skipped = [
+        {"ingredient_name": item["ingredient_name"], "reason": "Inventory and recipe units differ"}
+        for item in forecast["ingredients"] if item["status"] == "unit_mismatch"
+    ]
+
+    names = [item["ingredient_name"] for item in ingredients]
+    matched = _match_defaults(names, defaults)
+
+    stock = np.array([item["stock"] for item in ingredients])
+    daily = np.array([item["daily_consumption"] for item in ingredients])
+    # Packages only apply when the default is in the same unit as the stock
+    package_size = np.array([
+        default["default_quantity"] if default and _same_unit(default.get("unit"), item["unit"]) else np.nan
+        for item, default in zip(ingredients, matched)
+    ], dtype=np.float64)
+
+    usage = daily * (horizon + safety_days)
+    shortfall = np.maximum(usage - stock, 0)
+    has_package = np.isfinite(package_size) & (package_size > 0)
+    packages = np.zeros(len(names))
+    np.divide(shortfall, package_size, out=packages, where=has_package)
+    packages = np.ceil(packages - 1e-9)
+    order_quantity = np.where(has_package, packages * np.nan_to_num(package_size), shortfall)
+
+    items = []
+    for index in np.flatnonzero(shortfall > 0):
+        item, default = ingredients[index], matched[index]
+        items.append({
+            "ingredient_name": item["ingredient_name"],
+            "unit": item["unit"],
+            "stock": item["stock"],
+            "projected_usage": round(float(usage[index]), 2),
+            "shortfall": round(float(shortfall[index]), 2),
+            "days_until_stockout": item["days_until_stockout"],
+            "order_quantity": round(float(order_quantity[index]), 2),
+            "packages": int(packages[index]) if has_package[index] else None,
+            "package_size": float(package_size[index]) if has_package[index] else None,
+            "packaging_description": default.get("packaging_description") if has_package[index] else None
+        })
+
+    items.sort(key=lambda entry: (entry["days_until_stockout"] is None, entry["days_until_stockout"] or 0))
+    return {
+        "generated_at": datetime.now(),
+        "horizon_days": horizon,
+        "safety_days": safety_days,
+        "method": method,
+        "items": items,
+        "skipped": skipped
+    }
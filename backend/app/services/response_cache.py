@@ -0,0 +1,302 @@
+"""
+Read-through cache for JSON responses
+
+Read endpoints are cached by route and parameters and tagged with the
+data they depend on ("orders", "menu", "inventory"). The write functions
+in app.services.db invalidate their tag, which drops exactly the cached
+responses built from that data.
+
+Entries live in an in-process LRU by default. Setting
+RESPONSE_CACHE_BACKEND=sqlite stores them in a local SQLite file shared
+by every worker process on the host, so an invalidation in one worker
+is seen by all of them.
+"""
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi.responses import Response
+
+from app.utils.lru import LRUCache
+from app.utils.metrics import registry, sample_lines
+
+# Cache configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_SQLITE_PATH = os.getenv("RESPONSE_CACHE_SQLITE_PATH", "/tmp/warung_response_cache.sqlite3")
+
+
+class MemoryBackend:
+    """Entries in an in-process LRU, with a tag -> keys index"""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self._entries = LRUCache(maxsize, on_evict=self._evicted)
+        self._tags: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _evicted(self, key: str, entry: Tuple) -> None:
+        self.evictions += 1
+        self._untag(key, entry[2])
+
+    def _untag(self, key: str, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                self._tags.get(tag, set()).discard(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        body, expires_at, tags = entry
+        if expires_at < time.time():
+            self._entries.pop(key)
+            self._untag(key, tags)
+            return None
+        return body
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+        self._entries.set(key, (body, time.time() + ttl, tags))
+
+    def invalidate(self, tag: str) -> int:
+        with self._lock:
+            keys = self._tags.pop(tag, set())
+        removed = 0
+        for key in keys:
+            entry = self._entries.pop(key)
+            if entry is not None:
+                removed += 1
+                self._untag(key, entry[2])
+        return removed
+
+    def clear(self) -> None:
+        self._entries.clear()
+        with self._lock:
+            self._tags.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Entries in a SQLite file shared by the worker processes on one host"""
+
+    def __init__(self, path: str = RESPONSE_CACHE_SQLITE_PATH, maxsize: int = RESPONSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, body BLOB, expires_at REAL, last_used REAL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key))")
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM entries WHERE key = ? AND expires_at >= ?", (key, now)
+            ).fetchone()
+            if row:
+                self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+        return row[0] if row else None
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, body, now + ttl, now)
+            )
+            self._conn.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)", [(tag, key) for tag in tags])
+
+            # Drop expired entries, then the least recently used beyond maxsize
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT key FROM entries WHERE expires_at < ?", (now,)
+            )]
+            self._delete(expired)
+            overflow = [row[0] for row in self._conn.execute(
+                "SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?", (self.maxsize,)
+            )]
+            self._delete(overflow)
+            self.evictions += len(overflow)
+
+    def _delete(self, keys) -> None:
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        self._conn.executemany("DELETE FROM tags WHERE key = ?", [(key,) for key in keys])
+
+    def invalidate(self, tag: str) -> int:
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN")
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM tags WHERE tag = ?", (tag,))]
+            self._delete(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM tags")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class ResponseCache:
+    """Tagged response cache with hit/miss counters and coalesced misses"""
+
+    def __init__(self, backend=None, ttl: float = RESPONSE_CACHE_TTL, enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.enabled = enabled and ttl > 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Concurrent misses for the same key wait for the first one
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # Bumped by every invalidation so responses built across a write are not stored
+        self._generation = 0
+
+    @staticmethod
+    def make_key(route: str, params: Dict[str, Any]) -> str:
+        """Build a cache key from the route and its parameters, in a stable order"""
+        query = "&".join(f"{name}={params[name]}" for name in sorted(params) if params[name] is not None)
+        return f"{route}?{query}"
+
+    async def get_or_build(self, key: str, tags: Iterable[str], build: Callable) -> Tuple[Any, bool]:
+        """
+        Return the cached body for key, or build and store it
+
+        Args:
+            key: Cache key from make_key
+            tags: Data the response depends on
+            build: Coroutine function returning a Response
+
+        Returns:
+            (cached body bytes or the built Response, whether it was a hit)
+        """
+        body = self.backend.get(key)
+        if body is not None:
+            self.hits += 1
+            return body, True
+
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        generation = self._generation
+        try:
+            response = await build()
+            if isinstance(response, Response) and response.status_code == 200:
+                if generation == self._generation:
+                    self.backend.set(key, response.body, self.ttl, tags)
+                future.set_result(response.body)
+            else:
+                # Waiters rebuild themselves rather than share an error response
+                future.set_exception(_NotCacheable())
+            return response, False
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+            if future.done() and not future.cancelled():
+                future.exception()  # Mark retrieved so unused errors are not logged
+
+    def invalidate(self, *tags: str) -> int:
+        """Drop every cached response that depends on any of the tags"""
+        if not self.enabled:
+            return 0
+        self._generation += 1
+        removed = sum(self.backend.invalidate(tag) for tag in tags)
+        self.invalidations += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "evictions": self.backend.evictions,
+        }
+
+
+class _NotCacheable(Exception):
+    pass
+
+
+def _create_cache() -> ResponseCache:
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        return ResponseCache(SQLiteBackend())
+    return ResponseCache(MemoryBackend())
+
+
+# Shared cache for the application
+response_cache = _create_cache()
+
+
+def _cache_metrics():
+    stats = response_cache.stats()
+    lines = sample_lines("response_cache_entries", "Cached responses", [({}, stats["entries"])])
+    for name in ("hits", "misses", "invalidations", "evictions"):
+        lines += sample_lines(
+            f"response_cache_{name}_total", f"Response cache {name}", [({}, stats[name])], "counter"
+        )
+    return lines
+
+
+registry.add_collector(_cache_metrics)
+
+
+def cached_response(route: str, tags: Iterable[str]):
+    """
+    Cache a JSON endpoint's response by route and parameters
+
+    Args:
+        route: Route path used in the cache key
+        tags: Data the response depends on, invalidated by the write paths
+    """
+    tags = tuple(tags)
+
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(**params):
+            if not response_cache.enabled:
+                return await endpoint(**params)
+
+            key = ResponseCache.make_key(route, params)
+            try:
+                result, hit = await response_cache.get_or_build(key, tags, lambda: endpoint(**params))
+            except _NotCacheable:
+                return await endpoint(**params)
+
+            if hit:
+                return Response(result, media_type="application/json", headers={"X-Cache": "HIT"})
+            result.headers["X-Cache"] = "MISS"
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,113 @@
+"""
+Load menus and ingredient defaults from JSON or CSV files for bulk seeding
+
+Menu CSV files have one row per recipe ingredient:
+    code,name,price,ingredient,quantity,unit
+
+Ingredient default CSV files have one row per ingredient:
+    ingredient_name,default_quantity,unit,packaging_description
+
+JSON files hold a list of objects in the shape of MenuItem or
+IngredientDefaultQuantity (optionally wrapped in {"menu": [...]} or
+{"defaults": [...]}).
+"""
+import csv
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+
+from app.models.inventory import IngredientDefaultQuantity
+from app.models.menu import MenuItem
+
+
+def _read_json_list(path: Path, key: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get(key, [])
+    if not isinstance(data, list):
+        raise ValueError(f"{path} must contain a list of objects")
+    return data
+
+
+def _read_csv_rows(path: Path) -> List[Dict]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return [
+            {key.strip(): (value or "").strip() for key, value in row.items() if key}
+            for row in csv.DictReader(f)
+        ]
+
+
+def load_menu_file(path: Union[str, Path]) -> List[Dict]:
+    """
+    Load menu items from a JSON or CSV file
+
+    Args:
+        path: Path to a .json or .csv file
+
+    Returns:
+        List of validated menu item dictionaries
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == ".json":
+        items = _read_json_list(path, "menu")
+    elif suffix == ".csv":
+        # Group ingredient rows by menu code, keeping file order
+        grouped = {}
+        for line_number, row in enumerate(_read_csv_rows(path), start=2):
+            code = row.get("code")
+            if not code:
+                raise ValueError(f"{path}:{line_number}: missing menu code")
+            item = grouped.setdefault(code, {
+                "code": code,
+                "name": row.get("name") or code,
+                "price": row.get("price") or 0,
+                "ingredients": []
+            })
+            if row.get("ingredient"):
+                item["ingredients"].append({
+                    "name": row["ingredient"],
+                    "quantity": row.get("quantity") or 0,
+                    "unit": row.get("unit") or "unit"
+                })
+        items = list(grouped.values())
+    else:
+        raise ValueError(f"Unsupported menu file type: {path.suffix}")
+
+    return [MenuItem(**item).model_dump() for item in items]
+
+
+def load_ingredient_defaults_file(path: Union[str, Path]) -> List[Dict]:
+    """
+    Load ingredient default quantities from a JSON or CSV file
+
+    Args:
+        path: Path to a .json or .csv file
+
+    Returns:
+        List of validated ingredient default dictionaries, one per ingredient
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == ".json":
+        rows = _read_json_list(path, "defaults")
+    elif suffix == ".csv":
+        # Empty cells fall back to the model defaults
+        rows = [
+            {key: value for key, value in row.items() if value != ""}
+            for row in _read_csv_rows(path)
+        ]
+    else:
+        raise ValueError(f"Unsupported defaults file type: {path.suffix}")
+
+    # Later rows win when an ingredient is listed twice
+    defaults = {}
+    for row in rows:
+        model = IngredientDefaultQuantity(**row)
+        # Leave aliases set elsewhere alone unless the file lists them
+        default = model.model_dump(exclude={"aliases"} if model.aliases is None else None)
+        defaults[default["ingredient_name"]] = default
+    return list(defaults.values())
@@ -0,0 +1,317 @@
+"""
+Image storage backends
+
+Uploaded images are written and read as streams of chunks, so a photo is
+never held in memory as a whole by the API. The local backend keeps files
+in TEMP_DIR (one disk per instance); the S3 backend works with AWS S3 and
+S3-compatible stores such as MinIO, so every replica sees the same images.
+
+Configuration:
+    IMAGE_STORAGE_BACKEND: "local" (default) or "s3"
+    IMAGE_STORAGE_CHUNK_SIZE: Read/write chunk size in bytes (default 1 MiB)
+    S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION: S3 location; the
+        endpoint is only needed for S3-compatible stores, e.g.
+        http://localhost:9000 for a local MinIO. Credentials come from the
+        usual AWS environment variables or config files.
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORAGE_BACKEND = os.getenv("IMAGE_STORAGE_BACKEND", "local").lower()
+IMAGE_STORAGE_CHUNK_SIZE = int(os.getenv("IMAGE_STORAGE_CHUNK_SIZE", str(1024 * 1024)))
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_PREFIX = os.getenv("S3_PREFIX", "images/")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_REGION = os.getenv("S3_REGION")
+
+# Local directory for stored images and for temporary copies of remote ones
+TEMP_DIR = Path(__file__).resolve().parent.parent.parent / "temp_images"
+
+
+def _check_key(key: str) -> str:
+    """Keys are plain file names; reject anything that could escape the storage root"""
+    if not key or Path(key).name != key or key in (".", ".."):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+
+def parse_byte_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range HTTP Range header
+
+    Args:
+        header: Range header value, e.g. "bytes=0-1023" or "bytes=-500"
+        size: Total size of the resource
+
+    Returns:
+        (start, end) with end inclusive, or None to send the whole resource
+        (no header, multiple ranges or a unit other than bytes)
+
+    Raises:
+        ValueError: If the range cannot be satisfied (HTTP 416)
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start_text:
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+
+    if start >= size or end < start:
+        raise ValueError(f"Range not satisfiable: {header}")
+    return start, min(end, size - 1)
+
+
+class LocalStorage:
+    """Images as files in a local directory"""
+
+    def __init__(self, root: Path = TEMP_DIR, chunk_size: int = IMAGE_STORAGE_CHUNK_SIZE):
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    async def save_stream(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """
+        Write an object from a stream of chunks
+
+        The file appears under its key only once it is complete.
+
+        Returns:
+            Number of bytes written
+        """
+        path = self.path(key)
+        partial = path.with_name(f".{path.name}.{uuid.uuid4().hex}.part")
+        size = 0
+        f = await asyncio.to_thread(open, partial, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+                size += len(chunk)
+            await asyncio.to_thread(f.close)
+            os.replace(partial, path)
+        except BaseException:
+            f.close()
+            partial.unlink(missing_ok=True)
+            raise
+        return size
+
+    async def open_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Read an object, or the byte range start..end (inclusive), in chunks
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        f = await asyncio.to_thread(open, self.path(key), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def stat(self, key: str) -> Optional[Dict]:
+        """Size and a version string that changes whenever the object does, or None if missing"""
+        try:
+            info = await asyncio.to_thread(os.stat, self.path(key))
+        except FileNotFoundError:
+            return None
+        return {"size": info.st_size, "version": f"{info.st_mtime_ns}-{info.st_size}"}
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.path(key).unlink, True)
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        """Yield a local path to the object (the file itself), or None if missing"""
+        path = self.path(key)
+        yield path if path.exists() else None
+
+
+class S3Storage:
+    """Images in an S3 bucket or S3-compatible store (MinIO, R2, ...)"""
+
+    # S3 rejects multipart parts below 5 MiB, except for the last one
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, chunk_size: int = IMAGE_STORAGE_CHUNK_SIZE,
+                 part_size: int = 8 * 1024 * 1024, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("boto3 is required for IMAGE_STORAGE_BACKEND=s3 (pip install boto3)")
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self._client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.part_size = max(part_size, self.MIN_PART_SIZE)
+
+    def _key(self, key: str) -> str:
+        return self.prefix + _check_key(key)
+
+    @staticmethod
+    def _is_missing(error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    async def save_stream(self, key: str, chunks: AsyncIterable[bytes]) -> int:
+        """
+        Write an object from a stream of chunks
+
+        Objects up to part_size are sent with one PUT; larger ones as a
+        multipart upload, buffering at most one part in memory.
+
+        Returns:
+            Number of bytes written
+        """
+        object_key = self._key(key)
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        response = await asyncio.to_thread(
+                            self._client.create_multipart_upload, Bucket=self.bucket, Key=object_key
+                        )
+                        upload_id = response["UploadId"]
+                    parts.append(await self._upload_part(object_key, upload_id, len(parts) + 1, bytes(buffer)))
+                    buffer.clear()
+
+            if upload_id is None:
+                await asyncio.to_thread(self._client.put_object, Bucket=self.bucket, Key=object_key,
+                                        Body=bytes(buffer))
+                return size
+
+            if buffer:
+                parts.append(await self._upload_part(object_key, upload_id, len(parts) + 1, bytes(buffer)))
+            await asyncio.to_thread(
+                self._client.complete_multipart_upload, Bucket=self.bucket, Key=object_key,
+                UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+            return size
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    await asyncio.to_thread(self._client.abort_multipart_upload, Bucket=self.bucket,
+                                            Key=object_key, UploadId=upload_id)
+                except Exception as e:
+                    logger.warning("Could not abort multipart upload of %s: %s", object_key, e)
+            raise
+
+    async def _upload_part(self, object_key: str, upload_id: str, number: int, data: bytes) -> Dict:
+        response = await asyncio.to_thread(
+            self._client.upload_part, Bucket=self.bucket, Key=object_key,
+            UploadId=upload_id, PartNumber=number, Body=data
+        )
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    async def open_stream(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Read an object, or the byte range start..end (inclusive), in chunks
+
+        Raises:
+            FileNotFoundError: If the object does not exist
+        """
+        kwargs = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        try:
+            response = await asyncio.to_thread(self._client.get_object, **kwargs)
+        except Exception as e:
+            if self._is_missing(e):
+                raise FileNotFoundError(key)
+            raise
+
+        body = response["Body"]
+        try:
+            chunks = body.iter_chunks(self.chunk_size)
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def stat(self, key: str) -> Optional[Dict]:
+        """Size and the object's ETag as its version, or None if missing"""
+        try:
+            response = await asyncio.to_thread(self._client.head_object, Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if self._is_missing(e):
+                return None
+            raise
+        return {"size": response["ContentLength"], "version": response["ETag"].strip('"')}
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._client.delete_object, Bucket=self.bucket, Key=self._key(key))
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        """
+        Download the object to a temporary file for code that needs a path
+        (OpenCV, the model), yielding None if it does not exist
+        """
+        TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        handle, name = tempfile.mkstemp(suffix=Path(key).suffix, dir=TEMP_DIR)
+        path = Path(name)
+        try:
+            with os.fdopen(handle, "wb") as f:
+                try:
+                    async for chunk in self.open_stream(key):
+                        await asyncio.to_thread(f.write, chunk)
+                except FileNotFoundError:
+                    path.unlink(missing_ok=True)
+                    path = None
+            yield path
+        finally:
+            if path is not None:
+                path.unlink(missing_ok=True)
+
+
+def create_storage():
+    """Build the backend selected by IMAGE_STORAGE_BACKEND"""
+    if IMAGE_STORAGE_BACKEND == "s3":
+        if not S3_BUCKET:
+            raise RuntimeError("S3_BUCKET must be set when IMAGE_STORAGE_BACKEND=s3")
+        return S3Storage(S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION)
+    return LocalStorage()
+
+
+# Shared storage for the application
+storage = create_storage()
@@ -0,0 +1,219 @@
+"""
+Cross-frame object tracking for video and burst uploads
+
+A small ByteTrack-style tracker: confident detections are matched to
+existing tracks first and may start new ones, then low-confidence
+detections are only used to keep existing tracks alive, so an item that
+briefly scores low is not lost and counted again. Matching is greedy and
+per class, on IoU against each track's position predicted from its
+velocity and the camera motion between frames (estimated from the images
+by the caller), falling back to centroid distance for what the motion
+estimate misses. Boxes are tracked in coordinates normalised to the frame
+size so frames of different resolutions mix.
+
+Configuration:
+    TRACK_HIGH_CONF: Confidence needed to start a track (default 0.5)
+    TRACK_MATCH_IOU: Minimum IoU to continue a track (default 0.3)
+    TRACK_MAX_DISTANCE: Maximum centroid distance, in track box diagonals,
+        to continue a track without overlap (default 0.5)
+    TRACK_MAX_AGE: Sampled frames a track survives without a match (default 5)
+    TRACK_MIN_HITS: Frames an item must be seen in to be counted (default 2)
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TRACK_HIGH_CONF = float(os.getenv("TRACK_HIGH_CONF", "0.5"))
+TRACK_MATCH_IOU = float(os.getenv("TRACK_MATCH_IOU", "0.3"))
+TRACK_MAX_DISTANCE = float(os.getenv("TRACK_MAX_DISTANCE", "0.5"))
+TRACK_MAX_AGE = int(os.getenv("TRACK_MAX_AGE", "5"))
+TRACK_MIN_HITS = int(os.getenv("TRACK_MIN_HITS", "2"))
+
+
+class Track:
+    """One physical item followed across frames"""
+
+    def __init__(self, track_id: int, class_id: int, box: np.ndarray, confidence: float, frame: int):
+        self.track_id = track_id
+        self.class_id = class_id
+        self.box = box
+        self.velocity = np.zeros(2)
+        self.hits = 1
+        self.first_frame = frame
+        self.last_frame = frame
+        # Where the item was seen with the highest confidence
+        self.confidence = confidence
+        self.best_box = box
+        self.best_frame = frame
+        # Detected box in every frame the item was seen in
+        self.sightings: Dict[int, np.ndarray] = {frame: box}
+
+    def predict(self, frame: int) -> np.ndarray:
+        """Box shifted by the track's velocity to the given frame"""
+        shift = self.velocity * (frame - self.last_frame)
+        return self.box + np.concatenate([shift, shift])
+
+    def update(self, box: np.ndarray, confidence: float, frame: int) -> None:
+        step = (box[:2] + box[2:] - self.box[:2] - self.box[2:]) / 2 / max(frame - self.last_frame, 1)
+        # Smoothed so one jittery box does not throw the prediction off
+        self.velocity = step if self.hits == 1 else 0.5 * self.velocity + 0.5 * step
+        self.box = box
+        self.hits += 1
+        self.last_frame = frame
+        self.sightings[frame] = box
+        if confidence > self.confidence:
+            self.confidence, self.best_box, self.best_frame = confidence, box, frame
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    inter_w = (np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])).clip(min=0)
+    inter_h = (np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])).clip(min=0)
+    inter = inter_w * inter_h
+    area_a = ((a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1]))[:, None]
+    area_b = ((b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1]))[None, :]
+    return inter / np.maximum(area_a + area_b - inter, 1e-9)
+
+
+class ByteTracker:
+    """Two-stage tracker counting each physical item once"""
+
+    def __init__(self, high_conf: float = TRACK_HIGH_CONF, match_iou: float = TRACK_MATCH_IOU,
+                 max_distance: float = TRACK_MAX_DISTANCE, max_age: int = TRACK_MAX_AGE):
+        self.high_conf = high_conf
+        self.match_iou = match_iou
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.tracks: List[Track] = []
+        self.frame = -1
+        # Camera motion accumulated up to each frame, in normalised coordinates
+        self.offsets: List[np.ndarray] = []
+
+    def update(self, detections: np.ndarray, frame_size: Tuple[int, int],
+               camera_shift: Optional[Tuple[float, float]] = None) -> np.ndarray:
+        """
+        Add the detections of the next frame
+
+        Args:
+            detections: (N, 6) array of [x1, y1, x2, y2, confidence, class_id] in pixels
+            frame_size: (width, height) of the frame
+            camera_shift: How far the scene moved since the previous frame, as
+                (dx, dy) fractions of the frame size; tracks are moved with it
+
+        Returns:
+            Track ID for each detection, -1 for low-confidence detections
+            that matched no track
+        """
+        self.frame += 1
+        offset = self.offsets[-1] if self.offsets else np.zeros(2)
+        self.offsets.append(offset + np.asarray(camera_shift) if camera_shift is not None else offset)
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+        width, height = frame_size
+        boxes = detections[:, :4] / np.array([width, height, width, height], dtype=np.float64)
+        confidences = detections[:, 4]
+        class_ids = detections[:, 5].astype(np.int64)
+        track_ids = np.full(len(detections), -1, dtype=np.int64)
+
+        active = [track for track in self.tracks if self.frame - track.last_frame <= self.max_age]
+        if camera_shift is not None:
+            # Only the camera moved; the track's own velocity stays as it was
+            shift = np.array([camera_shift[0], camera_shift[1], camera_shift[0], camera_shift[1]])
+            for track in active:
+                track.box = track.box + shift
+        high = np.flatnonzero(confidences >= self.high_conf)
+        low = np.flatnonzero(confidences < self.high_conf)
+
+        # Confident detections first, then weak ones for the tracks still unmatched
+        unmatched_tracks = active
+        for candidates in (high, low):
+            matches, unmatched_tracks = self._associate(unmatched_tracks, candidates, boxes, class_ids)
+            for track, index in matches:
+                track.update(boxes[index], float(confidences[index]), self.frame)
+                track_ids[index] = track.track_id
+
+        for index in high:
+            if track_ids[index] < 0:
+                track = Track(len(self.tracks), int(class_ids[index]), boxes[index],
+                              float(confidences[index]), self.frame)
+                self.tracks.append(track)
+                track_ids[index] = track.track_id
+        return track_ids
+
+    def _associate(self, tracks: List[Track], candidates: np.ndarray, boxes: np.ndarray,
+                   class_ids: np.ndarray) -> Tuple[List[Tuple[Track, int]], List[Track]]:
+        if not tracks or not len(candidates):
+            return [], tracks
+
+        predicted = np.stack([track.predict(self.frame) for track in tracks])
+        candidate_boxes = boxes[candidates]
+        iou = box_iou(predicted, candidate_boxes)
+
+        centres = (predicted[:, :2] + predicted[:, 2:]) / 2
+        candidate_centres = (candidate_boxes[:, :2] + candidate_boxes[:, 2:]) / 2
+        diagonals = np.hypot(predicted[:, 2] - predicted[:, 0], predicted[:, 3] - predicted[:, 1])
+        distance = np.linalg.norm(centres[:, None] - candidate_centres[None], axis=2) / np.maximum(
+            diagonals[:, None], 1e-9
+        )
+
+        same_class = np.array([track.class_id for track in tracks])[:, None] == class_ids[candidates][None, :]
+        allowed = same_class & ((iou >= self.match_iou) | (distance <= self.max_distance))
+
+        # Greedy: best overlap first, closest centre among equal overlaps
+        rows, cols = np.nonzero(allowed)
+        order = np.lexsort((distance[rows, cols], -iou[rows, cols]))
+        used_tracks, used_candidates, matches = set(), set(), []
+        for row, col in zip(rows[order].tolist(), cols[order].tolist()):
+            if row in used_tracks or col in used_candidates:
+                continue
+            used_tracks.add(row)
+            used_candidates.add(col)
+            matches.append((tracks[row], int(candidates[col])))
+        return matches, [track for row, track in enumerate(tracks) if row not in used_tracks]
+
+    def confirmed(self, min_hits: int = TRACK_MIN_HITS) -> List[Track]:
+        """Tracks seen in at least min_hits frames, i.e. the counted items"""
+        return [track for track in self.tracks if track.hits >= min_hits]
+
+    def box_in_frame(self, track: Track, frame: int) -> np.ndarray:
+        """
+        Where a track's item is in the given frame, normalised
+
+        The detection from that frame if the item was seen in it, otherwise
+        the sighting closest in time moved by the camera motion in between.
+        """
+        box = track.sightings.get(frame)
+        if box is not None:
+            return box
+        seen = min(track.sightings, key=lambda index: abs(index - frame))
+        shift = self.offsets[frame] - self.offsets[seen]
+        return track.sightings[seen] + np.concatenate([shift, shift])
+
+    def summary(self, frame_size: Tuple[int, int], min_hits: int = TRACK_MIN_HITS,
+                frame: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Counted items as detection arrays, one row per item
+
+        Args:
+            frame_size: (width, height) the returned boxes should refer to
+            min_hits: Frames an item must be seen in to be counted
+            frame: Frame (in update order) the boxes are drawn on; each box
+                is placed where its item is in that frame, clipped to it.
+                Without it, boxes are where each item was seen best
+
+        Returns:
+            Dictionary with "class_ids", "confidences" (best per item) and
+            "xyxy" (scaled to frame_size)
+        """
+        tracks = self.confirmed(min_hits)
+        width, height = frame_size
+        if frame is None:
+            boxes = np.array([track.best_box for track in tracks], dtype=np.float64).reshape(-1, 4)
+        else:
+            boxes = np.array([self.box_in_frame(track, frame) for track in tracks],
+                             dtype=np.float64).reshape(-1, 4).clip(0, 1)
+        return {
+            "class_ids": np.array([track.class_id for track in tracks], dtype=np.int64),
+            "confidences": np.array([track.confidence for track in tracks], dtype=np.float32),
+            "xyxy": (boxes * np.array([width, height, width, height])).astype(np.float32),
+        }
@@ -0,0 +1,304 @@
+"""
+Frame sampling and pipelined inference for video and burst uploads
+
+Videos are sampled adaptively: frames are compared on a small grayscale
+thumbnail every VIDEO_MIN_FRAME_INTERVAL seconds, and one is kept when
+the scene has changed by VIDEO_MOTION_THRESHOLD since the last kept frame
+or VIDEO_MAX_FRAME_INTERVAL has passed. A steady shot therefore costs a
+frame or two per second while a pan keeps up with what comes into view.
+Skipped frames are only grabbed, not decoded.
+
+Decoding runs in its own thread and feeds a bounded queue; the inference
+side takes whatever frames are ready, up to VIDEO_BATCH_SIZE, as one
+batch. Decode of the next frames overlaps inference of the current batch.
+Camera motion between consecutive frames is estimated by phase
+correlation of small thumbnails and passed to the tracker, so items are
+matched across a pan even when they move further than their own size.
+
+Configuration:
+    VIDEO_MAX_FRAMES: Most frames sampled from one upload (default 40)
+    VIDEO_MAX_DURATION: Seconds of video read at most (default 30)
+    VIDEO_MIN_FRAME_INTERVAL / VIDEO_MAX_FRAME_INTERVAL: Bounds on the
+        time between sampled frames in seconds (default 0.1 / 1.0)
+    VIDEO_MOTION_THRESHOLD: Mean thumbnail difference (0-1) that counts
+        as a new view (default 0.03)
+    VIDEO_FRAME_SIZE: Longest side frames are reduced to (default 1280)
+    VIDEO_BATCH_SIZE: Most frames per inference batch (default 8)
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from app.services.tracking import ByteTracker
+
+logger = logging.getLogger(__name__)
+
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "40"))
+VIDEO_MAX_DURATION = float(os.getenv("VIDEO_MAX_DURATION", "30"))
+VIDEO_MIN_FRAME_INTERVAL = float(os.getenv("VIDEO_MIN_FRAME_INTERVAL", "0.1"))
+VIDEO_MAX_FRAME_INTERVAL = float(os.getenv("VIDEO_MAX_FRAME_INTERVAL", "1.0"))
+VIDEO_MOTION_THRESHOLD = float(os.getenv("VIDEO_MOTION_THRESHOLD", "0.03"))
+VIDEO_FRAME_SIZE = int(os.getenv("VIDEO_FRAME_SIZE", "1280"))
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+
+# Side length of the grayscale thumbnail used to measure scene change
+_THUMBNAIL_SIZE = 32
+# Side length of the thumbnail used to estimate camera motion, and the
+# phase correlation peak below which the estimate is not trusted
+_MOTION_SIZE = 64
+_MIN_MOTION_RESPONSE = 0.05
+_MOTION_WINDOW = cv2.createHanningWindow((_MOTION_SIZE, _MOTION_SIZE), cv2.CV_32F)
+
+
+class Frame:
+    """A sampled frame and where it came from"""
+
+    def __init__(self, index: int, image: np.ndarray, timestamp: Optional[float] = None):
+        self.index = index
+        self.image = image
+        self.timestamp = timestamp
+
+    @property
+    def size(self):
+        """(width, height) in pixels"""
+        return self.image.shape[1], self.image.shape[0]
+
+
+def limit_size(img: np.ndarray, max_side: int = VIDEO_FRAME_SIZE) -> np.ndarray:
+    """Downscale an image so its longest side is at most max_side"""
+    longest = max(img.shape[:2])
+    if not max_side or longest <= max_side:
+        return img
+    ratio = max_side / longest
+    return cv2.resize(img, (round(img.shape[1] * ratio), round(img.shape[0] * ratio)),
+                      interpolation=cv2.INTER_AREA)
+
+
+def thumbnail(img: np.ndarray) -> np.ndarray:
+    """Small grayscale float thumbnail in [0, 1] for comparing frames"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (_THUMBNAIL_SIZE, _THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+    return small.astype(np.float32) / 255.0
+
+
+def motion_score(previous: np.ndarray, current: np.ndarray) -> float:
+    """Mean absolute difference between two thumbnails, 0 (same) to 1"""
+    return float(np.abs(current - previous).mean())
+
+
+def motion_thumbnail(img: np.ndarray) -> np.ndarray:
+    """Grayscale float thumbnail for estimate_shift"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv2.resize(gray, (_MOTION_SIZE, _MOTION_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+def estimate_shift(previous: np.ndarray, current: np.ndarray) -> Optional[Tuple[float, float]]:
+    """
+    Estimate how far the scene moved between two frames
+
+    Args:
+        previous: motion_thumbnail of the earlier frame
+        current: motion_thumbnail of the later frame
+
+    Returns:
+        (dx, dy) as fractions of the frame size, or None if the frames are
+        too different for a reliable estimate
+    """
+    (dx, dy), response = cv2.phaseCorrelate(previous, current, _MOTION_WINDOW)
+    if response < _MIN_MOTION_RESPONSE:
+        return None
+    return dx / _MOTION_SIZE, dy / _MOTION_SIZE
+
+
+def sample_video_frames(path: Union[str, Path], max_frames: int = VIDEO_MAX_FRAMES,
+                        min_interval: float = VIDEO_MIN_FRAME_INTERVAL,
+                        max_interval: float = VIDEO_MAX_FRAME_INTERVAL,
+                        motion_threshold: float = VIDEO_MOTION_THRESHOLD,
+                        frame_size: int = VIDEO_FRAME_SIZE,
+                        max_duration: float = VIDEO_MAX_DURATION) -> Iterator[Frame]:
+    """
+    Yield the frames of a video worth running the model on
+
+    Args:
+        path: Path to the video file
+        max_frames: Most frames to yield
+        min_interval: Seconds between frames that are checked for change
+        max_interval: Seconds after which a frame is kept regardless of change
+        motion_threshold: Thumbnail difference that counts as a new view
+        frame_size: Longest side of the yielded frames
+        max_duration: Seconds of video to read
+
+    Raises:
+        ValueError: If the video cannot be opened
+    """
+    capture = cv2.VideoCapture(str(path))
+    if not capture.isOpened():
+        raise ValueError("Could not open video")
+
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if not fps or not np.isfinite(fps) or fps <= 0:
+        fps = 30.0
+    check_every = max(1, round(fps * min_interval))
+
+    try:
+        index = -1
+        sampled = 0
+        last_thumbnail, last_time = None, None
+        while sampled < max_frames:
+            # grab() demuxes without decoding; only checked frames are decoded
+            if not capture.grab():
+                break
+            index += 1
+            timestamp = index / fps
+            if timestamp > max_duration:
+                break
+            if index % check_every:
+                continue
+
+            ok, img = capture.retrieve()
+            if not ok:
+                continue
+            current = thumbnail(img)
+            due = last_time is None or timestamp - last_time >= max_interval
+            if not due and motion_score(last_thumbnail, current) < motion_threshold:
+                continue
+
+            last_thumbnail, last_time = current, timestamp
+            sampled += 1
+            yield Frame(index, limit_size(img, frame_size), timestamp)
+    finally:
+        capture.release()
+
+
+def burst_frames(files: Iterable[BinaryIO], frame_size: int = VIDEO_FRAME_SIZE) -> Iterator[Frame]:
+    """
+    Yield the decodable photos of a burst, one in memory at a time
+
+    Args:
+        files: Open image files in the order they were taken
+        frame_size: Longest side of the yielded frames
+    """
+    for index, file in enumerate(files):
+        data = np.frombuffer(file.read(), dtype=np.uint8)
+        img = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+        if img is None:
+            logger.warning("Skipping undecodable burst frame %s", index)
+            continue
+        yield Frame(index, limit_size(img, frame_size))
+
+
+class _Failed:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+def run_frame_pipeline(frames: Iterable[Frame], detect_batch: Callable[[List[np.ndarray]], List[np.ndarray]],
+                       tracker: ByteTracker, batch_size: int = VIDEO_BATCH_SIZE) -> Dict:
+    """
+    Decode frames in a background thread while running batched inference
+
+    Args:
+        frames: Frame source, consumed in the decode thread
+        detect_batch: Runs the model on a list of BGR images and returns an
+            (N, 6) detection array per image, in that image's pixels
+        tracker: Tracker updated with every frame, in order, along with the
+            camera motion since the previous frame
+        batch_size: Most frames per detect_batch call
+
+    Returns:
+        Dictionary with the number of "frames" processed, the "keyframe"
+        (the frame with the most confident detections), its position in the
+        tracker's frame order as "keyframe_step", and "batches",
+        "decode_wait_seconds" and "inference_seconds" for tuning
+
+    Raises:
+        Whatever the frame source or detect_batch raised
+    """
+    ready = queue.Queue(maxsize=max(2 * batch_size, 2))
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def decode():
+        try:
+            for frame in frames:
+                if not put(frame):
+                    return
+        except BaseException as e:
+            put(_Failed(e))
+        finally:
+            put(_DONE)
+
+    decoder = threading.Thread(target=decode, name="frame-decoder", daemon=True)
+    decoder.start()
+
+    processed = 0
+    batches = 0
+    decode_wait = 0.0
+    inference = 0.0
+    keyframe, keyframe_score, keyframe_step = None, -1, None
+    previous_thumbnail = None
+    try:
+        finished = False
+        while not finished:
+            # Block for one frame, then take whatever else is already decoded
+            started = time.perf_counter()
+            batch = [ready.get()]
+            decode_wait += time.perf_counter() - started
+            while len(batch) < batch_size and batch[-1] is not _DONE and not isinstance(batch[-1], _Failed):
+                try:
+                    batch.append(ready.get_nowait())
+                except queue.Empty:
+                    break
+
+            if isinstance(batch[-1], _Failed):
+                raise batch[-1].error
+            if batch[-1] is _DONE:
+                finished = True
+                batch.pop()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            detections = detect_batch([frame.image for frame in batch])
+            inference += time.perf_counter() - started
+            batches += 1
+
+            for frame, frame_detections in zip(batch, detections):
+                current_thumbnail = motion_thumbnail(frame.image)
+                shift = None if previous_thumbnail is None else estimate_shift(previous_thumbnail, current_thumbnail)
+                previous_thumbnail = current_thumbnail
+                tracker.update(frame_detections, frame.size, shift)
+                score = int((np.asarray(frame_detections).reshape(-1, 6)[:, 4] >= tracker.high_conf).sum())
+                if score > keyframe_score:
+                    keyframe, keyframe_score, keyframe_step = frame, score, tracker.frame
+                processed += 1
+    finally:
+        stop.set()
+        decoder.join(timeout=5)
+
+    return {
+        "frames": processed,
+        "keyframe": keyframe,
+        "keyframe_step": keyframe_step,
+        "batches": batches,
+        "decode_wait_seconds": round(decode_wait, 4),
+        "inference_seconds": round(inference, 4),
+    }
@@ -0,0 +1,147 @@
+# backend/app/utils/logging_config.py
+"""
+Structured, non-blocking logging
+
+Log calls on the request path only copy the record onto an in-memory
+queue; a QueueListener thread formats it and writes it to stdout. Records
+carry the ID of the request that produced them (see RequestIdMiddleware)
+and DEBUG records can be sampled so verbose logging stays cheap under load.
+
+Configuration:
+    LOG_LEVEL: Minimum level (default INFO)
+    LOG_FORMAT: "json" (default) or "text"
+    LOG_DEBUG_SAMPLE_RATE: Fraction of DEBUG records kept (default 1.0)
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+
+# ID of the request being handled, set by RequestIdMiddleware
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[QueueHandler] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID; runs in the calling thread, before the record is queued"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG records"""
+
+    def __init__(self, rate: float = LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting (including tracebacks) to the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # Merge the arguments now, while they still hold the values at call time
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT,
+                  debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE) -> None:
+    """
+    Route the root logger through a queue to a background writer thread
+
+    Safe to call more than once; later calls only change the level.
+
+    Args:
+        level: Minimum log level name
+        fmt: "json" or "text"
+        debug_sample_rate: Fraction of DEBUG records kept
+    """
+    global _listener, _handler
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    _handler = _BackgroundQueueHandler(queue.SimpleQueue())
+    _handler.addFilter(SamplingFilter(debug_sample_rate))
+    _handler.addFilter(RequestIdFilter())
+    root.addHandler(_handler)
+
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _listener, _handler
+
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,66 @@
+# backend/app/utils/lru.py
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional, Tuple
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache with an optional eviction callback"""
+
+    def __init__(self, maxsize: int = 128, on_evict: Optional[Callable[[Hashable, Any], None]] = None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key and mark it as most recently used"""
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value for key without changing its recency"""
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Insert or replace a value, evicting the least recently used entries if full"""
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+
+        # Run callbacks outside the lock so they may touch the cache again
+        if self._on_evict:
+            for old_key, old_value in evicted:
+                self._on_evict(old_key, old_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove key without calling the eviction callback"""
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Snapshot of entries from least to most recently used"""
+        with self._lock:
+            return iter(list(self._data.items()))
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
@@ -0,0 +1,155 @@
+# backend/app/utils/metrics.py
+"""
+Minimal Prometheus metrics
+
+Histograms keyed by label values plus values collected at scrape time,
+rendered in the Prometheus text exposition format by /metrics. With METRICS_ENABLED=false nothing is
+recorded: stage_timer returns a shared no-op context manager and the
+request middleware and MongoDB command listener are not installed.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Latency buckets in seconds, from sub-millisecond DB commands to slow inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label combination"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds histograms and render-time collectors for values kept elsewhere"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """Register a function returning exposition lines, called on every scrape"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+def sample_lines(name: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]],
+                 metric_type: str = "gauge") -> List[str]:
+    """Exposition lines for a gauge or counter whose values are read at scrape time"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+    return lines
+
+
+# Shared registry and the application's metrics
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+stage_duration = registry.histogram(
+    "pipeline_stage_duration_seconds", "Duration of processing stages", ("stage",)
+)
+mongodb_command_duration = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("command", "outcome")
+)
+
+_NO_OP = nullcontext()
+
+
+def stage_timer(stage: str):
+    """
+    Time a processing stage (decode, preprocess, inference, ...)
+
+    Returns a shared no-op context manager when metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return _NO_OP
+    return stage_duration.time(stage)
+
+
+def _process_memory() -> List[str]:
+    try:
+        import psutil
+    except ImportError:
+        return []
+    rss = psutil.Process(os.getpid()).memory_info().rss
+    return sample_lines("process_resident_memory_bytes", "Resident memory size in bytes", [({}, rss)])
+
+
+registry.add_collector(_process_memory)
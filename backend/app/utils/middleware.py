@@ -0,0 +1,106 @@
+# backend/app/utils/middleware.py
+import time
+import uuid
+from typing import Iterable
+
+from app.services.db import connect_database
+from app.utils.logging_config import request_id_var
+from app.utils.metrics import http_request_duration
+
+# Long-lived responses whose duration is the connection time, not latency
+STREAMING_ROUTES = ("/api/events",)
+
+
+class DatabaseConnectionMiddleware:
+    """
+    ASGI middleware that creates the MongoDB client on the first request
+
+    Serverless handlers run without the startup event, so the client is
+    created lazily here and reused by every later (warm) request. Once the
+    client exists this is a single None check per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            connect_database()
+        await self.app(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records request latency per route template
+
+    Routes are labelled by their path template (/api/inventoryCV/detected/{detection_id})
+    so per-ID URLs do not create a new series each. Streaming routes stay
+    open for the whole connection, so they are left out of the latency
+    histogram.
+    """
+
+    def __init__(self, app, excluded_routes: Iterable[str] = STREAMING_ROUTES):
+        self.app = app
+        self.excluded_routes = frozenset(excluded_routes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            if route not in self.excluded_routes:
+                http_request_duration.observe(
+                    time.perf_counter() - start,
+                    scope["method"],
+                    route,
+                    str(status["code"])
+                )
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that tags each request with an ID for the logs
+
+    Reuses the caller's X-Request-ID header when present (e.g. from a load
+    balancer), otherwise generates one, and echoes it in the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,52 @@
+# backend/app/utils/responses.py
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(obj: Any) -> Any:
+    """Convert BSON types orjson does not know about"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode MongoDB documents to JSON bytes in a single native pass
+
+    datetimes are written in ISO 8601 like serialize_for_json, ObjectIds
+    as strings and NumPy arrays as lists.
+
+    Args:
+        content: Data structure to encode, may contain BSON types
+
+    Returns:
+        UTF-8 encoded JSON
+    """
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response that encodes Motor documents directly with orjson
+
+    Returning this from an endpoint skips both serialize_for_json and
+    FastAPI's jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
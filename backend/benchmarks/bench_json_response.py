@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON encoding of a large orders payload
+
+Compares the old response path (serialize_for_json, then FastAPI's
+jsonable_encoder, then JSONResponse) with MongoJSONResponse, which encodes
+the Motor documents with orjson in a single pass.
+
+Usage:
+    python benchmarks/bench_json_response.py --orders 10000
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Add backend directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from app.services.order_parser import MENU
+from app.utils.helpers import serialize_for_json
+from app.utils.responses import MongoJSONResponse
+
+
+def make_orders(count):
+    """Build order documents shaped like the ones Motor returns"""
+    random.seed(42)
+    start = datetime.now() - timedelta(days=30)
+    orders = []
+    for i in range(count):
+        items = []
+        for code in random.sample(list(MENU), k=random.randint(1, len(MENU))):
+            quantity = random.randint(1, 4)
+            items.append({
+                "code": code,
+                "name": MENU[code]["name"],
+                "quantity": quantity,
+                "unit_price": MENU[code]["price"],
+                "item_total": quantity * MENU[code]["price"]
+            })
+        orders.append({
+            "_id": ObjectId(),
+            "customer_name": f"Customer{i}",
+            "order_date": start + timedelta(seconds=i * 37),
+            "items": items,
+            "total_amount": sum(item["item_total"] for item in items),
+            "status": "new"
+        })
+    return orders
+
+
+def old_path(orders):
+    """serialize_for_json + jsonable_encoder + JSONResponse, as before"""
+    content = jsonable_encoder({"orders": serialize_for_json(orders)})
+    return JSONResponse(content).body
+
+
+def new_path(orders):
+    """Single orjson pass through MongoJSONResponse"""
+    return MongoJSONResponse({"orders": orders}).body
+
+
+def measure(func, orders, repeat):
+    """Return the best CPU time in milliseconds over several runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        func(orders)
+        timings.append((time.process_time() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON response encoding")
+    parser.add_argument("--orders", type=int, default=10000, help="Number of orders in the payload")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per path")
+    args = parser.parse_args()
+
+    orders = make_orders(args.orders)
+
+    # Both paths must produce the same document
+    assert json.loads(old_path(orders)) == json.loads(new_path(orders))
+
+    old_ms = measure(old_path, orders, args.repeat)
+    new_ms = measure(new_path, orders, args.repeat)
+
+    print(f"Payload: {args.orders} orders, {len(new_path(orders)) / 1024:.0f} KiB of JSON")
+    print(f"serialize_for_json + jsonable_encoder: {old_ms:8.1f} ms CPU")
+    print(f"MongoJSONResponse (orjson):            {new_ms:8.1f} ms CPU")
+    print(f"CPU saved per response: {old_ms - new_ms:.1f} ms ({old_ms / new_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
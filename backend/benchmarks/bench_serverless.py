@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold vs. warm invocation latency of the Mangum handler
+
+Each cold start runs in a fresh Python process that imports api/index.py
+and invokes the handler with a synthetic API Gateway event; warm numbers
+are the following invocations in the same process. Point --mongodb-url at
+a local MongoDB stand-in (e.g. `docker run -p 27017:27017 mongo`).
+
+The legacy mode runs the handler with lifespan enabled and SERVERLESS
+off, so every invocation goes through the full startup event: the schema
+version check, plus starting the background model load, change streams
+and ledger compaction. It shows what serverless mode avoids, not the
+handler setup from before serverless mode existed.
+
+The response cache is disabled in both modes so warm invocations measure
+the route itself; with --response-cache, warm /api/menu (and other cached
+routes) numbers are cache hits.
+
+Usage:
+    python benchmarks/bench_serverless.py --mongodb-url mongodb://localhost:27017
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Backend directory, added to the path in the child process
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def make_event(path):
+    """API Gateway HTTP API (v2) event for a GET request"""
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "localhost", "accept": "application/json"},
+        "requestContext": {
+            "accountId": "benchmark",
+            "apiId": "benchmark",
+            "domainName": "localhost",
+            "http": {
+                "method": "GET",
+                "path": path,
+                "protocol": "HTTP/1.1",
+                "sourceIp": "127.0.0.1",
+                "userAgent": "bench_serverless",
+            },
+            "requestId": "benchmark",
+            "routeKey": "$default",
+            "stage": "$default",
+            "time": "01/Jan/2024:00:00:00 +0000",
+            "timeEpoch": 0,
+        },
+        "isBase64Encoded": False,
+    }
+
+
+def run_child(args):
+    """Import the handler and invoke it; prints timings as JSON"""
+    sys.path.append(str(BASE_DIR))
+
+    start = time.perf_counter()
+    if args.mode == "legacy":
+        from mangum import Mangum
+        from app.main import app
+        handler = Mangum(app, lifespan="auto")
+    else:
+        from api.index import handler
+    import_ms = (time.perf_counter() - start) * 1000
+
+    event = make_event(args.path)
+    timings = []
+    for _ in range(args.invocations):
+        start = time.perf_counter()
+        response = handler(event, {})
+        timings.append((time.perf_counter() - start) * 1000)
+        if response["statusCode"] != 200:
+            print(json.dumps({"error": response.get("body")}))
+            return
+
+    print(json.dumps({"import_ms": import_ms, "invocations_ms": timings}))
+
+
+def run_cold_start(args, mode):
+    env = dict(os.environ, MONGODB_URL=args.mongodb_url, DB_NAME=args.db_name)
+    env["SERVERLESS"] = "true" if mode == "serverless" else "false"
+    env["RESPONSE_CACHE_ENABLED"] = "true" if args.response_cache else "false"
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", "--mode", mode, "--path", args.path,
+         "--invocations", str(args.invocations)],
+        env=env, cwd=str(BASE_DIR), capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    if "error" in result:
+        raise RuntimeError(f"Handler returned an error: {result['error']}")
+    return result
+
+
+def summarize(label, values):
+    print(f"  {label:<28} median {statistics.median(values):8.1f} ms   "
+          f"min {min(values):8.1f} ms   max {max(values):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serverless cold vs. warm invocations")
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017", help="Local MongoDB stand-in")
+    parser.add_argument("--db-name", default="warung_bangjul_bench", help="Database used for the benchmark")
+    parser.add_argument("--path", default="/api/menu", help="Route to invoke")
+    parser.add_argument("--cold-starts", type=int, default=5, help="Number of fresh processes per mode")
+    parser.add_argument("--invocations", type=int, default=20, help="Invocations per process")
+    parser.add_argument("--response-cache", action="store_true",
+                        help="Keep the response cache on (warm invocations of cached routes become cache hits)")
+    parser.add_argument("--mode", choices=["serverless", "legacy"], default="serverless", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    for mode in ("legacy", "serverless"):
+        imports, first, warm = [], [], []
+        for _ in range(args.cold_starts):
+            result = run_cold_start(args, mode)
+            imports.append(result["import_ms"])
+            first.append(result["invocations_ms"][0])
+            warm.extend(result["invocations_ms"][1:])
+
+        cache = "response cache on, warm invocations are cache hits" if args.response_cache else "response cache off"
+        print(f"{mode} ({args.cold_starts} cold starts, {args.invocations} invocations each, {cache})")
+        summarize("module import", imports)
+        summarize("first (cold) invocation", first)
+        if warm:
+            summarize("warm invocations", warm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Shared fixtures for the pytest-benchmark suite
+
+The DB benchmarks run against MongoDB when BENCH_MONGODB_URL points at a
+local mongod (e.g. `docker run -p 27017:27017 mongo`) and against the
+in-memory mongomock-motor stand-in otherwise, so the suite runs offline.
+"""
+import asyncio
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# Add backend directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+pytest.importorskip("pytest_benchmark")
+
+from app.services.db import DEFAULT_MENU
+
+BENCH_MONGODB_URL = os.getenv("BENCH_MONGODB_URL")
+BENCH_DB_NAME = "warung_bangjul_bench"
+
+
+def make_order_texts(count, seed=42):
+    """Order texts like the ones typed at the counter, e.g. "Customer7 2SE + 1T" """
+    rng = random.Random(seed)
+    codes = [item["code"] for item in DEFAULT_MENU]
+    texts = []
+    for i in range(count):
+        picked = rng.sample(codes, k=rng.randint(1, len(codes)))
+        texts.append(f"Customer{i} " + " + ".join(f"{rng.randint(1, 4)}{code}" for code in picked))
+    return texts
+
+
+def make_orders(count, seed=42, start=None):
+    """Parsed orders spread over the hours before `start` (default: now)"""
+    from app.services.order_parser import parse_order
+
+    start = start or datetime.now()
+    orders = []
+    for i, text in enumerate(make_order_texts(count, seed)):
+        order = parse_order(text)
+        order["order_date"] = start - timedelta(seconds=i * 7)
+        orders.append(order)
+    return orders
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def database(event_loop):
+    """db module connected to a local mongod or the in-memory stand-in"""
+    from app.services import db
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(db, "client", None)
+        if BENCH_MONGODB_URL:
+            patch.setattr(db, "MONGODB_URL", BENCH_MONGODB_URL)
+            patch.setattr(db, "DB_NAME", BENCH_DB_NAME)
+        else:
+            mongomock_motor = pytest.importorskip("mongomock_motor")
+            patch.setattr(db.motor.motor_asyncio, "AsyncIOMotorClient",
+                          lambda *args, **kwargs: mongomock_motor.AsyncMongoMockClient())
+
+        asyncio.set_event_loop(event_loop)
+        db.connect_database()
+        event_loop.run_until_complete(db.create_indexes())
+        event_loop.run_until_complete(db.create_ledger_indexes())
+        event_loop.run_until_complete(db.seed_default_menu())
+        event_loop.run_until_complete(db.initialize_inventory_from_menu())
+        yield db
+
+        if BENCH_MONGODB_URL:
+            event_loop.run_until_complete(db.client.drop_database(BENCH_DB_NAME))
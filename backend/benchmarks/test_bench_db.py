@@ -0,0 +1,64 @@
+"""
+Database functions
+
+Runs against the mongod at BENCH_MONGODB_URL, or mongomock-motor when it
+is unset. In-memory numbers only show the driver-side cost; compare
+baselines taken against the same backend.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_orders
+
+ORDER_COUNT = 2000
+
+
+@pytest.fixture(scope="module")
+def seeded(database, event_loop):
+    """Database with ORDER_COUNT orders over the last few hours"""
+    orders = make_orders(ORDER_COUNT)
+    event_loop.run_until_complete(database.orders_collection.insert_many(orders))
+    return database
+
+
+def run(event_loop, coroutine_function, *args):
+    return event_loop.run_until_complete(coroutine_function(*args))
+
+
+def test_save_order(benchmark, seeded, event_loop):
+    benchmark.group = "db writes"
+    orders = iter(make_orders(10000, seed=7))
+    benchmark(lambda: run(event_loop, seeded.save_order, next(orders)))
+
+
+def test_update_multiple_inventory_items(benchmark, seeded, event_loop):
+    benchmark.group = "db writes"
+    updates = {"rice": 1, "chicken_egg": 2, "oil": 0.5, "tofu": 3}
+    benchmark(run, event_loop, seeded.update_multiple_inventory_items, updates)
+
+
+def test_deduct_inventory_quantities(benchmark, seeded, event_loop):
+    benchmark.group = "db writes"
+    deductions = {"rice": 0.1, "chicken_egg": 1, "oil": 0.01}
+    benchmark(run, event_loop, seeded.deduct_inventory_quantities, deductions)
+
+
+def test_get_orders(benchmark, seeded, event_loop):
+    benchmark.group = "db reads"
+    end = datetime.now()
+    orders = benchmark(run, event_loop, seeded.get_orders, end - timedelta(hours=24), end)
+    assert orders
+
+
+def test_get_daily_item_counts(benchmark, seeded, event_loop):
+    benchmark.group = "db reads"
+    end = datetime.now()
+    rows = benchmark(run, event_loop, seeded.get_daily_item_counts, end - timedelta(days=7), end)
+    assert rows
+
+
+def test_get_inventory_items(benchmark, seeded, event_loop):
+    benchmark.group = "db reads"
+    items = benchmark(run, event_loop, seeded.get_inventory_items)
+    assert items
@@ -0,0 +1,73 @@
+"""Mapping YOLO detections to ingredient suggestions"""
+import numpy as np
+import pytest
+
+from app.services.db import DEFAULT_INGREDIENT_QUANTITIES
+from app.services.detection_mapping import (
+    detection_boxes,
+    filter_detections,
+    map_detections_to_ingredients,
+    split_detections,
+)
+from app.services.ingredient_index import build_class_table
+from app.services.tracking import ByteTracker
+
+# Class names like the model's, plus classes without a default
+NAMES = {index: default["ingredient_name"] for index, default in enumerate(DEFAULT_INGREDIENT_QUANTITIES)}
+NAMES.update({len(NAMES): "unknown_item", len(NAMES) + 1: "other_item"})
+TABLE = build_class_table(NAMES, DEFAULT_INGREDIENT_QUANTITIES)
+
+
+def make_detections(count, seed=42):
+    """(N, 6) box array as returned by the model"""
+    rng = np.random.default_rng(seed)
+    corners = rng.uniform(0, 1000, size=(count, 2))
+    sizes = rng.uniform(10, 200, size=(count, 2))
+    return np.column_stack([
+        corners, corners + sizes,
+        rng.uniform(0.25, 0.99, size=count),
+        rng.integers(0, len(NAMES), size=count)
+    ]).astype(np.float32)
+
+
+@pytest.mark.parametrize("count", [50, 1000])
+def test_map_detections_to_ingredients(benchmark, count):
+    benchmark.group = "map detections"
+    data = make_detections(count)
+
+    def run():
+        class_ids, confidences, xyxy = split_detections(data)
+        ingredients = map_detections_to_ingredients(class_ids, confidences, TABLE)
+        return ingredients, detection_boxes(class_ids, confidences, xyxy, NAMES)
+
+    ingredients, boxes = benchmark(run)
+    assert sum(item["count"] for item in ingredients) == count
+    assert len(boxes) == count
+
+
+def test_rethreshold_stored_detections(benchmark):
+    benchmark.group = "map detections"
+    detections = split_detections(make_detections(1000))
+    filtered = benchmark(filter_detections, detections, NAMES, TABLE, 0.5,
+                         {NAMES[0]: 0.9})
+    assert filtered["boxes"]
+
+
+def test_track_video_frames(benchmark):
+    benchmark.group = "tracking"
+    # 40 sampled frames of 30 items drifting with the camera
+    rng = np.random.default_rng(7)
+    items = make_detections(30)
+    frames = [items + np.array([8.0 * frame, 0, 8.0 * frame, 0, 0, 0], dtype=np.float32)
+              + rng.normal(0, 1, items.shape).astype(np.float32) * [1, 1, 1, 1, 0, 0]
+              for frame in range(40)]
+
+    def run():
+        tracker = ByteTracker()
+        for detections in frames:
+            tracker.update(detections, (2000, 1200))
+        return tracker
+
+    tracker = benchmark(run)
+    # Each item that is confident enough to start a track is counted once
+    assert len(tracker.confirmed()) == int((items[:, 4] >= tracker.high_conf).sum())
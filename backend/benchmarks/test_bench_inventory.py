@@ -0,0 +1,16 @@
+"""Recipe expansion behind calculate_today_ingredients"""
+import pytest
+
+from app.services.db import DEFAULT_MENU
+from app.services.inventory_calculator import expand_order_ingredients
+from conftest import make_orders
+
+
+@pytest.mark.parametrize("count", [1000, 10000])
+def test_expand_order_ingredients(benchmark, count):
+    benchmark.group = "recipe expansion"
+    orders = make_orders(count)
+    expanded = benchmark(expand_order_ingredients, DEFAULT_MENU, orders)
+    assert sum(expanded["item_counts"].values()) == sum(
+        item["quantity"] for order in orders for item in order["items"]
+    )
@@ -0,0 +1,36 @@
+"""Order parsing and response encoding"""
+import pytest
+from bson import ObjectId
+
+from app.services.order_parser import parse_order
+from app.utils.helpers import serialize_for_json
+from app.utils.responses import dumps
+from conftest import make_order_texts, make_orders
+
+
+@pytest.fixture(scope="module")
+def order_texts():
+    return make_order_texts(1000)
+
+
+@pytest.fixture(scope="module")
+def orders():
+    orders = make_orders(1000)
+    for order in orders:
+        order["_id"] = ObjectId()
+    return orders
+
+
+def test_parse_order(benchmark, order_texts):
+    benchmark.group = "parsing"
+    results = benchmark(lambda: [parse_order(text) for text in order_texts])
+    assert len(results) == len(order_texts)
+
+
+@pytest.mark.parametrize("encoder", ["serialize_for_json", "orjson"])
+def test_encode_orders(benchmark, orders, encoder):
+    benchmark.group = "encode 1k orders"
+    if encoder == "serialize_for_json":
+        benchmark(serialize_for_json, orders)
+    else:
+        benchmark(dumps, orders)
@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 """
-Initialize the database with default inventory items and quantities
+Initialize the database by applying pending schema migrations
+(indexes, default menu, inventory items and default quantities)
 """
 import os
 import sys
 import asyncio
+import argparse
 from pathlib import Path
 
 # Add parent directory to path
@@ -12,32 +14,71 @@ BASE_DIR = Path(__file__).resolve().parent
 sys.path.append(str(BASE_DIR))
 
 # Import services
-from app.services.db import setup_database, initialize_default_quantities
+from app.services.db import setup_database, import_menu_items, initialize_default_quantities
+from app.services.migrations import apply_migrations, LATEST_SCHEMA_VERSION
+from app.services.seed_loader import load_menu_file, load_ingredient_defaults_file
+from app.utils.logging_config import setup_logging
 
-async def main():
-    """Main function to initialize the database"""
+async def main(menu_path=None, defaults_path=None):
+    """Main function to initialize the database
+    
+    Args:
+        menu_path: Optional JSON/CSV file with menu items to import
+        defaults_path: Optional JSON/CSV file with ingredient default quantities to import
+    """
     print("Starting database initialization...")
     
-    # Set up database (creates collections, indexes, etc.)
+    # Connect to the database
     success = await setup_database()
     if not success:
-        print("Failed to set up database structure")
+        print("Failed to connect to the database")
         return
     
-    print("Database structure set up successfully")
+    print("Database connection established successfully")
     
-    # Initialize default quantities
-    success = await initialize_default_quantities()
-    if not success:
-        print("Failed to initialize default quantities")
+    # Apply schema migrations that have not run yet
+    try:
+        applied = await apply_migrations()
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        return
+    
+    if applied:
+        print(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+    else:
+        print(f"Schema already at version {LATEST_SCHEMA_VERSION}, nothing to apply")
+    
+    # Import menu and default quantities from files, one bulk write per collection
+    try:
+        menu_items = load_menu_file(menu_path) if menu_path else None
+        defaults = load_ingredient_defaults_file(defaults_path) if defaults_path else None
+    except Exception as e:
+        print(f"Failed to read seed file: {e}")
         return
     
-    print("Default quantities initialized successfully")
+    if menu_items is not None:
+        if not await import_menu_items(menu_items):
+            print(f"Failed to import menu from {menu_path}")
+            return
+    
+    if defaults is not None:
+        if not await initialize_default_quantities(defaults):
+            print(f"Failed to import default quantities from {defaults_path}")
+            return
+    
     print("Database initialization complete!")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Initialize the database")
+    parser.add_argument("--menu", type=str, help="JSON or CSV file with menu items to import")
+    parser.add_argument("--defaults", type=str, help="JSON or CSV file with ingredient default quantities to import")
+    args = parser.parse_args()
+    
+    # Show the services' progress messages alongside this script's output
+    setup_logging(fmt="text")
+    
     # Use the new event loop approach to fix the "attached to a different loop" issue
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    loop.run_until_complete(main())
+    loop.run_until_complete(main(args.menu, args.defaults))
     loop.close() 
\ No newline at end of file
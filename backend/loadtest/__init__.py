@@ -0,0 +1,8 @@
+"""
+Rush-hour load test for the backend API
+
+Generates synthetic menus, customers and order texts, grows the orders
+collection of a local MongoDB step by step and drives order creation,
+dashboard reads and shelf-photo uploads against a running server at
+fixed arrival rates. See `python -m loadtest --help`.
+"""
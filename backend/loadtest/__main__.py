@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Rush-hour load test
+
+Start the API against a local MongoDB first, e.g.
+
+    MONGODB_URL=mongodb://localhost:27017 DB_NAME=warung_bangjul_load \\
+        uvicorn app.main:app --port 8000
+
+then, from the backend directory:
+
+    python -m loadtest --mongodb-url mongodb://localhost:27017 --db-name warung_bangjul_load \\
+        --sizes 1000,10000,100000,1000000 --order-rate 20 --read-rate 50 \\
+        --upload-rate 0.5 --images ../shelf_photos --report load_report.json
+
+For every size the orders collection is topped up with synthetic history,
+then order creation, dashboard reads and shelf-photo uploads run at the
+given rates. Set RESPONSE_CACHE_ENABLED=false on the server to measure the
+database path rather than the response cache. With --fresh-uploads every
+photo is sent with a block of pixels changed, so uploads run the model;
+any upload still answered from the detection cache is reported under its
+own route label rather than mixed into the upload latencies.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add backend directory to path
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from pymongo import MongoClient, ReplaceOne
+
+from loadtest.runner import Scenario, run_phase
+from loadtest.synthetic import (
+    fresh_image,
+    load_images,
+    make_customers,
+    make_menu,
+    order_documents,
+    order_text_stream,
+)
+
+# Dashboard reads and their relative weights
+DASHBOARD_ROUTES = [
+    ("/api/orders", 4),
+    ("/api/inventory", 3),
+    ("/api/inventory/today", 2),
+    ("/api/menu", 1),
+]
+
+SEED_BATCH_SIZE = 10000
+
+UPLOAD_ROUTE = "POST /api/inventoryCV/upload"
+# Fresh uploads the server still answered from the detection cache
+CACHED_UPLOAD_ROUTE = f"{UPLOAD_ROUTE} (cache hit)"
+
+
+def seed_menu(database, menu):
+    """Upsert the synthetic menu items, leaving existing recipes for the default codes alone"""
+    extra = [item for item in menu if item["code"].startswith("X")]
+    if extra:
+        database.menu.bulk_write([ReplaceOne({"code": item["code"]}, item, upsert=True) for item in extra])
+    print(f"Menu has {database.menu.count_documents({})} items")
+
+
+def grow_orders(database, target, menu, customers, seed):
+    """Insert synthetic history until the orders collection holds `target` documents"""
+    current = database.orders.estimated_document_count()
+    missing = target - current
+    if missing <= 0:
+        print(f"orders already has {current} documents")
+        return current
+
+    start = time.perf_counter()
+    documents = order_documents(missing, menu, customers, seed=seed + current)
+    while True:
+        batch = list(itertools.islice(documents, SEED_BATCH_SIZE))
+        if not batch:
+            break
+        database.orders.insert_many(batch, ordered=False)
+    print(f"Seeded {missing} orders in {time.perf_counter() - start:.1f}s ({target} total)")
+    return target
+
+
+def build_scenarios(args, customers, images):
+    import httpx
+
+    texts = order_text_stream(customers, seed=args.seed)
+    rng = random.Random(args.seed)
+    routes, weights = zip(*DASHBOARD_ROUTES)
+    uploads = itertools.cycle(images) if images else None
+
+    async def create_order(client):
+        response = await client.post("/api/orders", json={"order_text": next(texts)})
+        return "POST /api/orders", response.status_code
+
+    async def dashboard_read(client):
+        route = rng.choices(routes, weights)[0]
+        response = await client.get(route)
+        return f"GET {route}", response.status_code
+
+    async def upload_photo(client):
+        image = next(uploads)
+        if args.fresh_uploads:
+            files = {"file": (image["name"], fresh_image(image["data"], rng), "image/jpeg")}
+        else:
+            files = {"file": (image["name"], image["data"], image["content_type"])}
+        response = await client.post("/api/inventoryCV/upload", files=files,
+                                     timeout=httpx.Timeout(args.upload_timeout))
+        if args.fresh_uploads and response.status_code == 200 and response.json().get("cached"):
+            return CACHED_UPLOAD_ROUTE, response.status_code
+        return UPLOAD_ROUTE, response.status_code
+
+    return [
+        Scenario("POST /api/orders", args.order_rate, create_order),
+        Scenario("GET dashboard", args.read_rate, dashboard_read),
+        Scenario(UPLOAD_ROUTE, args.upload_rate if uploads else 0, upload_photo),
+    ]
+
+
+def print_phase(size, summary):
+    print(f"\norders collection: {size} documents")
+    print(f"  {'route':<32} {'requests':>8} {'rps':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, stats in summary.items():
+        print(f"  {route:<32} {stats['requests']:>8} {stats['throughput_rps']:>7} "
+              f"{stats['error_rate']:>7.2%} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9}")
+
+
+def print_scaling(phases):
+    """p95 per route across collection sizes"""
+    routes = sorted({route for phase in phases for route in phase["routes"]})
+    print("\np95 latency (ms) by orders collection size")
+    print(f"  {'route':<32}" + "".join(f"{phase['orders']:>12}" for phase in phases))
+    for route in routes:
+        cells = "".join(
+            f"{phase['routes'][route]['p95_ms']:>12}" if route in phase["routes"] else f"{'-':>12}"
+            for phase in phases
+        )
+        print(f"  {route:<32}{cells}")
+
+
+async def run(args):
+    import httpx
+
+    database = MongoClient(args.mongodb_url)[args.db_name]
+    menu = make_menu(args.menu_items, seed=args.seed)
+    customers = make_customers(args.customers, seed=args.seed)
+    images = load_images(Path(args.images)) if args.images else []
+    seed_menu(database, menu)
+
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    phases = []
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        for size in sorted(int(size) for size in args.sizes.split(",")):
+            grow_orders(database, size, menu, customers, args.seed)
+            if args.warmup:
+                await run_phase(client, build_scenarios(args, customers, images), args.warmup, seed=args.seed)
+            scenarios = build_scenarios(args, customers, images)
+            summary = await run_phase(client, scenarios, args.duration, seed=args.seed)
+            # The phase's own orders count towards the next size
+            actual = database.orders.estimated_document_count()
+            phases.append({"orders": size, "orders_after_phase": actual, "routes": summary})
+            print_phase(size, summary)
+            if CACHED_UPLOAD_ROUTE in summary:
+                print(f"  warning: {summary[CACHED_UPLOAD_ROUTE]['requests']} fresh uploads were served "
+                      "from the detection cache")
+
+    print_scaling(phases)
+    if args.report:
+        report = {
+            "generated_at": datetime.now().isoformat(),
+            "base_url": args.base_url,
+            "duration_seconds": args.duration,
+            "rates": {"orders": args.order_rate, "reads": args.read_rate, "uploads": args.upload_rate},
+            "fresh_uploads": args.fresh_uploads,
+            "phases": phases
+        }
+        Path(args.report).write_text(json.dumps(report, indent=2))
+        print(f"\nReport written to {args.report}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rush-hour load test against a running backend")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API under test")
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017", help="MongoDB the API uses")
+    parser.add_argument("--db-name", default="warung_bangjul_load", help="Database the API uses")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000",
+                        help="Comma-separated orders collection sizes to test at")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load per size")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of unrecorded load before each phase")
+    parser.add_argument("--order-rate", type=float, default=10, help="New orders per second")
+    parser.add_argument("--read-rate", type=float, default=30, help="Dashboard reads per second")
+    parser.add_argument("--upload-rate", type=float, default=0.2, help="Shelf-photo uploads per second")
+    parser.add_argument("--images", help="Folder of shelf photos to upload (uploads are skipped without it)")
+    parser.add_argument("--fresh-uploads", action="store_true",
+                        help="Change a block of pixels in every upload so the detection cache is bypassed")
+    parser.add_argument("--menu-items", type=int, default=20, help="Synthetic dishes added to the menu")
+    parser.add_argument("--customers", type=int, default=500, help="Distinct customer names")
+    parser.add_argument("--max-connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--timeout", type=float, default=10, help="Request timeout in seconds")
+    parser.add_argument("--upload-timeout", type=float, default=60, help="Upload request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--report", help="Write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
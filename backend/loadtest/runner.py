@@ -0,0 +1,135 @@
+"""
+Open-loop request scheduling and latency recording
+
+Requests are sent on a Poisson schedule at a fixed rate per scenario,
+whether or not earlier requests have finished. Latency is measured from
+the scheduled send time, so time spent queued behind a slow server (or a
+full connection pool) shows up in the percentiles instead of silently
+lowering the request rate.
+"""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# A scenario's request function returns (route label, response status or None on a transport error)
+RequestFunction = Callable[[Any], Awaitable[Tuple[str, Optional[int]]]]
+
+
+class LatencyRecorder:
+    """Latencies and outcomes per route"""
+
+    def __init__(self):
+        self._latencies: Dict[str, List[float]] = defaultdict(list)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, route: str, seconds: float, status: Optional[int]) -> None:
+        """
+        Record one request
+
+        Args:
+            route: Route label, e.g. "GET /api/menu"
+            seconds: Latency from the scheduled send time
+            status: HTTP status, or None if the request failed before a response
+        """
+        self._latencies[route].append(seconds)
+        self._statuses[route][str(status) if status is not None else "transport_error"] += 1
+        if status is None or status >= 400:
+            self._errors[route] += 1
+
+    def summary(self, duration: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Percentiles, error rate and throughput per route
+
+        Args:
+            duration: Length of the phase in seconds, for the throughput
+
+        Returns:
+            {route: {"requests", "errors", "error_rate", "throughput_rps",
+            "p50_ms", "p95_ms", "p99_ms", "max_ms", "statuses"}}
+        """
+        report = {}
+        for route, latencies in sorted(self._latencies.items()):
+            values = np.array(latencies) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            report[route] = {
+                "requests": len(values),
+                "errors": self._errors[route],
+                "error_rate": round(self._errors[route] / len(values), 4),
+                "throughput_rps": round(len(values) / duration, 2) if duration else None,
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "max_ms": round(float(values.max()), 2),
+                "statuses": dict(self._statuses[route])
+            }
+        return report
+
+
+class Scenario:
+    """Requests of one kind sent at a fixed average rate"""
+
+    def __init__(self, name: str, rate: float, request: RequestFunction):
+        self.name = name
+        self.rate = rate
+        self.request = request
+
+
+async def _timed(client, scenario: Scenario, scheduled: float, recorder: LatencyRecorder) -> None:
+    try:
+        route, status = await scenario.request(client)
+    except Exception:
+        route, status = scenario.name, None
+    recorder.record(route, time.perf_counter() - scheduled, status)
+
+
+async def _drive(client, scenario: Scenario, duration: float, recorder: LatencyRecorder,
+                 rng: random.Random, tasks: set) -> None:
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += rng.expovariate(scenario.rate)
+        if scheduled - start >= duration:
+            return
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(_timed(client, scenario, scheduled, recorder))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+async def run_phase(client, scenarios: List[Scenario], duration: float, seed: int = 42,
+                    drain_timeout: float = 60.0) -> Dict[str, Dict[str, Any]]:
+    """
+    Run all scenarios concurrently for `duration` seconds
+
+    Args:
+        client: HTTP client passed to the request functions
+        scenarios: Scenarios to run; those with a rate of 0 are skipped
+        duration: Seconds to keep sending requests
+        seed: Random seed for the arrival schedule
+        drain_timeout: Seconds to wait for outstanding requests afterwards
+
+    Returns:
+        Per-route summary from LatencyRecorder.summary
+    """
+    recorder = LatencyRecorder()
+    tasks: set = set()
+    active = [scenario for scenario in scenarios if scenario.rate > 0]
+    await asyncio.gather(*(
+        _drive(client, scenario, duration, recorder, random.Random(seed + index), tasks)
+        for index, scenario in enumerate(active)
+    ))
+
+    if tasks:
+        done, pending = await asyncio.wait(set(tasks), timeout=drain_timeout)
+        for task in pending:
+            task.cancel()
+            # Count requests still outstanding after the drain as failures
+            recorder.record("unfinished", drain_timeout, None)
+    return recorder.summary(duration)
@@ -0,0 +1,181 @@
+"""
+Synthetic data for the load test
+
+Order texts only use the menu codes the order parser knows, since those
+are the only ones POST /api/orders accepts. Synthetic menu items are
+stored in the menu collection and referenced by the seeded order history,
+so the dashboard reads expand larger recipes than the two-item default.
+"""
+import random
+import string
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.db import DEFAULT_MENU
+from app.services.order_parser import MENU
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+FIRST_NAMES = [
+    "Budi", "Siti", "Agus", "Dewi", "Andi", "Rina", "Joko", "Putri", "Hendra", "Wati",
+    "Rudi", "Lestari", "Eko", "Maya", "Fajar", "Indah", "Bayu", "Sari", "Dimas", "Ayu",
+    "John", "Maria", "Kevin", "Linda", "Michael", "Grace", "Daniel", "Jessica", "Ryan", "Cindy"
+]
+
+INGREDIENTS = [
+    ("rice", "grams", 150), ("chicken_breast", "grams", 120), ("chicken_egg", "piece", 1),
+    ("tofu", "grams", 80), ("tempeh", "grams", 80), ("garlic", "grams", 3),
+    ("shallot", "grams", 5), ("chili_small", "pieces", 2), ("sweet_soy_sauce", "grams", 10),
+    ("oil", "liter", 0.02), ("salt", "grams", 1), ("sugar", "grams", 2),
+    ("cabbage", "grams", 40), ("noodles", "grams", 100), ("beef", "grams", 100),
+    ("coconut_milk", "mL", 60), ("lime_leaves", "pieces", 1), ("shrimp_paste", "grams", 2)
+]
+
+
+def make_menu(extra_items: int = 0, seed: int = 42) -> List[Dict]:
+    """
+    Default menu plus randomly composed dishes
+
+    Args:
+        extra_items: Number of synthetic dishes to add
+        seed: Random seed
+
+    Returns:
+        Menu items in the shape of DEFAULT_MENU
+    """
+    rng = random.Random(seed)
+    menu = [dict(item) for item in DEFAULT_MENU]
+    used_codes = {item["code"] for item in menu}
+    for i in range(extra_items):
+        code = "X" + "".join(rng.choices(string.ascii_uppercase, k=3))
+        while code in used_codes:
+            code = "X" + "".join(rng.choices(string.ascii_uppercase, k=3))
+        used_codes.add(code)
+        ingredients = rng.sample(INGREDIENTS, k=rng.randint(3, 8))
+        menu.append({
+            "code": code,
+            "name": f"Synthetic Dish {i + 1}",
+            "price": rng.randrange(15, 150, 5),
+            "ingredients": [
+                {"name": name, "quantity": round(base * rng.uniform(0.5, 2.0), 2), "unit": unit}
+                for name, unit, base in ingredients
+            ]
+        })
+    return menu
+
+
+def make_customers(count: int, seed: int = 42) -> List[str]:
+    """Customer names as typed at the counter (single word, no spaces)"""
+    rng = random.Random(seed)
+    return [f"{rng.choice(FIRST_NAMES)}{i}" for i in range(count)]
+
+
+def pick_customer(rng: random.Random, customers: List[str]) -> str:
+    """Pick a customer, favouring regulars (Pareto-distributed rank)"""
+    rank = int(rng.paretovariate(1.2)) - 1
+    return customers[min(rank, len(customers) - 1)]
+
+
+def order_text_stream(customers: List[str], seed: int = 42) -> Iterator[str]:
+    """Endless stream of order texts accepted by POST /api/orders, e.g. "Budi3 2SE + 1T" """
+    rng = random.Random(seed)
+    codes = list(MENU)
+    while True:
+        picked = rng.sample(codes, k=rng.randint(1, len(codes)))
+        items = " + ".join(f"{rng.choice((1, 1, 1, 2, 2, 3))}{code}" for code in picked)
+        yield f"{pick_customer(rng, customers)} {items}"
+
+
+def order_documents(count: int, menu: List[Dict], customers: List[str], end: Optional[datetime] = None,
+                    days: int = 90, seed: int = 42) -> Iterator[Dict]:
+    """
+    Historical orders in the shape save_order stores, for seeding the collection directly
+
+    Args:
+        count: Number of orders
+        menu: Menu items the orders are drawn from
+        customers: Customer names
+        end: Newest order date (default: now)
+        days: Orders are spread over this many days before end
+        seed: Random seed
+
+    Yields:
+        Order documents with dates skewed towards lunch and dinner
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now()
+    start_day = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        hour = rng.choice((11, 12, 12, 13, 17, 18, 18, 19, 20)) + rng.random()
+        order_date = start_day + timedelta(days=rng.randrange(days + 1), hours=hour)
+        if order_date > end:
+            order_date = end - timedelta(seconds=rng.randrange(3600))
+
+        items = []
+        for item in rng.sample(menu, k=min(len(menu), rng.randint(1, 3))):
+            quantity = rng.choice((1, 1, 1, 2, 2, 3))
+            items.append({
+                "code": item["code"],
+                "name": item["name"],
+                "quantity": quantity,
+                "unit_price": item.get("price", 0),
+                "item_total": quantity * item.get("price", 0)
+            })
+        yield {
+            "customer_name": pick_customer(rng, customers),
+            "order_date": order_date,
+            "items": items,
+            "total_amount": sum(item["item_total"] for item in items),
+            "status": "completed" if order_date.date() < end.date() else "new"
+        }
+
+
+def load_images(folder: Path) -> List[Dict]:
+    """Read the shelf photos to upload, as {"name", "data", "content_type"}"""
+    images = []
+    for path in sorted(Path(folder).iterdir()):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        content_type = "image/jpeg" if path.suffix.lower() in (".jpg", ".jpeg") else f"image/{path.suffix[1:].lower()}"
+        images.append({"name": path.name, "data": path.read_bytes(), "content_type": content_type})
+    if not images:
+        raise ValueError(f"No images found in {folder}")
+    return images
+
+
+def fresh_image(data: bytes, rng: random.Random) -> bytes:
+    """
+    Re-encode a photo with one block of pixels changed, as a new JPEG
+
+    Appending bytes would only change the content hash; with
+    DETECTION_CACHE_PHASH on, the server would still match the unchanged
+    pixels. The block covers 1/12 of each side and is painted black or
+    white, whichever differs most from it, so it also fails the server's
+    per-block thumbnail check.
+
+    Args:
+        data: Encoded image
+        rng: Random source for the block position
+
+    Returns:
+        JPEG bytes of the changed image
+
+    Raises:
+        ValueError: If the image cannot be decoded or re-encoded
+    """
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Could not decode image")
+    height, width = img.shape[:2]
+    block_h, block_w = max(1, height // 12), max(1, width // 12)
+    y, x = rng.randrange(height - block_h + 1), rng.randrange(width - block_w + 1)
+    block = img[y:y + block_h, x:x + block_w]
+    block[:] = 0 if block.mean() > 127 else 255
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return encoded.tobytes()
@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture
+def mock_database(monkeypatch):
+    """Point the db module at an in-memory MongoDB stand-in"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app.services import db
+
+    monkeypatch.setattr(db, "client", None)
+    monkeypatch.setattr(db.motor.motor_asyncio, "AsyncIOMotorClient",
+                        lambda *args, **kwargs: mongomock_motor.AsyncMongoMockClient())
+    yield db.connect_database()
+    monkeypatch.setattr(db, "client", None)
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import motor.motor_asyncio
+from pymongo import monitoring
+
+from app.services import db, db_monitoring
+from app.services.db_monitoring import CommandTimingListener, PoolStatsListener
+
+ADDRESS = ("db.local", 27017)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def perf_counter(self):
+        return self.now
+
+
+def check_out(listener, clock, wait_seconds, connection_id):
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+    clock.now += wait_seconds
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, connection_id))
+
+
+def test_client_options_follow_the_pool_configuration(monkeypatch):
+    monkeypatch.setattr(db, "MONGODB_MAX_POOL_SIZE", 20)
+    monkeypatch.setattr(db, "MONGODB_MIN_POOL_SIZE", 2)
+    monkeypatch.setattr(db, "MONGODB_SERVER_SELECTION_TIMEOUT_MS", 500)
+    monkeypatch.setattr(db, "MONGODB_CONNECT_TIMEOUT_MS", 1000)
+    monkeypatch.setattr(db, "MONGODB_MAX_IDLE_TIME_MS", None)
+    monkeypatch.setattr(db, "MONGODB_WAIT_QUEUE_TIMEOUT_MS", None)
+    monkeypatch.setattr(db, "MONGODB_SOCKET_TIMEOUT_MS", None)
+    monkeypatch.setattr(db, "MONGODB_COMPRESSORS", "")
+    monkeypatch.setattr(db, "METRICS_ENABLED", False)
+
+    options = db.get_client_options()
+    assert options == {
+        "maxPoolSize": 20,
+        "minPoolSize": 2,
+        "serverSelectionTimeoutMS": 500,
+        "connectTimeoutMS": 1000,
+        "event_listeners": [db.pool_listener],
+    }
+
+    monkeypatch.setattr(db, "MONGODB_MAX_IDLE_TIME_MS", 60000)
+    monkeypatch.setattr(db, "MONGODB_WAIT_QUEUE_TIMEOUT_MS", 2000)
+    monkeypatch.setattr(db, "MONGODB_SOCKET_TIMEOUT_MS", 15000)
+    monkeypatch.setattr(db, "MONGODB_COMPRESSORS", "zstd,zlib")
+    monkeypatch.setattr(db, "METRICS_ENABLED", True)
+
+    options = db.get_client_options()
+    assert options["maxIdleTimeMS"] == 60000
+    assert options["waitQueueTimeoutMS"] == 2000
+    assert options["socketTimeoutMS"] == 15000
+    assert options["compressors"] == "zstd,zlib"
+    assert options["event_listeners"][0] is db.pool_listener
+    assert isinstance(options["event_listeners"][1], CommandTimingListener)
+
+
+def test_pool_listener_tracks_connections_and_checkout_waits(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(db_monitoring, "time", clock)
+    listener = PoolStatsListener(window=3)
+
+    listener.pool_created(monitoring.PoolCreatedEvent(ADDRESS, {}))
+    for connection_id in (1, 2):
+        listener.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, connection_id))
+    for connection_id, wait_seconds in enumerate((0.001, 0.002, 0.004, 0.008), start=1):
+        check_out(listener, clock, wait_seconds, connection_id)
+    listener.connection_checked_in(monitoring.ConnectionCheckedInEvent(ADDRESS, 1))
+    listener.connection_check_out_started(monitoring.ConnectionCheckOutStartedEvent(ADDRESS))
+    listener.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(ADDRESS, "timeout"))
+    listener.connection_closed(monitoring.ConnectionClosedEvent(ADDRESS, 2, "idle"))
+    listener.pool_cleared(monitoring.PoolClearedEvent(ADDRESS))
+
+    stats = listener.snapshot()["db.local:27017"]
+    assert stats["open_connections"] == 1
+    assert stats["in_use_connections"] == 3
+    assert stats["checkouts"] == 4
+    assert stats["failed_checkouts"] == 1
+    assert stats["pool_cleared"] == 1
+    # Only the last three waits are kept
+    assert stats["checkout_wait_ms"] == {"samples": 3, "avg": 4.667, "p50": 4.0, "p95": 8.0, "max": 8.0}
+
+    listener.pool_closed(monitoring.PoolClosedEvent(ADDRESS))
+    assert listener.snapshot() == {}
+
+
+def test_checkout_wait_is_timed_on_the_checkout_thread(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(db_monitoring, "time", clock)
+    listener = PoolStatsListener()
+
+    # A checkout started on another thread does not time this thread's checkout
+    started = threading.Thread(target=listener.connection_check_out_started,
+                               args=(monitoring.ConnectionCheckOutStartedEvent(ADDRESS),))
+    started.start()
+    started.join()
+    clock.now += 1
+    listener.connection_checked_out(monitoring.ConnectionCheckedOutEvent(ADDRESS, 1))
+
+    stats = listener.snapshot()["db.local:27017"]
+    assert stats["checkouts"] == 1 and stats["checkout_wait_ms"]["samples"] == 0
+
+
+def test_database_health_reports_ping_and_pool(monkeypatch):
+    monkeypatch.setattr(db, "client", None)
+    assert asyncio.run(db.get_database_health())["status"] == "unavailable"
+
+    monkeypatch.setattr(db, "MONGODB_COMPRESSORS", "zstd")
+    real = motor.motor_asyncio.AsyncIOMotorClient("mongodb://db.local:27017", maxPoolSize=20,
+                                                  waitQueueTimeoutMS=2000, serverSelectionTimeoutMS=500)
+    pings = []
+
+    async def command(name):
+        pings.append(name)
+        return {"ok": 1}
+
+    monkeypatch.setattr(db, "client", SimpleNamespace(admin=SimpleNamespace(command=command),
+                                                      options=real.options))
+    pool_listener = PoolStatsListener()
+    pool_listener.connection_created(monitoring.ConnectionCreatedEvent(ADDRESS, 1))
+    monkeypatch.setattr(db, "pool_listener", pool_listener)
+
+    health = asyncio.run(db.get_database_health())
+    assert pings == ["ping"]
+    assert health["status"] == "ok" and health["ping_ms"] >= 0 and "message" not in health
+    assert health["pool_options"] == {
+        "max_pool_size": 20,
+        "min_pool_size": 0,
+        "max_idle_time_seconds": None,
+        "wait_queue_timeout": 2.0,
+        "compressors": ["zstd"],
+        "server_selection_timeout": 0.5,
+    }
+    assert health["servers"]["db.local:27017"]["open_connections"] == 1
+
+    async def unreachable(name):
+        raise ConnectionError("no servers found")
+
+    monkeypatch.setattr(db, "client", SimpleNamespace(admin=SimpleNamespace(command=unreachable),
+                                                      options=real.options))
+    health = asyncio.run(db.get_database_health())
+    assert health["status"] == "error" and health["ping_ms"] is None
+    assert health["message"] == "no servers found"
+    real.close()
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.services import detection_cache
+from app.services.detection_cache import DetectionCache, fingerprint_image
+
+
+@pytest.fixture
+def perceptual_hash(monkeypatch):
+    monkeypatch.setattr(detection_cache, "PERCEPTUAL_HASH_ENABLED", True)
+
+
+def shelf(item_added=False):
+    """Shelf with smooth shading and a row of items; optionally one more item"""
+    x = np.linspace(0, 1, 640)[None, :]
+    y = np.linspace(0, 1, 480)[:, None]
+    img = (60 + 120 * x * y).astype(np.uint8)
+    img = np.repeat(img[:, :, None], 3, axis=2)
+    for left in range(40, 600, 140):
+        img[100:200, left:left + 80] = 220
+    if item_added:
+        img[300:360, 420:480] = 230
+    return img
+
+
+def encode(img, quality=90):
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def hamming(a, b):
+    return bin(a["perceptual_hash"] ^ b["perceptual_hash"]).count("1")
+
+
+def test_perceptual_hash_is_off_by_default():
+    fingerprint = fingerprint_image(encode(shelf()))
+    assert fingerprint["perceptual_hash"] is None and fingerprint["thumbnail"] is None
+
+    cache = DetectionCache()
+    cache.store(fingerprint, "first")
+    assert cache.lookup(fingerprint_image(encode(shelf(), quality=70))) is None
+    assert cache.lookup(fingerprint_image(encode(shelf()))) == "first"
+
+
+def test_reencoded_copy_is_a_near_duplicate(perceptual_hash):
+    cache = DetectionCache()
+    cache.store(fingerprint_image(encode(shelf())), "first")
+
+    assert cache.lookup(fingerprint_image(encode(shelf(), quality=60))) == "first"
+    assert cache.lookup(fingerprint_image(encode(shelf(), quality=60), variant="tiled:640:0.2")) is None
+
+
+def test_changed_scene_with_close_hash_is_not_reused(perceptual_hash):
+    before = fingerprint_image(encode(shelf()))
+    after = fingerprint_image(encode(shelf(item_added=True)))
+    # The hash alone would have called this the same photo
+    assert hamming(before, after) <= detection_cache.PERCEPTUAL_HASH_MAX_DISTANCE
+
+    cache = DetectionCache()
+    cache.store(before, "first")
+    assert cache.lookup(after) is None
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from app.services.detection_mapping import (
+    aggregate_by_class,
+    confidence_mask,
+    detection_boxes,
+    filter_detections,
+    map_detections_to_ingredients,
+    split_detections,
+)
+from app.services.ingredient_index import build_class_table
+
+NAMES = {0: "Egg", 1: "Salt", 2: "Mystery"}
+DEFAULTS = [
+    {"ingredient_name": "Egg", "default_quantity": 10.0, "unit": "pieces"},
+    {"ingredient_name": "Salt", "default_quantity": 1000.0, "unit": "grams"},
+]
+TABLE = build_class_table(NAMES, DEFAULTS)
+
+# [x1, y1, x2, y2, confidence, class_id]
+DETECTIONS = np.array([
+    [10, 10, 50, 50, 0.80, 1],
+    [60, 10, 90, 40, 0.75, 0],
+    [15, 60, 55, 99, 0.95, 1],
+    [70, 70, 80, 80, 0.40, 2],
+    [90, 90, 99, 99, 0.85, 0],
+], dtype=np.float32)
+
+
+def test_aggregate_by_class_counts_and_keeps_best_confidence():
+    class_ids, confidences, _ = split_detections(DETECTIONS)
+    counts, best = aggregate_by_class(class_ids, confidences, num_classes=4)
+
+    assert counts.tolist() == [2, 2, 1, 0]
+    np.testing.assert_allclose(best, [0.85, 0.95, 0.40, 0.0], rtol=1e-6)
+
+
+def test_map_detections_to_ingredients_uses_defaults_in_detection_order():
+    class_ids, confidences, _ = split_detections(DETECTIONS)
+    ingredients = map_detections_to_ingredients(class_ids, confidences, TABLE)
+
+    assert [item["ingredient_name"] for item in ingredients] == ["Salt", "Egg", "Mystery"]
+    salt, egg, mystery = ingredients
+    assert (salt["count"], salt["suggested_quantity"], salt["unit"]) == (2, 2000.0, "grams")
+    assert egg["suggested_quantity"] == 20.0
+    assert round(egg["confidence"], 2) == 0.85
+    # No default: the count is the quantity
+    assert (mystery["suggested_quantity"], mystery["unit"]) == (1, "unit")
+
+
+def test_map_detections_handles_no_detections():
+    class_ids, confidences, _ = split_detections(np.empty((0, 6)))
+    assert map_detections_to_ingredients(class_ids, confidences, TABLE) == []
+
+
+def test_detection_boxes_are_plain_json_values():
+    class_ids, confidences, xyxy = split_detections(DETECTIONS[:1])
+    assert detection_boxes(class_ids, confidences, xyxy, NAMES) == [
+        {"class_id": 1, "class_name": "Salt", "confidence": 0.8, "box": [10.0, 10.0, 50.0, 50.0]}
+    ]
+
+
+def test_confidence_mask_applies_per_class_thresholds():
+    class_ids, confidences, _ = split_detections(DETECTIONS)
+
+    assert confidence_mask(class_ids, confidences, NAMES, 0.8).tolist() == [True, False, True, False, True]
+    mask = confidence_mask(class_ids, confidences, NAMES, 0.8, {"Egg": 0.7, "Mystery": 0.3})
+    assert mask.tolist() == [True, True, True, True, True]
+
+    with pytest.raises(ValueError):
+        confidence_mask(class_ids, confidences, NAMES, 0.5, {"Pepper": 0.5})
+
+
+def test_filter_detections_reaggregates_stored_boxes():
+    detections = split_detections(DETECTIONS)
+
+    strict = filter_detections(detections, NAMES, TABLE, 0.9)
+    assert [(item["ingredient_name"], item["count"]) for item in strict["ingredients"]] == [("Salt", 1)]
+    assert len(strict["boxes"]) == 1
+
+    relaxed = filter_detections(detections, NAMES, TABLE, 0.3, {"Salt": 0.9})
+    assert [(item["ingredient_name"], item["count"]) for item in relaxed["ingredients"]] == [
+        ("Egg", 2), ("Salt", 1), ("Mystery", 1)
+    ]
@@ -0,0 +1,99 @@
+import asyncio
+
+from pymongo.errors import OperationFailure
+
+from app.services.events import EventBroker, watch_collection, broker as shared_broker
+
+
+def test_broker_filters_topics_and_replays_history():
+    async def run():
+        broker = EventBroker(history_size=10)
+        first = broker.publish("orders", {"order_id": "1"})
+        broker.publish("inventory", {"ingredient_name": "salt"})
+
+        subscription = broker.subscribe(["orders", "inventory"], last_event_id=first["id"])
+        assert subscription.queue.get_nowait()["data"] == {"ingredient_name": "salt"}
+
+        orders_only = broker.subscribe(["orders"])
+        broker.publish("detections", {"detection_id": "x"})
+        broker.publish("orders", {"order_id": "2"})
+        assert orders_only.queue.qsize() == 1
+
+        broker.unsubscribe(orders_only)
+        assert broker.subscriber_count == 1
+
+    asyncio.run(run())
+
+
+def test_event_ids_from_another_epoch_replay_nothing():
+    async def run():
+        broker = EventBroker(history_size=10, epoch="a1")
+        first = broker.publish("orders", {"order_id": "1"})
+        broker.publish("orders", {"order_id": "2"})
+        assert first["id"] == "a1-1"
+
+        # Same sequence number, but from an instance that has since restarted
+        restarted = EventBroker(history_size=10, epoch="b2")
+        restarted.publish("orders", {"order_id": "3"})
+        restarted.publish("orders", {"order_id": "4"})
+        assert restarted.subscribe(["orders"], last_event_id=first["id"]).queue.empty()
+        assert restarted.subscribe(["orders"], last_event_id="1").queue.empty()
+        assert broker.subscribe(["orders"], last_event_id="a1-x").queue.empty()
+
+        replay = broker.subscribe(["orders"], last_event_id=first["id"])
+        assert replay.queue.get_nowait()["data"] == {"order_id": "2"} and replay.queue.empty()
+
+    asyncio.run(run())
+
+
+def test_emit_is_skipped_while_a_change_stream_feeds_the_topic():
+    async def run():
+        broker = EventBroker()
+        subscription = broker.subscribe(["orders"])
+        broker.set_streaming("orders", True)
+        assert broker.emit("orders", {}) is None
+        broker.set_streaming("orders", False)
+        assert broker.emit("orders", {}) is not None
+        assert subscription.queue.qsize() == 1
+
+    asyncio.run(run())
+
+
+def test_slow_subscribers_drop_the_oldest_events():
+    async def run():
+        broker = EventBroker()
+        subscription = broker.subscribe(["orders"])
+        subscription.queue = asyncio.Queue(maxsize=2)
+        for order_id in range(3):
+            broker.publish("orders", {"order_id": order_id})
+        assert subscription.dropped == 1
+        assert subscription.queue.get_nowait()["data"] == {"order_id": 1}
+
+    asyncio.run(run())
+
+
+class StandaloneCollection:
+    """Collection on a deployment without change streams"""
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("$changeStream is only supported on replica sets", code=40573)
+
+
+def test_save_order_falls_back_to_in_process_events(mock_database):
+    from app.services import db
+    from app.services.order_parser import parse_order
+
+    async def run():
+        await asyncio.wait_for(watch_collection("orders", StandaloneCollection(), dict), 1)
+        assert not shared_broker.is_streaming("orders")
+
+        subscription = shared_broker.subscribe(["orders"])
+        try:
+            order_id = await db.save_order(parse_order("John 2T"))
+            event = subscription.queue.get_nowait()
+            assert event["data"]["order_id"] == order_id
+            assert event["data"]["items"] == [{"code": "T", "quantity": 2}]
+        finally:
+            shared_broker.unsubscribe(subscription)
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+from app.services import image_variants
+from app.services.image_variants import discard_variants, get_variant, render_variant, variant_etag
+
+BOXES = [{"class_id": 1, "class_name": "Egg", "confidence": 0.91, "box": [100.0, 100.0, 400.0, 300.0]}]
+
+
+def write_image(tmp_path, width=1600, height=1200):
+    path = tmp_path / "shelf.jpg"
+    cv2.imwrite(str(path), np.full((height, width, 3), 200, dtype=np.uint8))
+    return path
+
+
+def test_thumbnail_is_resized_and_annotated(tmp_path):
+    path = write_image(tmp_path)
+
+    plain = cv2.imdecode(np.frombuffer(render_variant(path, None, None, "thumb"), np.uint8), cv2.IMREAD_COLOR)
+    annotated = cv2.imdecode(np.frombuffer(render_variant(path, BOXES, 1600, "thumb"), np.uint8), cv2.IMREAD_COLOR)
+
+    assert plain.shape == (240, 320, 3)
+    assert annotated.shape == plain.shape
+    # The box edge is drawn at the scaled position (100px -> 20px)
+    assert np.abs(annotated[40, 20].astype(int) - plain[40, 20].astype(int)).sum() > 50
+
+
+def test_webp_variant(tmp_path):
+    body = render_variant(write_image(tmp_path), None, None, "medium", "webp")
+    assert body[:4] == b"RIFF" and body[8:12] == b"WEBP"
+
+
+def test_variants_are_cached_until_discarded(tmp_path, monkeypatch):
+    path = write_image(tmp_path)
+    etag = variant_etag("image-1", "full", "jpeg")
+    assert etag == variant_etag("image-1", "full", "jpeg") != variant_etag("image-1", "thumb", "jpeg")
+
+    first = get_variant("image-1", etag, path, BOXES, 1600, "full", "jpeg")
+    assert first[1] == "image/jpeg"
+
+    def fail(*args):
+        raise AssertionError("rendered twice")
+
+    monkeypatch.setattr(image_variants, "render_variant", fail)
+    assert get_variant("image-1", etag, path, BOXES, 1600, "full", "jpeg") == first
+
+    discard_variants("image-1")
+    monkeypatch.setattr(image_variants, "render_variant", lambda *args: b"new")
+    assert get_variant("image-1", etag, path, BOXES, 1600, "full", "jpeg") == (b"new", "image/jpeg")
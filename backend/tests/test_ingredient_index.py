@@ -0,0 +1,75 @@
+import asyncio
+
+import numpy as np
+
+from app.services.detection_mapping import map_detections_to_ingredients
+from app.services.ingredient_index import IngredientIndex, build_class_table, normalize_name
+
+DEFAULTS = [
+    {"ingredient_name": "Egg", "default_quantity": 10.0, "unit": "pieces"},
+    {"ingredient_name": "AP Flour", "default_quantity": 1000.0, "unit": "grams", "aliases": ["flour"]},
+    {"ingredient_name": "flour_batter", "default_quantity": 1000.0, "unit": "grams"},
+]
+NAMES = {0: "egg", 1: "chicken_egg", 2: "ap_flour", 3: "Flour", 4: "Flour-Batter", 5: "mystery"}
+
+
+def test_normalize_name():
+    assert normalize_name("AP_Flour") == normalize_name(" ap  flour ") == normalize_name("Ap-Flour") == "ap flour"
+
+
+def test_class_table_matches_case_insensitively_and_through_aliases():
+    table = build_class_table(NAMES, DEFAULTS, {"chicken_egg": "Egg"})
+    names = [table.ingredient_names[index] for index in table.ingredient_ids]
+    assert names == ["Egg", "Egg", "AP Flour", "AP Flour", "flour_batter", "mystery"]
+    assert np.isnan(table.quantities[table.ingredient_ids[5]])
+
+
+def test_aliased_classes_are_counted_together():
+    table = build_class_table(NAMES, DEFAULTS, {"chicken_egg": "Egg"})
+    class_ids = np.array([5, 1, 0, 0, 3])
+    confidences = np.array([0.5, 0.9, 0.8, 0.7, 0.6], dtype=np.float32)
+
+    ingredients = map_detections_to_ingredients(class_ids, confidences, table)
+
+    assert [(item["ingredient_name"], item["count"], item["suggested_quantity"], item["unit"])
+            for item in ingredients] == [
+        ("mystery", 1, 1, "unit"), ("Egg", 3, 30.0, "pieces"), ("AP Flour", 1, 1000.0, "grams")
+    ]
+    assert round(ingredients[1]["confidence"], 2) == 0.9
+
+
+def test_index_reads_defaults_once_until_invalidated():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return [dict(default) for default in DEFAULTS]
+
+    index = IngredientIndex(load, aliases={})
+
+    async def run():
+        tables = await asyncio.gather(*[index.class_table(NAMES) for _ in range(5)])
+        again = await index.class_table(NAMES)
+        index.invalidate()
+        rebuilt = await index.class_table(NAMES)
+        return tables, again, rebuilt
+
+    tables, again, rebuilt = asyncio.run(run())
+
+    assert len(calls) == 2 and index.loads == 2
+    assert all(table is tables[0] for table in tables) and again is tables[0]
+    assert rebuilt is not tables[0]
+
+
+def test_index_rereads_defaults_after_ttl():
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return DEFAULTS
+
+    index = IngredientIndex(load, aliases={}, ttl=0)
+    asyncio.run(index.defaults())
+    asyncio.run(index.defaults())
+    assert len(calls) == 2
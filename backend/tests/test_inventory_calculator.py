@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from app.services import db
+from app.services.inventory_calculator import (
+    get_ingredient_inventory,
+    update_ingredient_inventory,
+    update_ingredients_from_today_orders,
+)
+from app.services.order_parser import parse_order
+
+
+def test_process_today_deducts_from_inventory(mock_database):
+    async def run():
+        await db.seed_default_menu()
+        await update_ingredient_inventory({
+            "chicken_egg": {"amount": 10, "unit": "piece"},
+            "oil": {"amount": 0.015, "unit": "liter"},
+        })
+        await db.save_order(parse_order("John 2T"))
+
+        result = await update_ingredients_from_today_orders()
+
+        assert result["status"] == "success"
+        assert result["updated_ingredients"] == ["chicken_egg"]
+        # 2 x 0.01 liter of oil is more than the 0.015 in stock
+        assert [item["name"] for item in result["insufficient_ingredients"]] == ["oil"]
+
+        inventory = await get_ingredient_inventory()
+        assert inventory["chicken_egg"]["amount"] == 8
+        assert inventory["oil"]["amount"] == 0.015
+        assert isinstance(inventory["last_updated"], datetime)
+
+    asyncio.run(run())
+
+
+def test_cv_updates_increment_existing_items_only(mock_database):
+    async def run():
+        await update_ingredient_inventory({"milk": {"amount": 500, "unit": "mL"}})
+
+        result = await db.update_multiple_inventory_items({"milk": 1000, "unknown": 3})
+
+        assert result["results"]["milk"]["new_quantity"] == 1500
+        assert result["results"]["unknown"]["success"] is False
+        assert await db.inventory_collection.count_documents({}) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.services.inventory_forecast import days_until_stockout, project_consumption
+
+
+def test_days_until_stockout_interpolates_and_extrapolates():
+    projection = np.array([[2.0, 1.0, 0.0, 1.0]] * 3)
+    stock = np.array([5.0, 10.0, 4.0, 0.0])
+
+    days = days_until_stockout(stock, projection)
+
+    # 2/day runs out halfway through day 3; 1/day lasts past the horizon
+    np.testing.assert_allclose(days[:2], [2.5, 10.0])
+    assert np.isinf(days[2])
+    assert days[3] == 0
+
+
+def test_weekday_profile_falls_back_to_overall_mean():
+    history = np.array([[7.0], [1.0], [1.0]])
+    weekdays = np.array([0, 1, 1])
+
+    projection = project_consumption(history, weekdays, "weekday", window=7, horizon=3, start_weekday=0)
+
+    np.testing.assert_allclose(projection[:, 0], [7.0, 1.0, 3.0])
+
+
+def test_forecast_refreshes_incrementally(mock_database):
+    from app.services import db
+    from app.services.inventory_forecast import ForecastEngine
+
+    engine = ForecastEngine(history_days=7)
+    yesterday = datetime.now() - timedelta(days=1)
+
+    async def run():
+        await db.seed_default_menu()
+        await db.set_inventory_quantities({"chicken_egg": {"amount": 9, "unit": "piece"}})
+        await db.orders_collection.insert_one({
+            "customer_name": "John", "order_date": yesterday,
+            "items": [{"code": "T", "quantity": 3}], "status": "pending"
+        })
+
+        forecast = await engine.forecast("moving_average", window=1)
+        egg = next(item for item in forecast["ingredients"] if item["ingredient_name"] == "chicken_egg")
+        assert egg["daily_consumption"] == 3
+        assert egg["days_until_stockout"] == 3
+        assert egg["status"] == "low"
+        assert await engine.forecast("moving_average", window=1) is forecast
+
+        # A new order for yesterday only needs the rows after the watermark
+        await db.orders_collection.insert_one({
+            "customer_name": "Jane", "order_date": yesterday + timedelta(seconds=1),
+            "items": [{"code": "T", "quantity": 6}], "status": "pending"
+        })
+        forecast = await engine.forecast("moving_average", window=1)
+        egg = next(item for item in forecast["ingredients"] if item["ingredient_name"] == "chicken_egg")
+        assert egg["days_until_stockout"] == 1
+
+    asyncio.run(run())
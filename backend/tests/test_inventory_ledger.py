@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from app.services import db, inventory_ledger
+from app.services.inventory_calculator import update_ingredient_inventory, update_ingredients_from_today_orders
+from app.services.order_parser import parse_order
+
+
+def test_write_paths_record_movements(mock_database):
+    async def run():
+        await db.seed_default_menu()
+        await update_ingredient_inventory({"chicken_egg": {"amount": 10, "unit": "piece"}})
+        await db.update_multiple_inventory_items({"chicken_egg": 4}, reference_id="detection-1")
+        order_id = await db.save_order(parse_order("John 2T"))
+        await update_ingredients_from_today_orders()
+
+        movements = await db.get_inventory_movements(ingredient_name="chicken_egg")
+        by_source = {movement["source"]: movement for movement in movements}
+
+        assert by_source["manual"]["delta"] == 10
+        assert by_source["cv_detection"]["delta"] == 4
+        assert by_source["cv_detection"]["reference_ids"] == ["detection-1"]
+        assert by_source["order"]["delta"] == -2
+        assert by_source["order"]["reference_ids"] == [str(order_id)]
+
+        # The materialized view matches the sum of the ledger
+        item = await db.get_inventory_item("chicken_egg")
+        assert item["quantity"] == sum(movement["delta"] for movement in movements)
+
+        # Setting an absolute quantity records the difference to what was stored
+        assert await db.set_inventory_quantities({"chicken_egg": {"amount": 3, "unit": "piece"}}) == 1
+        movements = await db.get_inventory_movements(ingredient_name="chicken_egg")
+        manual = [movement["delta"] for movement in movements if movement["source"] == "manual"]
+        assert sorted(manual) == sorted([10, 3 - item["quantity"]])
+        assert sum(movement["delta"] for movement in movements) == 3
+
+    asyncio.run(run())
+
+
+def test_stock_at_uses_snapshot_plus_movements(mock_database, monkeypatch):
+    monkeypatch.setattr(inventory_ledger, "LEDGER_SNAPSHOT_LAG", timedelta(0))
+    start = datetime.now() - timedelta(hours=3)
+
+    async def run():
+        for hours, delta in ((0, 10), (1, -3), (2, 5)):
+            await db.record_inventory_movements(
+                [{"ingredient_name": "rice", "delta": delta, "unit": "kg",
+                  "created_at": start + timedelta(hours=hours)}],
+                "manual"
+            )
+
+        snapshot = await inventory_ledger.compact_inventory_ledger()
+        assert snapshot["movement_count"] == 3
+        assert await inventory_ledger.compact_inventory_ledger() is None
+
+        later = snapshot["taken_at"] + timedelta(milliseconds=5)
+        await db.record_inventory_movements(
+            [{"ingredient_name": "rice", "delta": -1, "unit": "kg", "created_at": later}], "order"
+        )
+
+        past = await inventory_ledger.get_stock_at(start + timedelta(hours=1, minutes=30))
+        assert past["inventory"]["rice"]["quantity"] == 7
+        assert past["snapshot_taken_at"] is None
+
+        now = await inventory_ledger.get_stock_at(later + timedelta(seconds=1))
+        assert now["inventory"]["rice"] == {"quantity": 11, "unit": "kg"}
+        assert now["snapshot_taken_at"] == snapshot["taken_at"]
+        assert now["movements_replayed"] == 1
+
+    asyncio.run(run())
@@ -0,0 +1,88 @@
+import asyncio
+import itertools
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from app.services.order_parser import parse_order
+from loadtest.runner import LatencyRecorder, Scenario, run_phase
+from app.services import detection_cache
+from app.services.detection_cache import DetectionCache, fingerprint_image
+from loadtest.synthetic import fresh_image, make_customers, make_menu, order_documents, order_text_stream
+
+
+def test_synthetic_order_texts_are_accepted_by_the_parser():
+    customers = make_customers(50)
+    for text in itertools.islice(order_text_stream(customers), 200):
+        assert parse_order(text)["items"]
+
+
+def test_order_documents_use_the_synthetic_menu():
+    menu = make_menu(extra_items=5)
+    codes = {item["code"] for item in menu}
+    assert len(codes) == 7
+
+    documents = list(order_documents(300, menu, make_customers(20), days=7))
+    assert len(documents) == 300
+    assert {item["code"] for document in documents for item in document["items"]} <= codes
+    assert all(document["total_amount"] == sum(item["item_total"] for item in document["items"])
+               for document in documents)
+
+
+def test_recorder_reports_percentiles_and_errors():
+    recorder = LatencyRecorder()
+    for milliseconds in range(1, 101):
+        recorder.record("GET /api/menu", milliseconds / 1000, 200 if milliseconds <= 98 else 500)
+    recorder.record("GET /api/menu", 0.5, None)
+
+    stats = recorder.summary(duration=10)["GET /api/menu"]
+    assert stats["requests"] == 101
+    assert stats["errors"] == 3
+    assert stats["statuses"] == {"200": 98, "500": 2, "transport_error": 1}
+    assert stats["p50_ms"] == 51.0
+    assert stats["max_ms"] == 500.0
+
+
+def test_run_phase_drives_scenarios_at_their_rate():
+    def handler(request):
+        return httpx.Response(201 if request.method == "POST" else 404)
+
+    async def create_order(client):
+        response = await client.post("/api/orders", json={"order_text": "Budi 1T"})
+        return "POST /api/orders", response.status_code
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://test") as client:
+            return await run_phase(client, [
+                Scenario("POST /api/orders", 200, create_order),
+                Scenario("GET dashboard", 0, create_order),
+            ], duration=0.5)
+
+    summary = asyncio.run(run())
+    assert list(summary) == ["POST /api/orders"]
+    assert 50 < summary["POST /api/orders"]["requests"] < 200
+    assert summary["POST /api/orders"]["error_rate"] == 0
+
+
+def test_fresh_uploads_miss_the_detection_cache(monkeypatch):
+    monkeypatch.setattr(detection_cache, "PERCEPTUAL_HASH_ENABLED", True)
+    img = np.full((480, 640, 3), 120, dtype=np.uint8)
+    img[100:300, 100:500] = 200
+    ok, encoded = cv2.imencode(".jpg", img)
+    original = encoded.tobytes()
+
+    cache = DetectionCache()
+    cache.store(fingerprint_image(original), "first")
+    rng = random.Random(0)
+    for _ in range(5):
+        fresh = fresh_image(original, rng)
+        assert cv2.imdecode(np.frombuffer(fresh, np.uint8), cv2.IMREAD_COLOR).shape == img.shape
+        assert cache.lookup(fingerprint_image(fresh)) is None
+
+    monkeypatch.setattr(cv2, "imencode", lambda *args: (False, None))
+    with pytest.raises(ValueError):
+        fresh_image(original, rng)
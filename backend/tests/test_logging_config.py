@@ -0,0 +1,69 @@
+import asyncio
+import json
+import logging
+
+from app.utils import logging_config
+from app.utils.logging_config import JsonFormatter, RequestIdFilter, SamplingFilter, request_id_var
+from app.utils.middleware import RequestIdMiddleware
+
+
+def make_record(level=logging.INFO, msg="Updated %s ingredients", args=(3,), **extra):
+    record = logging.LogRecord("app.test", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_formatter_includes_request_id_and_extra_fields():
+    token = request_id_var.set("req-1")
+    try:
+        record = make_record(detection_id="abc")
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Updated 3 ingredients"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "req-1"
+    assert entry["detection_id"] == "abc"
+
+
+def test_sampling_only_drops_debug_records():
+    never = SamplingFilter(rate=0.0)
+    assert never.filter(make_record(level=logging.INFO))
+    assert not never.filter(make_record(level=logging.DEBUG))
+    assert SamplingFilter(rate=1.0).filter(make_record(level=logging.DEBUG))
+
+
+def test_records_are_written_by_the_listener_thread(capsys):
+    logging_config.setup_logging(level="INFO", fmt="json")
+    try:
+        logging.getLogger("app.test").info("Order %s saved", "42", extra={"order_id": "42"})
+    finally:
+        logging_config.shutdown_logging()
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert {"message": "Order 42 saved", "order_id": "42"}.items() <= lines[-1].items()
+
+
+def test_request_id_middleware_reuses_or_generates_ids():
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(request_id_var.get())
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def run(headers):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        await RequestIdMiddleware(app)({"type": "http", "headers": headers}, None, send)
+        return dict(sent[0]["headers"])[b"x-request-id"].decode()
+
+    assert asyncio.run(run([(b"x-request-id", b"from-proxy")])) == "from-proxy"
+    generated = asyncio.run(run([]))
+    assert len(generated) == 32
+    assert seen == ["from-proxy", generated]
+    assert request_id_var.get() is None
@@ -0,0 +1,35 @@
+from app.utils.lru import LRUCache
+
+
+def test_lru_eviction_order():
+    evicted = []
+    cache = LRUCache(maxsize=2, on_evict=lambda key, value: evicted.append(key))
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert evicted == ["b"]
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_pop_and_peek():
+    evicted = []
+    cache = LRUCache(maxsize=2, on_evict=lambda key, value: evicted.append(key))
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Peeking must not refresh recency
+    assert cache.peek("a") == 1
+    cache.set("c", 3)
+    assert evicted == ["a"]
+
+    # Explicit removal does not count as an eviction
+    assert cache.pop("b") == 2
+    assert evicted == ["a"]
+    assert cache.get("missing", "default") == "default"
@@ -0,0 +1,68 @@
+import asyncio
+
+from fastapi import FastAPI
+
+from app.utils import metrics
+from app.utils.metrics import Histogram, MetricsRegistry, sample_lines
+from app.utils.middleware import MetricsMiddleware
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stage duration", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "decode")
+    histogram.observe(0.5, "decode")
+    histogram.observe(5.0, "decode")
+    registry.add_collector(lambda: sample_lines("entries", "Entries", [({"kind": "a"}, 3)]))
+
+    text = registry.render()
+
+    assert 'stage_seconds_bucket{stage="decode",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="decode",le="1.0"} 2' in text
+    assert 'stage_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="decode"} 3' in text
+    assert 'entries{kind="a"} 3' in text
+
+
+def test_stage_timer_is_a_no_op_when_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    assert metrics.stage_timer("decode") is metrics.stage_timer("inference")
+
+
+def test_middleware_labels_requests_by_route_template(monkeypatch):
+    histogram = Histogram("http_seconds", "Latency", ("method", "route", "status"))
+    monkeypatch.setattr("app.utils.middleware.http_request_duration", histogram)
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"item_id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        return {}
+
+    middleware = MetricsMiddleware(app, excluded_routes=["/stream"])
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    for path in ("/items/42", "/stream"):
+        scope = {
+            "type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+            "root_path": "", "scheme": "http", "query_string": b"", "headers": [],
+            "server": ("test", 80), "client": ("test", 1234), "http_version": "1.1",
+            "asgi": {"version": "3.0"},
+        }
+        asyncio.run(middleware(scope, receive, send))
+
+    assert sent[0]["status"] == 200
+    rendered = "\n".join(histogram.render())
+    assert 'http_seconds_count{method="GET",route="/items/{item_id}",status="200"} 1' in rendered
+    # Streaming routes would record connection time, not latency
+    assert "/stream" not in rendered
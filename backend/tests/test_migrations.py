@@ -0,0 +1,51 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from app.services import db
+from app.services.migrations import LATEST_SCHEMA_VERSION, apply_migrations, check_schema_version
+
+
+def test_migrations_apply_once(mock_database):
+    async def run():
+        assert (await check_schema_version())["up_to_date"] is False
+
+        applied = await apply_migrations()
+        assert applied == list(range(1, LATEST_SCHEMA_VERSION + 1))
+
+        # A second run is a no-op
+        assert await apply_migrations() == []
+        status = await check_schema_version()
+        assert status == {
+            "current_version": LATEST_SCHEMA_VERSION,
+            "latest_version": LATEST_SCHEMA_VERSION,
+            "up_to_date": True
+        }
+
+        assert await mock_database.menu.count_documents({}) == len(db.DEFAULT_MENU)
+        assert await mock_database.inventory.count_documents({"ingredient_name": "chicken_breast"}) == 1
+
+    asyncio.run(run())
+
+
+def test_legacy_inventory_document_is_migrated(mock_database):
+    async def run():
+        await mock_database.ingredients.insert_one({
+            "_id": "inventory",
+            "last_updated": datetime(2024, 1, 1),
+            "salt": {"amount": 250, "unit": "grams"},
+            "chicken_breast": {"amount": 1200, "unit": "grams"},
+        })
+
+        await apply_migrations()
+
+        assert await mock_database.ingredients.find_one({"_id": "inventory"}) is None
+        salt = await mock_database.inventory.find_one({"ingredient_name": "salt"})
+        assert (salt["quantity"], salt["unit"]) == (250, "grams")
+        chicken = await mock_database.inventory.find_one({"ingredient_name": "chicken_breast"})
+        assert chicken["quantity"] == 1200
+
+    asyncio.run(run())
@@ -0,0 +1,194 @@
+import json
+import threading
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app.services.models.registry import ModelRegistry, compare_detections
+
+
+class FakeModel:
+    def __init__(self, path):
+        self.path = path
+        self.warm_runs = 0
+
+
+def add_version(root, version, created_at, **metadata):
+    directory = root / version
+    directory.mkdir(parents=True)
+    (directory / "model.pt").write_bytes(b"weights")
+    (directory / "metadata.json").write_text(json.dumps({"created_at": created_at, **metadata}))
+
+
+def make_registry(tmp_path, load=FakeModel, **kwargs):
+    def warm_up(model):
+        model.warm_runs += 1
+
+    kwargs.setdefault("pinned_version", None)
+    return ModelRegistry(load=load, warm_up=warm_up, root=tmp_path / "registry",
+                         legacy_path=tmp_path / "yolo11-model.pt", **kwargs)
+
+
+def started(registry):
+    """Run the startup load to completion and return the active handle"""
+    loading = registry.ensure_loading()
+    if loading:
+        loading.join(5)
+    return registry.active()
+
+
+def test_versions_and_startup_fallbacks(tmp_path):
+    registry = make_registry(tmp_path)
+    assert registry.versions() == []
+    # Nothing registered and no legacy file: no model, as before
+    assert started(registry) is None
+    assert registry.status()["last_load"]["state"] == "failed"
+
+    (tmp_path / "yolo11-model.pt").write_bytes(b"weights")
+    handle = started(make_registry(tmp_path))
+    assert handle.version == "default" and handle.model.warm_runs == 1
+
+    add_version(tmp_path / "registry", "v2", "2025-02-01", description="more classes")
+    add_version(tmp_path / "registry", "v1", "2025-01-01")
+    (tmp_path / "registry" / "broken").mkdir()
+    assert [item["version"] for item in make_registry(tmp_path).versions()] == ["v1", "v2"]
+    assert started(make_registry(tmp_path)).version == "v2"
+    assert started(make_registry(tmp_path, pinned_version="v1")).version == "v1"
+
+    with pytest.raises(KeyError):
+        registry.resolve("v3")
+    with pytest.raises(ValueError):
+        registry.resolve("../v1")
+
+
+def test_activation_swaps_after_warm_up(tmp_path):
+    add_version(tmp_path / "registry", "v1", "2025-01-01")
+    add_version(tmp_path / "registry", "v2", "2025-02-01")
+    release = threading.Event()
+
+    def slow_load(path):
+        if path.parent.name == "v1":
+            release.wait(5)
+        return FakeModel(path)
+
+    registry = make_registry(tmp_path, load=slow_load, pinned_version="v2")
+    in_flight = started(registry)
+
+    thread = registry.start_load("v1")
+    assert registry.status()["loading"]["version"] == "v1"
+    with pytest.raises(RuntimeError):
+        registry.start_load("v2")
+    # Still loading: requests keep getting the old version
+    assert registry.active() is in_flight
+
+    release.set()
+    thread.join(5)
+    assert registry.active().version == "v1" and registry.active().model.warm_runs == 1
+    assert in_flight.version == "v2"
+    assert registry.status()["last_load"]["state"] == "ready"
+    assert (tmp_path / "registry" / "ACTIVE").read_text() == "v1"
+    assert started(make_registry(tmp_path)).version == "v1"
+
+
+def test_failed_load_keeps_the_active_model(tmp_path):
+    add_version(tmp_path / "registry", "v1", "2025-01-01")
+    add_version(tmp_path / "registry", "v2", "2025-02-01")
+
+    def load(path):
+        if path.parent.name == "v2":
+            raise RuntimeError("corrupt weights")
+        return FakeModel(path)
+
+    registry = make_registry(tmp_path, load=load, pinned_version="v1")
+    started(registry)
+    registry.start_load("v2").join(5)
+
+    assert registry.active().version == "v1"
+    assert registry.status()["last_load"]["state"] == "failed"
+    assert registry.status()["loading"] is None
+
+
+def test_requests_never_load_and_failed_startup_loads_are_retried(tmp_path):
+    add_version(tmp_path / "registry", "v1", "2025-01-01")
+    release = threading.Event()
+    attempts = []
+
+    def load(path):
+        attempts.append(path)
+        if len(attempts) == 1:
+            raise RuntimeError("storage not mounted yet")
+        release.wait(5)
+        return FakeModel(path)
+
+    registry = make_registry(tmp_path, load=load, retry_seconds=0)
+    registry.ensure_loading().join(5)
+    assert registry.active() is None and registry.status()["last_load"]["state"] == "failed"
+
+    loading = registry.ensure_loading()
+    # The retry runs in the background; callers are told the model is not ready
+    assert registry.active() is None and registry.ensure_loading() is None
+    release.set()
+    loading.join(5)
+    assert registry.active().version == "v1" and len(attempts) == 2
+    # A startup load does not pin the version in ACTIVE
+    assert not (tmp_path / "registry" / "ACTIVE").exists()
+
+    slow = make_registry(tmp_path, load=load, retry_seconds=60)
+    slow._last_load = {"state": "failed", "finished_at": datetime.now()}
+    assert slow.ensure_loading() is None
+
+
+def test_compare_detections():
+    primary = np.array([[0, 0, 10, 10, 0.9, 0], [20, 20, 30, 30, 0.8, 1]])
+    shadow = np.array([[1, 0, 11, 10, 0.7, 0], [20, 20, 30, 30, 0.9, 2], [50, 50, 60, 60, 0.6, 0]])
+
+    comparison = compare_detections(primary, shadow)
+    assert comparison == {"primary": 2, "shadow": 3, "matched": 1, "agreement": 1 / 3}
+    assert compare_detections(np.empty((0, 6)), np.empty((0, 6)))["agreement"] == 1.0
+
+
+def test_shadow_runs_on_sampled_requests(tmp_path):
+    add_version(tmp_path / "registry", "v1", "2025-01-01")
+    add_version(tmp_path / "registry", "v2", "2025-02-01")
+    registry = make_registry(tmp_path, pinned_version="v1", shadow_rate=0.0)
+    started(registry)
+    assert registry.sample_shadow() is None
+
+    registry.start_load("v2", role="shadow", shadow_rate=1.0).join(5)
+    assert registry.active().version == "v1"
+    shadow = registry.sample_shadow()
+    assert shadow.version == "v2"
+
+    detections = np.array([[0, 0, 10, 10, 0.9, 0]])
+    release = threading.Event()
+
+    def run(model):
+        release.wait(5)
+        return detections
+
+    assert registry.submit_shadow(shadow, run, 0.05, detections)
+    # Only one shadow run at a time; extra samples are skipped, not queued
+    assert not registry.submit_shadow(registry.sample_shadow(), run, 0.05, detections)
+    release.set()
+    registry._shadow_executor.submit(lambda: None).result(5)
+
+    summary = registry.status()["shadow"]["comparison"]
+    assert summary["samples"] == 1 and summary["skipped"] == 1 and summary["mean_agreement"] == 1.0
+    assert "model_shadow_samples_total 1" in registry.metrics()
+    assert 'model_active_info{version="v1"} 1' in registry.metrics()
+
+    registry.stop_shadow()
+    assert registry.sample_shadow() is None and registry.status()["shadow"] is None
+
+
+def test_failed_shadow_hand_off_frees_the_slot(tmp_path):
+    add_version(tmp_path / "registry", "v1", "2025-01-01")
+    registry = make_registry(tmp_path, pinned_version="v1", shadow_rate=1.0)
+    handle = started(registry)
+    detections = np.empty((0, 6))
+
+    registry._shadow_executor.shutdown()
+    with pytest.raises(RuntimeError):
+        registry.submit_shadow(handle, lambda model: detections, 0.05, detections)
+    assert registry._shadow_busy.acquire(blocking=False)
@@ -0,0 +1,60 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from app.services.models.preprocess import (
+    PAD_VALUE,
+    BufferPool,
+    choose_reduction,
+    decode_image,
+    fill_input_tensor,
+    letterbox_into,
+    read_jpeg_size,
+    scale_boxes_to_image,
+)
+
+
+def test_choose_reduction_keeps_input_resolution():
+    assert choose_reduction(4000, 3000, 640) == 4  # 1000px longest side after decoding
+    assert choose_reduction(1280, 960, 640) == 2
+    assert choose_reduction(1000, 800, 640) == 1
+    assert choose_reduction(8000, 6000, 640) == 8
+
+
+def test_reduced_jpeg_decode(tmp_path):
+    image_path = tmp_path / "shelf.jpg"
+    cv2.imwrite(str(image_path), np.zeros((1400, 2600, 3), dtype=np.uint8))
+
+    assert read_jpeg_size(image_path) == (2600, 1400)
+    assert decode_image(image_path, 640).shape == (350, 650, 3)
+
+    not_jpeg = tmp_path / "shelf.png"
+    cv2.imwrite(str(not_jpeg), np.zeros((10, 20, 3), dtype=np.uint8))
+    assert read_jpeg_size(not_jpeg) is None
+    assert decode_image(not_jpeg, 640).shape == (10, 20, 3)
+
+
+def test_letterbox_round_trip():
+    img = np.full((480, 960, 3), 200, dtype=np.uint8)
+    pool = BufferPool(size=640, max_buffers=1)
+
+    with pool.acquire() as buffers:
+        gain, pad_x, pad_y = letterbox_into(img, buffers.canvas)
+        assert (gain, pad_x, pad_y) == (pytest.approx(2 / 3), 0, 160)
+        # Padding rows are grey, the image area is untouched by padding
+        assert (buffers.canvas[:160] == PAD_VALUE).all()
+        assert (buffers.canvas[160:480] == 200).all()
+
+        tensor = fill_input_tensor(buffers)
+        assert tensor.shape == (1, 3, 640, 640)
+        assert tensor.max() == pytest.approx(200 / 255)
+        first = buffers
+
+    # The same buffers are handed out again
+    with pool.acquire() as buffers:
+        assert buffers is first
+
+    boxes = np.array([[0, 160, 640, 480, 0.9, 1]], dtype=np.float32)
+    scaled = scale_boxes_to_image(boxes, gain, pad_x, pad_y, img.shape[:2])
+    assert scaled[0].tolist() == pytest.approx([0, 0, 960, 480, 0.9, 1])
@@ -0,0 +1,81 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services import inventory_forecast, purchase_orders
+
+
+def test_purchase_order_rounds_up_to_packages(mock_database, monkeypatch):
+    from app.services import db
+
+    monkeypatch.setattr(purchase_orders, "forecast_engine", inventory_forecast.ForecastEngine(history_days=7))
+    yesterday = datetime.now() - timedelta(days=1)
+
+    async def run():
+        await db.seed_default_menu()
+        await db.set_inventory_quantities({
+            "chicken_egg": {"amount": 5, "unit": "piece"},
+            "oil": {"amount": 2, "unit": "liter"},
+        })
+        await db.initialize_default_quantities([
+            {"ingredient_name": "Chicken_Egg", "default_quantity": 10, "unit": "piece",
+             "packaging_description": "carton"},
+        ])
+        await db.orders_collection.insert_one({
+            "customer_name": "John", "order_date": yesterday,
+            "items": [{"code": "T", "quantity": 4}], "status": "pending"
+        })
+
+        order = await purchase_orders.suggest_purchase_order(horizon=6, safety_days=0, method="moving_average")
+        items = {item["ingredient_name"]: item for item in order["items"]}
+
+        # 4 eggs a day for 6 days is 24, 19 short of the 5 in stock: 2 cartons
+        assert items["chicken_egg"]["shortfall"] == 19
+        assert items["chicken_egg"]["packages"] == 2
+        assert items["chicken_egg"]["order_quantity"] == 20
+        assert items["chicken_egg"]["packaging_description"] == "carton"
+        # 0.24 liter of oil is covered by stock
+        assert "oil" not in items
+
+    asyncio.run(run())
+
+
+def test_seeded_defaults_match_recipe_names(mock_database, monkeypatch):
+    from app.services import db
+
+    monkeypatch.setattr(purchase_orders, "forecast_engine", inventory_forecast.ForecastEngine(history_days=7))
+    yesterday = datetime.now() - timedelta(days=1)
+
+    async def run():
+        await db.seed_default_menu()
+        await db.initialize_default_quantities()
+        await db.set_inventory_quantities({
+            "chicken_egg": {"amount": 5, "unit": "piece"},
+            "baking_powder": {"amount": 10, "unit": "grams"},
+        })
+        await db.orders_collection.insert_one({
+            "customer_name": "John", "order_date": yesterday,
+            "items": [{"code": "T", "quantity": 4}, {"code": "SE", "quantity": 12}], "status": "pending"
+        })
+
+        order = await purchase_orders.suggest_purchase_order(horizon=6, safety_days=0, method="moving_average")
+        items = {item["ingredient_name"]: item for item in order["items"]}
+
+        # "chicken_egg" is an alias of the seeded "Egg", sold in cartons of 10 "pieces"
+        assert items["chicken_egg"]["packages"] == 2
+        assert items["chicken_egg"]["packaging_description"] == "carton"
+        # "baking_powder" matches "Baking Powder": 49.76 g short is one 90 g bottle
+        assert items["baking_powder"]["packages"] == 1
+        assert items["baking_powder"]["order_quantity"] == 90
+        assert items["baking_powder"]["packaging_description"] == "bottle"
+
+    asyncio.run(run())
+
+
+def test_match_defaults_through_the_alias_table():
+    defaults = [{"ingredient_name": "AP Flour", "aliases": ["flour_batter"]},
+                {"ingredient_name": "flour_batter"}]
+
+    matched = purchase_orders._match_defaults(["flour", "Flour Batter", "ap-flour", "salt"], defaults,
+                                              aliases={"flour": "AP Flour"})
+    # An alias on a default never shadows a real ingredient name
+    assert matched == [defaults[0], defaults[1], defaults[0], None]
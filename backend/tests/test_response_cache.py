@@ -0,0 +1,111 @@
+import asyncio
+import inspect
+from typing import Optional
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import response_cache as cache_module
+from app.services.response_cache import MemoryBackend, ResponseCache, SQLiteBackend, cached_response
+from app.utils.responses import MongoJSONResponse
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(MemoryBackend(maxsize=8), ttl=60, enabled=True)
+    monkeypatch.setattr(cache_module, "response_cache", cache)
+    return cache
+
+
+def test_cached_endpoint_hits_until_invalidated(cache):
+    calls = []
+
+    @cached_response("/items", tags=("orders",))
+    async def list_items(status: Optional[str] = None):
+        calls.append(status)
+        return MongoJSONResponse({"status": status, "calls": len(calls)})
+
+    # FastAPI reads the query parameters from the wrapped endpoint
+    assert list(inspect.signature(list_items).parameters) == ["status"]
+
+    async def run():
+        first = await list_items(status="pending")
+        second = await list_items(status="pending")
+        other = await list_items(status=None)
+
+        assert first.headers["X-Cache"] == "MISS"
+        assert second.headers["X-Cache"] == "HIT"
+        assert second.body == first.body
+        assert other.headers["X-Cache"] == "MISS"
+        assert calls == ["pending", None]
+
+        assert cache.invalidate("menu") == 0
+        assert cache.invalidate("orders") == 2
+        assert (await list_items(status="pending")).headers["X-Cache"] == "MISS"
+
+    asyncio.run(run())
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"]) == (1, 3, 2)
+
+
+def test_failed_reads_are_not_cached(cache):
+    database_up = []
+
+    @cached_response("/inventory", tags=("inventory",))
+    async def get_inventory():
+        if not database_up:
+            raise HTTPException(status_code=500, detail="Database unavailable")
+        return MongoJSONResponse({"inventory": {"rice": 2}})
+
+    async def run():
+        with pytest.raises(HTTPException):
+            await get_inventory()
+        database_up.append(True)
+        response = await get_inventory()
+        assert response.headers["X-Cache"] == "MISS"
+        assert b"rice" in response.body
+
+    asyncio.run(run())
+
+
+def test_concurrent_misses_build_once(cache):
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return MongoJSONResponse({"ok": True})
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_build("key", ["orders"], build) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert len(builds) == 1
+    assert [hit for _, hit in results].count(False) == 1
+
+
+def test_write_during_build_is_not_stored(cache):
+    async def build():
+        cache.invalidate("orders")
+        return MongoJSONResponse({"stale": True})
+
+    asyncio.run(cache.get_or_build("key", ["orders"], build))
+    assert cache.backend.get("key") is None
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer, reader = SQLiteBackend(path, maxsize=2), SQLiteBackend(path, maxsize=2)
+
+    writer.set("a", b"1", 60, ["orders"])
+    writer.set("b", b"2", 60, ["menu"])
+    assert reader.get("a") == b"1"
+
+    assert reader.invalidate("orders") == 1
+    assert writer.get("a") is None
+
+    writer.set("c", b"3", 60, ["menu"])
+    writer.set("d", b"4", 60, ["menu"])
+    assert len(reader) == 2
+    assert reader.get("b") is None
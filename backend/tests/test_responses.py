@@ -0,0 +1,31 @@
+import json
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("orjson")
+bson = pytest.importorskip("bson")
+
+from app.utils.helpers import serialize_for_json
+from app.utils.responses import MongoJSONResponse
+
+
+def test_matches_serialize_for_json():
+    order = {
+        "_id": bson.ObjectId(),
+        "customer_name": "John",
+        "order_date": datetime(2024, 5, 1, 12, 30, 15, 250000),
+        "items": [{"code": "SE", "quantity": 2, "added": datetime(2024, 5, 1)}],
+        "total_amount": 260,
+    }
+
+    body = MongoJSONResponse({"orders": [order]}).body
+
+    assert json.loads(body) == {"orders": serialize_for_json([order])}
+
+
+def test_status_code_is_kept():
+    response = MongoJSONResponse({"success": True}, status_code=201)
+
+    assert response.status_code == 201
+    assert response.headers["content-type"] == "application/json"
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.services.seed_loader import load_ingredient_defaults_file, load_menu_file
+
+
+def test_load_menu_csv_groups_ingredients(tmp_path):
+    menu_csv = tmp_path / "menu.csv"
+    menu_csv.write_text(
+        "code,name,price,ingredient,quantity,unit\n"
+        "SE,Chicken with Salted Egg,130,chicken_breast,150,grams\n"
+        "SE,Chicken with Salted Egg,130,milk,50,mL\n"
+        "T,Sunny Side Up Egg,15,chicken_egg,1,piece\n"
+    )
+
+    menu = load_menu_file(menu_csv)
+
+    assert [item["code"] for item in menu] == ["SE", "T"]
+    assert menu[0]["price"] == 130
+    assert menu[0]["ingredients"] == [
+        {"name": "chicken_breast", "quantity": 150, "unit": "grams"},
+        {"name": "milk", "quantity": 50, "unit": "mL"},
+    ]
+
+
+def test_load_menu_json(tmp_path):
+    menu_json = tmp_path / "menu.json"
+    menu_json.write_text(json.dumps({"menu": [
+        {"code": "T", "name": "Sunny Side Up Egg", "price": 15,
+         "ingredients": [{"name": "oil", "quantity": 0.01, "unit": "liter"}]}
+    ]}))
+
+    menu = load_menu_file(menu_json)
+
+    assert menu[0]["ingredients"][0]["quantity"] == 0.01
+
+    with pytest.raises(ValueError):
+        load_menu_file(tmp_path / "menu.xlsx")
+
+
+def test_load_defaults_csv_deduplicates(tmp_path):
+    defaults_csv = tmp_path / "defaults.csv"
+    defaults_csv.write_text(
+        "ingredient_name,default_quantity,unit,packaging_description\n"
+        "Egg,10,pieces,carton\n"
+        "Sugar,2000,grams,\n"
+        "Egg,30,pieces,tray\n"
+    )
+
+    defaults = load_ingredient_defaults_file(defaults_csv)
+
+    assert defaults == [
+        {"ingredient_name": "Egg", "default_quantity": 30.0, "unit": "pieces", "packaging_description": "tray"},
+        {"ingredient_name": "Sugar", "default_quantity": 2000.0, "unit": "grams", "packaging_description": None},
+    ]
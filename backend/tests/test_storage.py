@@ -0,0 +1,157 @@
+import asyncio
+import io
+import os
+import uuid
+
+import pytest
+
+from app.services.storage import LocalStorage, S3Storage, parse_byte_range
+
+DATA = bytes(range(256)) * 40  # 10 KiB
+
+
+async def chunked(data, size=1000):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def read_all(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+def test_parse_byte_range():
+    assert parse_byte_range(None, 100) is None
+    assert parse_byte_range("bytes=0-9", 100) == (0, 9)
+    assert parse_byte_range("bytes=90-", 100) == (90, 99)
+    assert parse_byte_range("bytes=-10", 100) == (90, 99)
+    assert parse_byte_range("bytes=50-500", 100) == (50, 99)
+    # Multiple ranges and other units fall back to the whole resource
+    assert parse_byte_range("bytes=0-1,5-6", 100) is None
+    assert parse_byte_range("items=0-1", 100) is None
+    for header in ("bytes=100-", "bytes=9-3", "bytes=a-b", "bytes=-0"):
+        with pytest.raises(ValueError):
+            parse_byte_range(header, 100)
+
+
+def test_local_storage_streams_in_chunks(tmp_path):
+    storage = LocalStorage(tmp_path, chunk_size=512)
+
+    async def run():
+        assert await storage.save_stream("a.jpg", chunked(DATA)) == len(DATA)
+        stat = await storage.stat("a.jpg")
+        chunks = [chunk async for chunk in storage.open_stream("a.jpg")]
+        ranged = await read_all(storage.open_stream("a.jpg", 1000, 2999))
+        async with storage.local_copy("a.jpg") as path:
+            copied = path.read_bytes()
+        await storage.delete("a.jpg")
+        async with storage.local_copy("a.jpg") as missing:
+            pass
+        return stat, chunks, ranged, copied, missing, await storage.stat("a.jpg")
+
+    stat, chunks, ranged, copied, missing, deleted = asyncio.run(run())
+
+    assert stat["size"] == len(DATA)
+    assert max(len(chunk) for chunk in chunks) == 512 and b"".join(chunks) == DATA
+    assert ranged == DATA[1000:3000]
+    assert copied == DATA
+    assert missing is None and deleted is None
+    # Only the finished file was ever visible; no partial files are left behind
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_local_storage_discards_failed_upload(tmp_path):
+    storage = LocalStorage(tmp_path)
+
+    async def broken():
+        yield b"partial"
+        raise ConnectionError("client went away")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(storage.save_stream("a.jpg", broken()))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_storage_rejects_path_keys(tmp_path):
+    with pytest.raises(ValueError):
+        LocalStorage(tmp_path).path("../secrets.jpg")
+
+
+class FakeS3Client:
+    """The subset of the boto3 S3 client used by S3Storage, kept in memory"""
+
+    class Body(io.BytesIO):
+        def iter_chunks(self, size):
+            return iter(lambda: self.read(size), b"")
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.part_sizes = []
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads["upload-1"] = {}
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId][PartNumber] = Body
+        self.part_sizes.append(len(Body))
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[Key]
+        if Range:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1 if end else None]
+        return {"Body": self.Body(data)}
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": len(self.objects[Key]), "ETag": '"etag"'}
+
+
+def test_s3_storage_uses_multipart_for_large_objects():
+    client = FakeS3Client()
+    storage = S3Storage("bucket", "images/", client=client, part_size=0, chunk_size=4096)
+    data = os.urandom(S3Storage.MIN_PART_SIZE * 2 + 100)
+
+    async def run():
+        await storage.save_stream("big.jpg", chunked(data, 1024 * 1024))
+        await storage.save_stream("small.jpg", chunked(DATA))
+        return (
+            await read_all(storage.open_stream("big.jpg", 10, 20)),
+            await storage.stat("small.jpg"),
+        )
+
+    ranged, stat = asyncio.run(run())
+
+    assert client.objects["images/big.jpg"] == data
+    assert client.part_sizes == [S3Storage.MIN_PART_SIZE, S3Storage.MIN_PART_SIZE, 100]
+    assert client.objects["images/small.jpg"] == DATA
+    assert ranged == data[10:21]
+    assert stat == {"size": len(DATA), "version": "etag"}
+
+
+@pytest.mark.skipif(not os.getenv("S3_TEST_ENDPOINT_URL"), reason="S3_TEST_ENDPOINT_URL not set (e.g. a local MinIO)")
+def test_s3_storage_against_server():
+    pytest.importorskip("boto3")
+    storage = S3Storage(os.getenv("S3_TEST_BUCKET", "warung-test"), f"test-{uuid.uuid4().hex}/",
+                        endpoint_url=os.getenv("S3_TEST_ENDPOINT_URL"))
+
+    async def run():
+        await storage.save_stream("a.jpg", chunked(DATA))
+        ranged = await read_all(storage.open_stream("a.jpg", 100, 199))
+        async with storage.local_copy("a.jpg") as path:
+            copied = path.read_bytes()
+        await storage.delete("a.jpg")
+        return ranged, copied, await storage.stat("a.jpg")
+
+    ranged, copied, deleted = asyncio.run(run())
+    assert ranged == DATA[100:200]
+    assert copied == DATA
+    assert deleted is None
@@ -0,0 +1,48 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.models.tiling import compute_tiles, merge_tile_detections, non_max_suppression
+
+
+def test_tiles_cover_image_with_overlap():
+    tiles = compute_tiles(1500, 1000, tile_size=640, overlap=0.25)
+
+    # Tiles never exceed the image and the last row/column is flush with the edge
+    assert all(x1 <= 1500 and y1 <= 1000 for _, _, x1, y1 in tiles)
+    assert max(x1 for _, _, x1, _ in tiles) == 1500
+    assert max(y1 for _, _, _, y1 in tiles) == 1000
+    assert {x0 for x0, _, _, _ in tiles} == {0, 480, 860}
+    assert {y0 for _, y0, _, _ in tiles} == {0, 360}
+
+
+def test_small_image_is_a_single_tile():
+    assert compute_tiles(320, 200, tile_size=640) == [(0, 0, 320, 200)]
+
+    with pytest.raises(ValueError):
+        compute_tiles(320, 200, overlap=1.0)
+
+
+def test_nms_is_class_aware():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [0, 0, 10, 10]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7])
+    classes = np.array([0, 0, 1])
+
+    keep = non_max_suppression(boxes, scores, classes, threshold=0.5, metric="iou")
+
+    assert sorted(keep.tolist()) == [0, 2]
+
+
+def test_merge_removes_duplicates_across_tiles():
+    tiles = [(0, 0, 640, 640), (480, 0, 1120, 640)]
+    # The same object seen by both tiles, plus a second object only in tile two
+    tile_detections = [
+        np.array([[500, 100, 560, 160, 0.9, 3]], dtype=np.float32),
+        np.array([[20, 100, 80, 160, 0.8, 3], [300, 300, 340, 340, 0.75, 5]], dtype=np.float32),
+    ]
+
+    merged = merge_tile_detections(tile_detections, tiles)
+
+    assert merged.shape == (2, 6)
+    assert merged[0].tolist() == pytest.approx([500, 100, 560, 160, 0.9, 3])
+    assert merged[1].tolist() == pytest.approx([780, 300, 820, 340, 0.75, 5])
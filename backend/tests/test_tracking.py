@@ -0,0 +1,72 @@
+import numpy as np
+
+from app.services.tracking import ByteTracker, box_iou
+
+FRAME = (1000, 500)
+
+
+def detection(x, y, conf=0.9, class_id=0, size=100):
+    return [x, y, x + size, y + size, conf, class_id]
+
+
+def test_box_iou():
+    a = np.array([[0, 0, 10, 10]], dtype=np.float64)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], dtype=np.float64)
+    np.testing.assert_allclose(box_iou(a, b), [[1.0, 1 / 3, 0.0]])
+
+
+def test_moving_items_are_counted_once():
+    tracker = ByteTracker()
+    for frame in range(6):
+        # Two eggs sliding right as the camera pans, one salt standing still
+        tracker.update(np.array([
+            detection(100 + 40 * frame, 100),
+            detection(300 + 40 * frame, 100),
+            detection(700, 300, class_id=1),
+        ]), FRAME)
+
+    summary = tracker.summary(FRAME)
+    assert sorted(summary["class_ids"].tolist()) == [0, 0, 1]
+    assert all(track.hits == 6 for track in tracker.tracks)
+
+
+def test_low_confidence_detections_keep_tracks_alive_but_start_none():
+    tracker = ByteTracker(high_conf=0.5)
+    tracker.update(np.array([detection(100, 100, conf=0.9)]), FRAME)
+    ids = tracker.update(np.array([detection(105, 100, conf=0.3), detection(600, 100, conf=0.3)]), FRAME)
+
+    assert ids.tolist() == [0, -1]
+    assert len(tracker.tracks) == 1 and tracker.tracks[0].hits == 2
+    # The best sighting is kept for the summary
+    assert tracker.summary(FRAME)["confidences"].tolist() == [np.float32(0.9)]
+
+
+def test_classes_are_not_merged_and_flickers_are_not_counted():
+    tracker = ByteTracker()
+    tracker.update(np.array([detection(100, 100, class_id=0)]), FRAME)
+    tracker.update(np.array([detection(100, 100, class_id=1), detection(100, 100, class_id=0)]), FRAME)
+
+    assert len(tracker.tracks) == 2
+    # The class 1 box was seen once, below TRACK_MIN_HITS
+    assert tracker.summary(FRAME, min_hits=2)["class_ids"].tolist() == [0]
+    assert tracker.summary(FRAME, min_hits=1)["class_ids"].tolist() == [0, 1]
+
+
+def test_burst_frames_match_by_centroid_across_resolutions():
+    tracker = ByteTracker(max_distance=0.5)
+    tracker.update(np.array([detection(100, 100), detection(600, 100)]), FRAME)
+    # Half-resolution photo, camera shifted so the boxes no longer overlap
+    tracker.update(np.array([detection(100, 50, size=50), detection(350, 50, size=50)]), (500, 250))
+
+    assert len(tracker.tracks) == 2
+    assert [track.hits for track in tracker.tracks] == [2, 2]
+
+
+def test_lost_tracks_expire():
+    tracker = ByteTracker(max_age=1)
+    tracker.update(np.array([detection(100, 100)]), FRAME)
+    tracker.update(np.empty((0, 6)), FRAME)
+    tracker.update(np.empty((0, 6)), FRAME)
+    tracker.update(np.array([detection(100, 100)]), FRAME)
+
+    assert len(tracker.tracks) == 2
@@ -0,0 +1,155 @@
+import io
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.tracking import ByteTracker
+from app.services.video_pipeline import (
+    Frame,
+    burst_frames,
+    estimate_shift,
+    limit_size,
+    motion_thumbnail,
+    run_frame_pipeline,
+    sample_video_frames,
+)
+
+
+def write_video(path, frames=60, fps=20, pan_from=None, size=(320, 240)):
+    """Static grey scene; from frame pan_from on, a white square slides across it"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for index in range(frames):
+        img = np.full((size[1], size[0], 3), 90, dtype=np.uint8)
+        if pan_from is not None and index >= pan_from:
+            x = (index - pan_from) * 12 % size[0]
+            img[60:180, x:x + 80] = 255
+        writer.write(img)
+    writer.release()
+    return path
+
+
+def test_static_video_is_sampled_at_the_max_interval(tmp_path):
+    path = write_video(tmp_path / "static.avi")  # 3 seconds at 20 fps
+    frames = list(sample_video_frames(path, min_interval=0.1, max_interval=1.0, motion_threshold=0.03))
+    assert [frame.index for frame in frames] == [0, 20, 40]
+    assert [frame.timestamp for frame in frames] == [0.0, 1.0, 2.0]
+
+
+def test_motion_samples_more_frames(tmp_path):
+    path = write_video(tmp_path / "pan.avi", pan_from=20)
+    frames = list(sample_video_frames(path, min_interval=0.1, max_interval=1.0, motion_threshold=0.03))
+    indices = [frame.index for frame in frames]
+
+    assert indices[:2] == [0, 20]
+    assert len([index for index in indices if index >= 20]) > 3
+    assert len(list(sample_video_frames(path, max_frames=3))) == 3
+
+
+def test_frames_are_downscaled_and_bad_files_rejected(tmp_path):
+    assert limit_size(np.zeros((1000, 2000, 3), np.uint8), 500).shape == (250, 500, 3)
+
+    frame = next(sample_video_frames(write_video(tmp_path / "v.avi", frames=5), frame_size=160))
+    assert frame.size == (160, 120)
+
+    (tmp_path / "broken.mp4").write_bytes(b"not a video")
+    with pytest.raises(ValueError):
+        list(sample_video_frames(tmp_path / "broken.mp4"))
+
+
+def test_burst_frames_skip_undecodable_photos():
+    ok, encoded = cv2.imencode(".jpg", np.zeros((40, 60, 3), np.uint8))
+    files = [io.BytesIO(encoded.tobytes()), io.BytesIO(b"garbage"), io.BytesIO(encoded.tobytes())]
+    assert [frame.index for frame in burst_frames(files)] == [0, 2]
+
+
+def test_pipeline_batches_frames_and_tracks_in_order():
+    decode_threads = set()
+
+    def frames():
+        for index in range(10):
+            decode_threads.add(threading.current_thread().name)
+            yield Frame(index, np.zeros((100, 200, 3), np.uint8))
+
+    batch_sizes = []
+
+    def detect(images):
+        detections = []
+        for offset in range(len(images)):
+            index = sum(batch_sizes) + offset
+            # One item in every frame, a second one only in frame 4
+            rows = [[10, 10, 50, 50, 0.9, 0]] + ([[100, 10, 150, 50, 0.9, 1]] if index == 4 else [])
+            detections.append(np.array(rows, dtype=np.float32))
+        batch_sizes.append(len(images))
+        return detections
+
+    tracker = ByteTracker()
+    run = run_frame_pipeline(frames(), detect, tracker, batch_size=4)
+
+    assert decode_threads == {"frame-decoder"}
+    assert run["frames"] == 10 and sum(batch_sizes) == 10 and max(batch_sizes) <= 4
+    assert run["keyframe"].index == 4
+    assert [track.hits for track in tracker.tracks] == [10, 1]
+
+
+def textured_shelf(width=1600, height=400, items=(300, 700, 1100)):
+    """Noisy background with a bright 80 px item at each x position"""
+    rng = np.random.default_rng(0)
+    scene = cv2.GaussianBlur(rng.integers(0, 255, (height, width)).astype(np.uint8), (0, 0), 3)
+    scene = cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR)
+    for x in items:
+        scene[160:240, x:x + 80] = 255
+    return scene
+
+
+def test_estimate_shift_follows_a_pan():
+    scene = textured_shelf()
+    shift = estimate_shift(motion_thumbnail(scene[:, 100:740]), motion_thumbnail(scene[:, 260:900]))
+    assert shift[0] == pytest.approx(-160 / 640, abs=0.02)
+    assert shift[1] == pytest.approx(0, abs=0.02)
+
+
+def test_burst_panning_further_than_an_item_counts_each_item_once():
+    items = (300, 700, 1100)
+    scene = textured_shelf(items=items)
+    offsets = [0, 200, 400, 600, 800]
+
+    def frames():
+        for index, offset in enumerate(offsets):
+            yield Frame(index, scene[:, offset:offset + 640].copy())
+
+    frame_offsets = iter(offsets)
+
+    def detect(images):
+        detections = []
+        for _ in images:
+            offset = next(frame_offsets)
+            rows = [[x - offset, 160, x - offset + 80, 240, 0.9, class_id]
+                    for class_id, x in enumerate(items) if 0 <= x - offset <= 560]
+            detections.append(np.array(rows, dtype=np.float32).reshape(-1, 6))
+        return detections
+
+    tracker = ByteTracker()
+    run = run_frame_pipeline(frames(), detect, tracker, batch_size=2)
+
+    # Each step moves the items 200 px, more than twice their width
+    assert sorted(track.class_id for track in tracker.tracks) == [0, 1, 2]
+    assert [track.hits for track in sorted(tracker.tracks, key=lambda track: track.class_id)] == [2, 3, 2]
+
+    # Boxes are placed where the items are in the key frame, not where they scored best
+    keyframe_offset = offsets[run["keyframe_step"]]
+    summary = tracker.summary(run["keyframe"].size, min_hits=1, frame=run["keyframe_step"])
+    for class_id, box in zip(summary["class_ids"], summary["xyxy"]):
+        x = items[class_id] - keyframe_offset
+        expected = np.clip([x, 160, x + 80, 240], 0, [640, 400, 640, 400])
+        np.testing.assert_allclose(box, expected, atol=12)
+
+
+def test_pipeline_surfaces_decode_errors():
+    def frames():
+        yield Frame(0, np.zeros((10, 10, 3), np.uint8))
+        raise ValueError("Could not open video")
+
+    with pytest.raises(ValueError):
+        run_frame_pipeline(frames(), lambda images: [np.empty((0, 6))] * len(images), ByteTracker())
@@ -13,7 +13,7 @@ BASE_DIR = Path(__file__).resolve().parent
 sys.path.append(str(BASE_DIR))
 
 # Import the YOLO predict function
-from app.services.models.yolo_model import predict, get_model
+from app.services.models.yolo_model import predict, get_model, model_registry
 
 def main():
     """Test YOLO model prediction"""
@@ -28,6 +28,9 @@ def main():
     
     # Initialize model
     print("Loading YOLO model...")
+    loading = model_registry.ensure_loading()
+    if loading:
+        loading.join()
     model = get_model()
     if model is None:
         print("Failed to load model")